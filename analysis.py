@@ -1,88 +1,50 @@
 import json
+import os
 from collections import Counter
 from openai import OpenAI
 import pandas as pd
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
-from utils import clean_text
-
-
-def analyze_comment_for_bot_likelihood(client, comment):
-    """
-    Use GPT-3.5-turbo to score comment's likelihood of being bot-generated
-    Returns a score between 0 (human-like) and 5 (bot-like)
-    """
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system",
-                 "content": "You are an AI that can detect bot-generated comments. Score each comment from 0-5, \
-                            where 0 means very likely human-written and 5 means extremely likely bot-generated."},
-                {"role": "user",
-                 "content": f"Analyze this comment and provide a score from 0-5 for bot likelihood:\n\n{comment}"}
-            ]
-        )
-
-        # Extract the bot likelihood score
-        bot_score_text = response.choices[0].message.content.strip()
-
-        # Validate score is between 0-5
-        try:
-            bot_score = max(0, min(5, float(bot_score_text)))
-        except ValueError:
-            bot_score = 2.5  # Default middle score if parsing fails
-
-        return bot_score
-
-    except Exception as e:
-        print(f"Error analyzing comment: {e}")
-        return 2.5  # Default middle score
-
-
-def analyze_comment_sentiment(client, comment):
+from attachments import AttachmentProcessor, extract_text
+from clustering import ClusterIndex, cluster_comments, fan_out_scores
+from comment_frame import ParquetExporter, comments_to_frame, frame_aggregates
+from llm_cache import MISSING, ResultCache
+from local_scorer import LocalScorer, posting_days
+from metrics import METRICS
+from prompts import CHAT_MODEL, SUMMARY_TEMPLATE, scoring_text, summary_messages
+from records import Comment, RecordView, from_json, partition, to_json
+from scoring import ScoringEngine
+from timeline import Timeline, analyze_timeline
+from utils import docket_to_records, iter_html_text, iter_ndjson, write_ndjson
+
+
+def summarize_content(client, content, cache=None):
+    if cache is not None:
+        key = cache.key(CHAT_MODEL, SUMMARY_TEMPLATE, content)
+        summary = cache.get(key)
+        if summary is not MISSING:
+            return summary
     try:
-        response = client.moderations.create(
-            model="text-moderation-latest",
-            input=comment
-        )
-
-        # Extract the categories
-
-        response = response.results[0].categories
-
-        return response
-
-    except Exception as e:
-        print(f"Error analyzing comment: {e}")
-    return None  # Default middle score
-
-
-def summarize_content(client, content):
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system",
-                 "content": "You are an AI that can identify the theme and extract insights from the content."},
-                {"role": "user",
-                 "content": f"Analyze this content: \n\n{content}"}
-            ]
-        )
+        with METRICS.timer("api_call_seconds", endpoint="chat"):
+            response = client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=summary_messages(content)
+            )
 
         summary = response.choices[0].message.content.strip()
+        if cache is not None:
+            cache.set(key, summary)
 
         return summary
 
     except Exception as e:
+        METRICS.count("failures_total", stage="api", endpoint="chat")
         print(f"Error analyzing content: {e}")
         return ""
 
 
-def read_json_file(file_path):
+def read_json_file(file_path, object_hook=None):
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
+            data = json.load(file, object_hook=object_hook)
         return data
     except FileNotFoundError:
         print(f"Error: File '{file_path}' not found.")
@@ -93,12 +55,15 @@ def read_json_file(file_path):
     return None
 
 
-def read_htm_file(file_path):
+def read_document_file(file_path):
+    """
+    Text of a downloaded document, paragraphs separated by blank lines: HTML is
+    extracted while it is read, PDF and Word files whole by attachments.extract_text.
+    """
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            html_content = file.read()
-            html_content = clean_text(html_content)
-        return html_content
+        if file_path.endswith(".htm"):
+            return "\n\n".join(iter_html_text(file_path))
+        return extract_text(file_path, max_pages=None, max_chars=None) or None
     except FileNotFoundError:
         print(f"Error: File '{file_path}' not found.")
     except Exception as e:
@@ -106,201 +71,462 @@ def read_htm_file(file_path):
     return None
 
 
-def process_bot_comments(documents, client):
+def load_previous_scores(previous_file):
+    """Index the scored comments of a previous analysis (JSON or NDJSON) by Comment ID."""
+    scored = {}
+    try:
+        for record in read_docket_records(previous_file):
+            comment = record["data"]
+            if record["type"] == "comment" and comment.get("Comment ID") and "Bot_Likelihood_Score" in comment:
+                scored[comment["Comment ID"]] = Comment((key, comment[key]) for key in
+                                                        ("Bot_Likelihood_Score", "Sentiment", "Last Modified",
+                                                         "Score Source", "Attachment Text", "Attachment Analysis")
+                                                        if key in comment)
+    except Exception as e:
+        print(f"Error reading previous analysis '{previous_file}': {e}")
+    return scored
+
+
+def carry_over_score(comment, scored):
+    """Copy the previous score of a comment if it has not changed since. Returns True when copied."""
+    previous_comment = scored.get(comment.get("Comment ID"))
+    if previous_comment and previous_comment.get("Last Modified") == comment.get("Last Modified"):
+        comment["Bot_Likelihood_Score"] = previous_comment["Bot_Likelihood_Score"]
+        comment["Sentiment"] = previous_comment.get("Sentiment")
+        for key in ("Score Source", "Attachment Text", "Attachment Analysis"):
+            if key in previous_comment:
+                comment[key] = previous_comment[key]
+        return True
+    return False
+
+
+@METRICS.timed("score_comments")
+def score_comments(comments, engine, local_scorer=None, cluster_index=None, day_counts=None):
+    """
+    Cluster near-duplicate comments and score one representative per cluster on the
+    async engine, fanning its score out to the other members. Clusters with a member
+    scored in a previous run are not sent at all. With a `local_scorer`, GPT is only
+    asked about representatives whose local score is uncertain; the others keep the
+    local score and only get moderation categories. The local model is trained on
+    comment bodies, so comments scored on attachment text always go to GPT.
+    A batch of a larger docket takes its clusters from the docket's ClusterIndex and
+    its posting days from `day_counts` (local_scorer.posting_days).
+    """
+    eligible = RecordView.where(comments, scoring_text)
+    clusters = cluster_comments(eligible) if cluster_index is None else cluster_index.assign(eligible)
+    fan_out_scores(eligible, clusters)
+    representatives = [eligible[members[0]] for members in clusters
+                       if "Bot_Likelihood_Score" not in eligible[members[0]]]
+    print(f"{len(eligible)} comments in {len(clusters)} clusters, {len(representatives)} to score")
+    if local_scorer is not None and representatives:
+        local_scores = local_scorer.predict(eligible, day_counts)
+        position = {id(comment): i for i, comment in enumerate(eligible)}
+        confident = []
+        uncertain = []
+        for comment in representatives:
+            local_score = local_scores[position[id(comment)]]
+            if comment.get("Attachments", 0) or local_scorer.is_uncertain(local_score):
+                uncertain.append(comment)
+            else:
+                comment["Bot_Likelihood_Score"] = round(float(local_score), 2)
+                comment["Score Source"] = "local"
+                confident.append(comment)
+        print(f"Scored {len(confident)} locally, {len(uncertain)} left for GPT")
+        engine.score(confident, bot_likelihood=False)
+        representatives = uncertain
+        for comment in representatives:
+            comment["Score Source"] = "gpt"
+    engine.score(representatives)
+    fan_out_scores(eligible, clusters)
+    if cluster_index is not None:
+        cluster_index.remember(eligible)
+    return comments
+
+
+@METRICS.timed("summarize_attachments")
+def summarize_attachments(comments, client, cache=None, engine=None):
+    """
+    Attach an 'Attachment Analysis' to every comment whose attachments have text.
+    Identical attachments, such as a letter filed by several organizations, are summarized once.
     """
-    Read comments, score for bot likelihood, and update CSV
+    pending = [comment for comment in comments
+               if comment.get("Attachment Text") and "Attachment Analysis" not in comment]
+    texts = list(dict.fromkeys(comment["Attachment Text"] for comment in pending))
+    if engine is not None:
+        summaries = engine.summarize_all(texts)
+    else:
+        summaries = [summarize_content(client, text, cache) for text in texts]
+    analyses = dict(zip(texts, summaries))
+    for comment in pending:
+        comment["Attachment Analysis"] = analyses[comment["Attachment Text"]]
+    return comments
+
+
+def carry_over_scores(documents, previous_file):
     """
+    Copy the scores of comments left unchanged since a previous analysis
+    so score_comments only scores the new entries.
+    """
+    scored = load_previous_scores(previous_file)
 
+    carried = 0
     for document in documents:
-        if document.get("Comments"):
-            for comment in document.get("Comments"):
-                if comment.get("Comment") and comment.get("Attachments", 0) == 0:
-                    bot_score = analyze_comment_for_bot_likelihood(client, comment.get("Comment"))
-                    sentiment = analyze_comment_sentiment(client, comment.get("Comment"))
-                    comment['Bot_Likelihood_Score'] = bot_score
-                    if sentiment:
-                        comment['Sentiment'] = sentiment.__dict__
-                    else:
-                        comment['Sentiment'] = None
-                    print(f"Processed Comment Bot Score = {bot_score}")
+        for comment in document.get("Comments") or []:
+            carried += carry_over_score(comment, scored)
 
-    return documents
+    print(f"Reusing scores of {carried} unchanged comments")
+    return carried
 
 
-def distribute_comments(comments, comments_with_attachments, all_comments):
-    # Load the CSV data
-    df = pd.DataFrame(comments)
+class CommentStats:
+    """
+    Running aggregates behind the comment charts. Comments are added a batch at a
+    time, each batch as one comment frame, so the charts can be drawn from a stream
+    without holding every comment. Given an `exporter`, every frame is also
+    written to Parquet. Words are only counted for the word cloud when `words` is set.
+    """
+
+    def __init__(self, exporter=None, words=True):
+        self.scores = Counter()
+        self.words = Counter()
+        self.months = Counter()
+        self.sentiments = Counter()
+        self.with_attachments = 0
+        self.without_attachments = 0
+        self.exporter = exporter
+        self._wordcloud = None
+        if words:
+            # wordcloud loads matplotlib, so it is only imported when charts are drawn
+            from wordcloud import WordCloud
+
+            self._wordcloud = WordCloud(width=800, height=400, background_color='white')
+
+    def add(self, comment):
+        self.add_comments([comment])
+
+    def add_comments(self, comments, document_ids=None):
+        if comments:
+            self.add_frame(comments_to_frame(comments, document_ids))
+
+    def add_frame(self, frame):
+        aggregates = frame_aggregates(frame)
+        self.scores.update(aggregates["scores"].to_dict())
+        self.months.update(aggregates["months"].to_dict())
+        self.sentiments.update(aggregates["sentiments"].to_dict())
+        self.with_attachments += aggregates["with_attachments"]
+        self.without_attachments += aggregates["without_attachments"]
+        # Form letters repeat, so each distinct text is tokenized once and weighted by its copies
+        if self._wordcloud is not None:
+            for text, copies in aggregates["texts"].value_counts(sort=False).items():
+                for word, count in self._wordcloud.process_text(text).items():
+                    self.words[word] += count * int(copies)
+        if self.exporter is not None:
+            self.exporter.write(frame)
+
+
+@METRICS.timed("plot_comment_stats")
+def plot_comment_stats(stats, image_dir="images"):
+    """Draw the comment charts into `image_dir` and return their paths."""
+    from charts import comment_chart_jobs, render_charts
+
+    score_distribution = pd.Series(stats.scores, dtype=float).sort_index()
+    return (score_distribution, *render_charts(comment_chart_jobs(stats, image_dir),
+                                               manifest_file=os.path.join(image_dir, ".chart_hashes.json")))
+
+
+@METRICS.timed("distribute_comments")
+def distribute_comments(frame, exporter=None, image_dir="images"):
+    """
+    Print and chart the statistics of a comment frame from comments_to_frame.
+    With `image_dir` None, no charts are drawn and matplotlib is never loaded.
+    """
+    df = frame[frame["Attachments"] == 0]
 
     # Show basic info and statistics
     df_info = df.info()
     df_description = df.describe()
     print(df_info, df_description)
 
-    # Analyze the distribution of scores
-    score_distribution = df['Bot_Likelihood_Score'].value_counts().sort_index()
-
-    # Generate word cloud for comment content
-    comments_with_content = " ".join(df.get('Comment', "").dropna())
-    wordcloud = WordCloud(width=800, height=400, background_color='white').generate(comments_with_content)
-
-    # Plot the score distribution
-    plt.figure(figsize=(8, 6))
-    score_distribution.plot(kind='bar', color='skyblue', edgecolor='black')
-    plt.title("Distribution of Bot Likelihood Scores")
-    plt.xlabel("Bot_Likelihood_Score")
-    plt.ylabel("Frequency")
-    plt.xticks(rotation=0)
-    plt.tight_layout()
-    score_plot_path = 'images/score_distribution.png'
-    plt.savefig(score_plot_path)
-
-    # Plot the word cloud
-    plt.figure(figsize=(10, 8))
-    plt.imshow(wordcloud, interpolation='bilinear')
-    plt.axis('off')
-    plt.title("Word Cloud of Comments")
-    wordcloud_plot_path = 'images/comment_wordcloud.png'
-    plt.savefig(wordcloud_plot_path)
-
-    # Plot the ratio chart
-    size1 = len(comments)
-    size2 = len(comments_with_attachments)
-
-    # Calculate ratio
-    ratio = size1 / size2 if size2 != 0 else None
-
-    # Data for the chart
-    labels = ['Comments without attachments', 'Comments with attachments']
-    sizes = [size1, size2]
-
-    # Create a bar chart
-    plt.figure(figsize=(8, 5))
-    plt.bar(labels, sizes, color=['blue', 'orange'])
-
-    # Add labels and title
-    plt.title(f"Sizes and Ratio of Two Lists (Ratio: {ratio:.2f} if applicable)")
-    plt.ylabel('Size')
-    plt.xlabel('Lists')
-
-    # Display the chart
-    ratio_chart_path = 'images/comment_ratio.png'
-    plt.savefig(ratio_chart_path)
-
-    # Monthly Breakdown od comments
-    # Extract months from Posted On attribute
-    months = [pd.to_datetime(item['Posted On'], format='%b %d, %Y').strftime('%b') for item in all_comments]
-
-    # Count occurrences of each month
-    month_counts = Counter(months)
-
-    # Sort month data in calendar order
-    sorted_months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-    month_labels = [month for month in sorted_months if month in month_counts]
-    month_values = [month_counts[month] for month in month_labels]
-
-    # Create a bar chart
-    plt.figure(figsize=(10, 6))
-    plt.bar(month_labels, month_values, color='skyblue')
-    plt.title("Monthly Breakdown of Comments")
-    plt.xlabel("Month")
-    plt.ylabel("Number of Comments")
-    plt.xticks(rotation=45)
-    plt.grid(axis='y', linestyle='--', alpha=0.7)
-
-    comments_monthly_breakdown_path = 'images/comments_monthly_breakdown.png'
-    plt.savefig(comments_monthly_breakdown_path)
-
-    # Create a chart for sentiment analysis
-    sentiment_counts = {}
-    for comment in comments:
-        for sentiment, value in comment["Sentiment"].items():
-            if value:  # Count only `True` values
-                sentiment_counts[sentiment] = sentiment_counts.get(sentiment, 0) + 1
-
-    # Prepare data for the bar chart
-    categories = list(sentiment_counts.keys())
-    values = list(sentiment_counts.values())
-
-    # Create the bar chart
-    plt.figure(figsize=(10, 6))
-    plt.bar(categories, values, color='skyblue')
-    plt.title('Sentiment Analysis Distribution', fontsize=16)
-    plt.xlabel('Sentiment Categories', fontsize=12)
-    plt.ylabel('Count', fontsize=12)
-    plt.xticks(rotation=45, ha='right')
-    plt.grid(axis='y', linestyle='--', alpha=0.7)
-
-    # Show the chart
-    plt.tight_layout()
-    comments_sentiment_analysis_path = 'images/comments_sentiment_analysis.png'
-    plt.savefig(comments_sentiment_analysis_path)
+    stats = CommentStats(exporter, words=image_dir is not None)
+    stats.add_frame(frame)
+    if image_dir is None:
+        return df_info, df_description
 
     # Return key insights and plots
-    df_info, df_description, score_distribution, score_plot_path, wordcloud_plot_path, ratio_chart_path, comments_monthly_breakdown_path, comments_sentiment_analysis_path
+    return (df_info, df_description, *plot_comment_stats(stats, image_dir))
 
 
-def summarize_docket(docket, client):
+@METRICS.timed("summarize_docket")
+def summarize_docket(docket, client, cache=None):
 
     summary = docket.get("Summary")
     agenda = docket.get("Agenda")
     content = f"SUMMARY:\n{summary}\n\nAGENDA:\n{agenda}"
 
-    docket_theme = summarize_content(client, content)
+    docket_theme = summarize_content(client, content, cache)
 
     return docket_theme
 
 
-def summarize_documents(documents, client):
+@METRICS.timed("summarize_document")
+def summarize_document(document, client, cache=None, engine=None):
+    """
+    Attach an analysis of the document. With an `engine`, long documents are
+    summarized chunk by chunk and the partial summaries merged.
+    """
+    if document.get("Document"):
+        document_raw = document.get("Document")
+        content = ""
+        for key, value in document_raw.items():
+            content += f"{key}:\n{value}\n\n"
+    elif document.get("Document Path"):
+        content = read_document_file(document["Document Path"])
+    else:
+        content = None
+    if not content:
+        document["Analysis"] = None
+        return document
+
+    if engine is not None:
+        document["Analysis"] = engine.summarize(content)
+    else:
+        document["Analysis"] = summarize_content(client, content, cache)
+    return document
+
+
+@METRICS.timed("summarize_documents")
+def summarize_documents(documents, client, cache=None, engine=None):
 
     for document in documents:
-        if document.get("Document"):
-            document_raw = document.get("Document")
-            summary = ""
-            for key, value in document_raw.items():
-                summary += f"{key}:\n{value}\n\n"
-            document_summary = summarize_content(client, summary)
-            document["Analysis"] = document_summary
-        elif document.get("Document Path"):
-            html_content = read_htm_file(document.get("Document Path", ""))
-            document_summary = summarize_content(client, html_content)
-            document["Analysis"] = document_summary
-        else:
-            document["Analysis"] = None
+        summarize_document(document, client, cache, engine)
 
     return documents
 
 
-def analyze(input_file, open_ai_key):
-    docket = read_json_file(input_file)
-    documents = docket.get("Documents", [])
+def read_docket_records(file_path):
+    """Yield the streaming records of a docket stored as NDJSON or as a docket.json file."""
+    if file_path.endswith(".ndjson"):
+        yield from iter_ndjson(file_path)
+    else:
+        docket = read_json_file(file_path, object_hook=from_json)
+        if docket is not None:
+            yield from docket_to_records(docket)
 
-    client = OpenAI(api_key=open_ai_key)
 
-    # Run the processing
-    new_documents = process_bot_comments(documents, client)
-    new_documents = summarize_documents(new_documents, client)
-    # Theme and insights of Docket
-    docket_analysis = summarize_docket(docket, client)
-    docket["Analysis"] = docket_analysis
+class DocketProfile:
+    """
+    What scoring a streamed docket a batch at a time needs to know about all of it,
+    gathered in one pass over its comments: the posting Timeline, and the
+    near-duplicate clusters and posting days of the plain comments, which
+    score_comments clusters and the local scorer counts as one group.
+    """
+
+    def __init__(self, comments):
+        self.clusters = ClusterIndex()
+        posted_on = []
+
+        def scan():
+            for comment in comments:
+                if not comment.get("Attachments", 0) and scoring_text(comment):
+                    self.clusters.add(comment)
+                    posted_on.append(comment.get("Posted On"))
+                yield comment
+
+        self.timeline = Timeline.from_comments(scan())
+        self.clusters.build()
+        self.day_counts = posting_days(posted_on)
+
+
+def iter_analyzed_records(records, client, engine, scored=None, stats=None, batch_size=256, cache=None,
+                          local_scorer=None, attachments=None, profile=None):
+    """
+    Score, summarize and tally a stream of docket records, yielding each record
+    once its analysis is attached. Comments are scored `batch_size` at a time on
+    the async `engine`. With an AttachmentProcessor, the
+    attachments of each batch are read before it is scored. With the DocketProfile
+    of the whole docket, each batch is flagged for posting bursts and its plain
+    comments are clustered and scored as part of the docket, not of the batch.
+    """
+    scored = scored or {}
+    batch = []
+
+    def flush(batch):
+        comments = [record["data"] for record in batch]
+        if profile is not None:
+            profile.timeline.flag(comments)
+        attachment_comments, plain_comments = partition(comments, lambda comment: comment.get("Attachments", 0))
+        if profile is not None:
+            score_comments(plain_comments, engine, local_scorer, profile.clusters, profile.day_counts)
+        else:
+            score_comments(plain_comments, engine, local_scorer)
+        if attachments is not None:
+            attachments.process(attachment_comments)
+            score_comments(attachment_comments, engine, local_scorer)
+            summarize_attachments(attachment_comments, client, cache, engine)
+        if stats is not None:
+            stats.add_comments(comments, [record.get("document") for record in batch])
+        yield from batch
+
+    for record in records:
+        data = record["data"]
+        if record["type"] == "comment":
+            carry_over_score(data, scored)
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield from flush(batch)
+                batch = []
+            continue
+
+        yield from flush(batch)
+        batch = []
+        if record["type"] == "docket":
+            data["Analysis"] = summarize_docket(data, client, cache)
+            if profile is not None:
+                data["Timeline"] = profile.timeline.summary()
+        elif record["type"] == "document":
+            summarize_document(data, client, cache, engine)
+        yield record
+
+    yield from flush(batch)
+
+
+def analyze_stream(input_file, client, previous_analysis=None, output_file="docket_analysis.ndjson", engine=None,
+                   cache=None, local_scorer=None, parquet_file=None, image_dir="images", attachments=None):
+    """
+    Analyze an NDJSON docket in bounded memory, writing the analysis as NDJSON too.
+    The input is read twice: first for the posting times, near-duplicate clusters
+    and posting days of all comments (DocketProfile), so bursts, cluster sizes and
+    the local scorer's features are those of the docket before the first batch is scored.
+    """
+    scored = load_previous_scores(previous_analysis) if previous_analysis else {}
+    stats = CommentStats(ParquetExporter(parquet_file) if parquet_file else None, words=image_dir is not None)
+    with METRICS.stage("timeline"):
+        profile = DocketProfile(record["data"] for record in read_docket_records(input_file)
+                                if record["type"] == "comment")
+    records = iter_analyzed_records(read_docket_records(input_file), client, engine, scored, stats, cache=cache,
+                                    local_scorer=local_scorer, attachments=attachments, profile=profile)
+    try:
+        write_ndjson(output_file, records)
+    finally:
+        if stats.exporter is not None:
+            stats.exporter.close()
+    if image_dir is not None:
+        plot_comment_stats(stats, image_dir)
+    return output_file
+
+
+@METRICS.timed("analyze_docket")
+def analyze_docket(input_file, client, engine, cache=None, previous_analysis=None, local_scorer=None,
+                   parquet_file=None, output_file=None, image_dir="images", attachments=None):
+    """
+    Analyze a scraped docket with clients owned by the caller, so several dockets
+    can share them. Returns the path of the analysis, which defaults to
+    docket_analysis.json, or docket_analysis.ndjson for an .ndjson input.
+    With an AttachmentProcessor, attachments are downloaded and read while the
+    plain-text comments are scored, then scored and summarized themselves.
+    Comments are flagged for posting bursts before scoring, and the docket gets a
+    'Timeline' of its posting times. No charts are drawn when `image_dir` is None.
+    """
+    if input_file.endswith(".ndjson"):
+        return analyze_stream(input_file, client, previous_analysis, output_file or "docket_analysis.ndjson",
+                              engine, cache, local_scorer, parquet_file, image_dir, attachments)
+    output_file = output_file or "docket_analysis.json"
+
+    # Comments are loaded as slotted records rather than dicts; see records.Comment
+    docket = read_json_file(input_file, object_hook=from_json)
+    documents = docket.get("Documents", [])
+
+    if previous_analysis:
+        carry_over_scores(documents, previous_analysis)
 
     all_comments = []
+    document_ids = []
     for document in documents:
         if document.get("Comments"):
             for comment in document.get("Comments"):
                 all_comments.append(comment)
+                document_ids.append(document.get("Document ID"))
 
-    comments_without_attachments = []
-    comments_with_attachments = []
-    for comment in all_comments:
-        if comment.get("Attachments", 0) == 0:
-            comments_without_attachments.append(comment)
-        else:
-            comments_with_attachments.append(comment)
+    timeline = analyze_timeline(all_comments)
+
+    # Attachments are fetched in the background, so the plain-text comments are not held up
+    attachment_comments, plain_comments = partition(all_comments, lambda comment: comment.get("Attachments", 0))
+    pending_attachments = attachments.start(attachment_comments) if attachments is not None else None
+
+    # Run the processing
+    score_comments(plain_comments, engine, local_scorer)
+    new_documents = summarize_documents(documents, client, cache, engine)
+    if pending_attachments is not None:
+        pending_attachments.result()
+        score_comments(attachment_comments, engine, local_scorer)
+        summarize_attachments(attachment_comments, client, cache, engine)
 
-    distribute_comments(comments_without_attachments, comments_with_attachments, all_comments)
+    # Theme and insights of Docket
+    docket_analysis = summarize_docket(docket, client, cache)
+    docket["Analysis"] = docket_analysis
+    docket["Timeline"] = timeline.summary([comment.get("Cluster ID") for comment in all_comments])
 
-    with open("docket_analysis.json", "w", encoding="utf-8") as json_file:
+    frame = comments_to_frame(all_comments, document_ids)
+    exporter = ParquetExporter(parquet_file) if parquet_file else None
+    distribute_comments(frame, exporter, image_dir)
+    if exporter is not None:
+        exporter.close()
+
+    with open(output_file, "w", encoding="utf-8") as json_file:
         docket["Documents"] = new_documents
-        json.dump(docket, json_file, indent=4, ensure_ascii=False)
+        json.dump(docket, json_file, indent=4, ensure_ascii=False, default=to_json)
+    return output_file
+
 
-    print(f"\nAnalysis completed. Check results here:\n- {input_file}\n- docket_analysis.json\n- images/\n- downloads/")
+def analyze(input_file, open_ai_key, previous_analysis=None, concurrency=8, base_url=None,
+            cache_file="llm_cache.sqlite", local_model_file=None, parquet_file=None, attachment_dir="downloads/attachments",
+            image_dir="images", output_file=None):
+    """
+    Analyze a scraped docket. An input file ending in .ndjson is analyzed as a stream.
+    Comments are scored with up to `concurrency` overlapping API calls, and every
+    result is cached in `cache_file` so unchanged text is never sent twice.
+    A `local_model_file` from local_scorer.train_local_model keeps clear-cut
+    comments away from GPT. With `parquet_file`, the scored comments are also
+    exported to Parquet as one typed table. The attachments of comments are
+    downloaded into `attachment_dir`, unless it is None, and scored on their text.
+    Charts are drawn into `image_dir`, unless it is None. Returns the path of the
+    analysis, `output_file` when given.
+    """
+    client = OpenAI(api_key=open_ai_key, base_url=base_url)
+    cache = ResultCache(cache_file) if cache_file else None
+    engine = ScoringEngine(open_ai_key, base_url=base_url, concurrency=concurrency, cache=cache)
+    local_scorer = LocalScorer.load(local_model_file) if local_model_file else None
+    attachments = AttachmentProcessor(attachment_dir) if attachment_dir else None
+
+    try:
+        output_file = analyze_docket(input_file, client, engine, cache, previous_analysis, local_scorer,
+                                     parquet_file, output_file, image_dir, attachments)
+    finally:
+        if attachments is not None:
+            attachments.close()
+        engine.close()
+        if cache is not None:
+            print(f"LLM cache: {cache.stats()}")
+            cache.close()
+
+    outputs = [input_file, output_file, *([f"{image_dir}/"] if image_dir else []), "downloads/"]
+    print("\nAnalysis completed. Check results here:\n" + "\n".join(f"- {path}" for path in outputs))
+    return output_file
+
+
+@METRICS.timed("charts")
+def chart_analysis(analysis_file, image_dir="images", batch_size=10000):
+    """Draw the comment charts of a finished analysis (JSON or NDJSON) without scoring anything."""
+    stats = CommentStats()
+    batch = []
+    document_ids = []
+    for record in read_docket_records(analysis_file):
+        if record["type"] == "comment":
+            batch.append(record["data"])
+            document_ids.append(record.get("document"))
+            if len(batch) >= batch_size:
+                stats.add_comments(batch, document_ids)
+                batch = []
+                document_ids = []
+    stats.add_comments(batch, document_ids)
+    return plot_comment_stats(stats, image_dir)
@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import threading
+import xml.etree.ElementTree as ElementTree
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from downloads import DownloadManager
+from metrics import METRICS
+from utils import iter_html_text, normalize_paragraph
+
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def iter_pdf_text(path, max_pages=100):
+    """
+    Yield the text of a PDF a page at a time, so a long filing is never held whole.
+    There is no page limit if `max_pages` is None.
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages):
+        if max_pages is not None and number >= max_pages:
+            break
+        yield page.extract_text() or ""
+
+
+def iter_docx_text(path):
+    """Yield the paragraphs of a Word document, parsing its document.xml as a stream."""
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as document:
+        runs = []
+        for _, element in ElementTree.iterparse(document):
+            if element.tag == f"{WORD_NAMESPACE}t":
+                runs.append(element.text or "")
+            elif element.tag == f"{WORD_NAMESPACE}p":
+                yield "".join(runs)
+                runs = []
+                element.clear()
+
+
+def iter_plain_text(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as text_file:
+        yield from text_file
+
+
+def extract_text(path, max_pages=100, max_chars=20000):
+    """
+    The cleaned text of a downloaded attachment (PDF, Word, HTML or plain text),
+    read until `max_chars` characters are collected, or whole if it is None. Empty
+    for other formats and for scanned PDFs without a text layer.
+    """
+    extension = path.rsplit(".", 1)[-1].lower()
+    if extension == "pdf":
+        parts = iter_pdf_text(path, max_pages)
+    elif extension == "docx":
+        parts = iter_docx_text(path)
+    elif extension == "htm":
+        parts = iter_html_text(path)
+    elif extension == "txt":
+        parts = iter_plain_text(path)
+    else:
+        return ""
+
+    paragraphs = []
+    length = 0
+    for part in parts:
+        paragraph = normalize_paragraph(part)
+        if paragraph:
+            paragraphs.append(paragraph)
+            length += len(paragraph) + 2
+            if max_chars is not None and length >= max_chars:
+                break
+    return "\n\n".join(paragraphs)[:max_chars]
+
+
+class AttachmentProcessor:
+    """
+    Downloads the attachments of comments and extracts their text, so comments
+    submitted as PDF or Word files can be scored and summarized. Downloads run on
+    the bounded pool of a DownloadManager, whose files are named by content hash;
+    each file is handed to a process pool for extraction as soon as it arrives.
+    The text of a file is kept beside it as `<file>.text`, so a file is parsed once.
+    """
+
+    def __init__(self, directory="downloads/attachments", download_workers=4, extract_workers=None,
+                 max_pages=100, max_chars=20000, downloads=None):
+        self.max_pages = max_pages
+        self.max_chars = max_chars
+        self.downloads = downloads or DownloadManager(directory, workers=download_workers)
+        self._owns_downloads = downloads is None
+        self._extract_workers = extract_workers or os.cpu_count() or 1
+        self._pool = None
+        self._lock = threading.Lock()
+        self._runner = ThreadPoolExecutor()
+
+    def _extract(self, path):
+        """Future of the text of a downloaded file, read from its cache file when there is one."""
+        cache_file = f"{path}.text"
+        if os.path.exists(cache_file):
+            future = Future()
+            with open(cache_file, "r", encoding="utf-8") as text_file:
+                future.set_result(text_file.read())
+            METRICS.count("attachments_total", result="cached")
+            return future
+        with self._lock:
+            # Worker processes are only started once there is a file to parse
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self._extract_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        future = self._pool.submit(extract_text, path, self.max_pages, self.max_chars)
+        future.add_done_callback(lambda done: self._save(cache_file, done))
+        return future
+
+    @staticmethod
+    def _save(cache_file, future):
+        if future.exception() is not None:
+            return
+        METRICS.count("attachments_total", result="extracted" if future.result() else "empty")
+        temporary_file = f"{cache_file}.tmp"
+        with open(temporary_file, "w", encoding="utf-8") as text_file:
+            text_file.write(future.result())
+        os.replace(temporary_file, cache_file)
+
+    @METRICS.timed("attachments")
+    def process(self, comments):
+        """
+        Set 'Attachment Text' on every comment with 'Attachment URLs' and no text yet:
+        the text of its attachments, empty when none could be read. Returns the comments.
+        """
+        pending = [comment for comment in comments
+                   if comment.get("Attachment URLs") and "Attachment Text" not in comment]
+        downloads = {}
+        for comment in pending:
+            for url in comment["Attachment URLs"]:
+                if url not in downloads:
+                    downloads[url] = self.downloads.submit(url)
+
+        extractions = {}
+        for future in as_completed(downloads.values()):
+            path = future.result()
+            if path and path not in extractions:
+                extractions[path] = self._extract(path)
+
+        texts = {}
+        for path, future in extractions.items():
+            try:
+                texts[path] = future.result()
+            except Exception as e:
+                print(f"Error extracting text from {path}: {e}")
+                METRICS.count("attachments_total", result="failed")
+                METRICS.count("failures_total", stage="extract")
+                texts[path] = ""
+
+        for comment in pending:
+            paths = [downloads[url].result() for url in comment["Attachment URLs"]]
+            parts = dict.fromkeys(texts[path] for path in paths if path and texts[path])
+            comment["Attachment Text"] = "\n\n".join(parts)
+        print(f"Extracted the attachments of {len(pending)} comments")
+        return comments
+
+    def start(self, comments):
+        """Run `process` in the background; the Future resolves to the comments."""
+        return self._runner.submit(self.process, comments)
+
+    def close(self):
+        self._runner.shutdown(wait=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+        if self._owns_downloads:
+            self.downloads.close()
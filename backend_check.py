@@ -0,0 +1,118 @@
+import argparse
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+from backends import HttpBackend
+
+
+FIXTURE_FILE = "fixtures/regulations_api.json"
+
+
+class StubApi:
+    """
+    Local stand-in for the regulations.gov v4 API, replaying the responses of a
+    fixture file. A request is answered by the first response recorded for its
+    path and query parameters, and with a 404 when there is none. A response
+    with "times" is only served that many times, e.g. a 429 before the page itself.
+    """
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+        self._served = [0] * len(responses)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}/v4"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _respond(self, path, params):
+        with self._lock:
+            self.requests.append((path, params))
+            for i, response in enumerate(self.responses):
+                if response["path"] != path or response["params"] != params:
+                    continue
+                if self._served[i] >= response.get("times", float("inf")):
+                    continue
+                self._served[i] += 1
+                return response.get("status", 200), response.get("headers", {}), response["body"]
+        return 404, {}, {"errors": [{"status": "404", "title": "Not Found", "detail": f"No fixture for {path} {params}"}]}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                status, headers, body = server._respond(url.path.removeprefix("/v4/"), dict(parse_qsl(url.query)))
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/vnd.api+json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def _compare(name, actual, expected):
+    if actual == expected:
+        return []
+    print(f"Mismatch in {name}:\n  expected {expected!r}\n  got      {actual!r}")
+    return [name]
+
+
+def check_backend(fixture_file=FIXTURE_FILE):
+    """
+    Run every HttpBackend call against a stub serving the fixture's recorded API
+    responses and compare the records with the ones the fixture expects.
+    Returns the names of the calls that differ.
+    """
+    with open(fixture_file, "r", encoding="utf-8") as json_file:
+        fixture = json.load(json_file)
+    expected = fixture["expected"]
+    stub = StubApi(fixture["responses"]).start()
+    backend = HttpBackend(api_key="TEST_KEY", base_url=stub.base_url)
+    failures = []
+    try:
+        docket = expected["docket"]
+        failures += _compare("extract_docket", backend.extract_docket(docket["url"]), docket["record"])
+        failures += _compare("document_links", backend.document_links(docket["url"]), expected["document_links"])
+        for link, document in expected["documents"].items():
+            failures += _compare(f"extract_document {link}", list(backend.extract_document(link)),
+                                 [document["record"], document["url"]])
+        for link, listed in expected["comment_urls"].items():
+            failures += _compare(f"comment_urls {link}", [list(item) for item in backend.comment_urls(link)], listed)
+        for url, record in expected["comments"].items():
+            failures += _compare(f"extract_comment {url}", backend.extract_comment(url), record)
+    finally:
+        backend.close()
+        stub.close()
+    print(f"{len(stub.requests)} requests replayed, {len(failures)} mismatches")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the HTTP backend against recorded regulations.gov API responses.")
+    parser.add_argument("--fixtures", default=FIXTURE_FILE)
+    args = parser.parse_args()
+    sys.exit(1 if check_backend(args.fixtures) else 0)
@@ -0,0 +1,361 @@
+import os
+import time
+import re
+import html
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+from zoneinfo import ZoneInfo
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import METRICS
+from ratelimit import retry_after
+
+
+WEB_URL = "https://www.regulations.gov"
+API_URL = "https://api.regulations.gov/v4"
+# regulations.gov shows dates and takes date filters in the agencies' time zone
+EASTERN = ZoneInfo("America/New_York")
+# Starting and highest request budgets per backend, in requests per second. The API
+# allows about 1000 requests an hour per key; page loads pace the browser themselves.
+REQUEST_RATES = {"selenium": (0.1, 1.0), "http": (0.25, 1000 / 3600), "auto": (0.25, 1000 / 3600)}
+
+
+def clean_comment(comment_content):
+    """Normalize comment text the same way for every backend."""
+    cleaned_comment = html.unescape(comment_content)
+    cleaned_comment = re.sub(r"\s+", " ", cleaned_comment).strip()
+    cleaned_comment = re.sub(r"•", "-", cleaned_comment)
+    return cleaned_comment
+
+
+def record_id(url):
+    """Return the docket, document or comment ID at the end of a regulations.gov URL."""
+    return urlparse(url).path.rstrip("/").split("/")[-1]
+
+
+def throttled(error):
+    """Whether the API pushed back on a request (a 429, a 5xx or a Retry-After) rather than refused it."""
+    response = getattr(error, "response", None)
+    if retry_after(error) is not None:
+        return True
+    return response is not None and (response.status_code == 429 or response.status_code >= 500)
+
+
+class HttpBackend:
+    """
+    Reads docket, document and comment records from the regulations.gov JSON API.
+    Point `base_url` at a local server to replay recorded fixtures.
+    Listing pages are paced by `rate_limiter` when one is given.
+    """
+
+    # API attribute -> label shown in the submitter info tab of a comment page
+    SUBMITTER_FIELDS = [
+        ("organization", "Organization Name"),
+        ("city", "City"),
+        ("stateProvinceRegion", "State or Province"),
+        ("country", "Country"),
+        ("zip", "ZIP/Postal Code"),
+    ]
+
+    # The API refuses page numbers above this for a single query
+    MAX_PAGES = 20
+
+    def __init__(self, api_key=None, base_url=API_URL, session=None, pool_size=10, timeout=30, rate_limiter=None,
+                 max_retries=3):
+        self.api_key = api_key or os.getenv("REGULATIONS_API_KEY", "DEMO_KEY")
+        self.base_url = base_url.rstrip("/")
+        self.session = session or self._initialize_session(pool_size)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+
+    @staticmethod
+    def _initialize_session(pool_size):
+        """Create a session whose connection pool can serve every worker."""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["Accept"] = "application/vnd.api+json"
+        return session
+
+    def spawn(self):
+        """Create another backend for a worker thread, sharing the pooled session."""
+        return HttpBackend(self.api_key, self.base_url, self.session, self.pool_size, self.timeout, self.rate_limiter,
+                           self.max_retries)
+
+    def close(self):
+        self.session.close()
+
+    def _get(self, path, **params):
+        endpoint = path.split("/")[0]
+        with METRICS.timer("http_request_seconds", endpoint=endpoint):
+            response = self.session.get(f"{self.base_url}/{path}", params=params,
+                                        headers={"X-Api-Key": self.api_key}, timeout=self.timeout)
+        if response.status_code >= 400:
+            METRICS.count("http_errors_total", endpoint=endpoint, status=response.status_code)
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _retryable(error):
+        """Whether a failed request may succeed later: throttled, a server error, or no response at all."""
+        return getattr(error, "response", None) is None or throttled(error)
+
+    def _paced_get(self, path, **params):
+        """
+        _get within the rate limiter's budget, reporting how the request went back to it.
+        A throttled request or server error is retried after its Retry-After, up to
+        `max_retries` attempts in all; the last error is raised.
+        """
+        for attempt in range(self.max_retries):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            started = time.monotonic()
+            try:
+                result = self._get(path, **params)
+            except requests.RequestException as e:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.backoff(retry_after(e))
+                if attempt + 1 == self.max_retries or not self._retryable(e):
+                    raise
+                print(f"Error requesting {path} (attempt {attempt + 1}): {e}")
+                METRICS.count("retries_total", stage="listing")
+                # An enabled rate limiter holds the next acquire back until the Retry-After has passed
+                if self.rate_limiter is None or not self.rate_limiter.enabled:
+                    time.sleep(retry_after(e) or 2 ** attempt)
+                continue
+            if self.rate_limiter is not None:
+                self.rate_limiter.success(time.monotonic() - started)
+            return result
+
+    @staticmethod
+    def _eastern(value):
+        """An API timestamp, which is UTC, as an Eastern time."""
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).astimezone(EASTERN)
+
+    @classmethod
+    def _format_date(cls, value):
+        """Render an API timestamp the way the website does, as an Eastern date, e.g. 'Apr 4, 2022'."""
+        if not value:
+            return None
+        date = cls._eastern(value)
+        return f"{date:%b} {date.day}, {date.year}"
+
+    @classmethod
+    def _eastern_timestamp(cls, value):
+        """Convert an API timestamp to the Eastern time format its date filters expect."""
+        return cls._eastern(value).strftime("%Y-%m-%d %H:%M:%S")
+
+    def extract_docket(self, url):
+        """Extract basic docket details."""
+        docket_id = record_id(url)
+        attributes = self._get(f"dockets/{docket_id}")["data"]["attributes"]
+        comments = self._get("comments", **{"filter[docketId]": docket_id, "page[size]": 5})
+        docket_type = attributes.get("docketType")
+        return {
+            'Title': attributes.get("title"),
+            'Docket ID': docket_id,
+            'Agency': attributes.get("agencyId"),
+            'Summary': attributes.get("dkAbstract"),
+            'Docket Type': f"{docket_type} Docket".upper() if docket_type else None,
+            'Number of Comments': str(comments["meta"]["totalElements"]),
+            # The Unified Agenda abstract is only published on the website
+            'Agenda': None,
+        }
+
+    def document_links(self, url):
+        """Collect the proposed rule links of a docket."""
+        documents = self._get("documents", **{"filter[docketId]": record_id(url),
+                                              "filter[documentType]": "Proposed Rule",
+                                              "page[size]": 250})
+        return [f"{WEB_URL}/document/{item['id']}" for item in documents["data"]]
+
+    # Downloadable formats of a document, best first; PDF and Word files are read by attachments.extract_text
+    DOCUMENT_FORMATS = ["htm", "pdf", "docx"]
+
+    def extract_document(self, link):
+        """
+        Extract details of a single document and the URL of its downloadable content,
+        with the same fields as the Selenium backend. The API has no section
+        headings, so 'Document' only holds the action and the abstract.
+        """
+        document = self._get(f"documents/{record_id(link)}")["data"]
+        attributes = document["attributes"]
+        comments = self._get("comments", **{"filter[commentOnId]": attributes.get("objectId"), "page[size]": 5})
+        doc = {
+            'Proposed Rule Title': attributes.get("title"),
+            'Posted By': attributes.get("agencyId"),
+            'Posted Date': self._format_date(attributes.get("postedDate")),
+            'Document ID': document["id"],
+            'Comments Received': str(comments["meta"]["totalElements"]),
+        }
+        sections = {
+            "ACTION:": f"{attributes['documentType'].capitalize()}." if attributes.get("documentType") else None,
+            "SUMMARY:": attributes.get("docAbstract"),
+        }
+        if any(sections.values()):
+            doc['Document'] = {heading: text for heading, text in sections.items() if text}
+
+        file_urls = {item.get("format"): item["fileUrl"] for item in attributes.get("fileFormats") or []}
+        document_url = next((file_urls[name] for name in self.DOCUMENT_FORMATS if name in file_urls), None)
+        return doc, document_url
+
+    def comment_urls(self, link):
+        """
+        Yield (comment URL, last modified) for each comment listed for a document, page by
+        page until the listing runs out. The API serves at most MAX_PAGES pages per query, so longer listings are walked in
+        windows ordered by modification date.
+        """
+        object_id = self._get(f"documents/{record_id(link)}")["data"]["attributes"]["objectId"]
+        params = {"filter[commentOnId]": object_id, "sort": "lastModifiedDate,documentId", "page[size]": 250}
+        seen = set()
+        while True:
+            last_modified = None
+            new_comments = 0
+            for page in range(1, self.MAX_PAGES + 1):
+                listing = self._paced_get("comments", **params, **{"page[number]": page})
+                for item in listing["data"]:
+                    last_modified = item["attributes"].get("lastModifiedDate")
+                    if item["id"] not in seen:
+                        seen.add(item["id"])
+                        new_comments += 1
+                        yield f"{WEB_URL}/comment/{item['id']}", last_modified
+                if not listing["meta"].get("hasNextPage"):
+                    return
+            if not new_comments or not last_modified:
+                return
+            params["filter[lastModifiedDate][ge]"] = self._eastern_timestamp(last_modified)
+
+    def extract_comment(self, comment_url):
+        """Extract the submitter info, attachments and text of a comment."""
+        record = self._get(f"comments/{record_id(comment_url)}", include="attachments")
+        attributes = record["data"]["attributes"]
+
+        commenter_info = dict()
+        name = " ".join(part for part in (attributes.get("firstName"), attributes.get("lastName")) if part)
+        if name:
+            commenter_info["Submitter Name"] = name
+        for field, label in self.SUBMITTER_FIELDS:
+            if attributes.get(field):
+                commenter_info[label] = attributes[field]
+        commenter_info["Posted On"] = self._format_date(attributes.get("postedDate"))
+        # The full UTC timestamp, for bursts shorter than a day
+        commenter_info["Posted At"] = attributes.get("postedDate")
+        commenter_info["Last Modified"] = attributes.get("lastModifiedDate")
+
+        attachments = [item for item in record.get("included", []) if item.get("type") == "attachments"]
+        attachment_types = []
+        attachment_urls = []
+        for attachment in attachments:
+            file_urls = [file_format["fileUrl"] for file_format in attachment["attributes"].get("fileFormats") or []]
+            file_types = [urlparse(file_url).path.split('.')[-1] for file_url in file_urls]
+            attachment_types.extend(file_types)
+            # An attachment offered in several formats is read once, from its PDF when there is one
+            if file_urls:
+                attachment_urls.append(file_urls[file_types.index("pdf")] if "pdf" in file_types else file_urls[0])
+        commenter_info["Attachments"] = len(attachments)
+        commenter_info["Attachment Types"] = attachment_types
+        commenter_info["Attachment URLs"] = attachment_urls
+
+        # The API returns the comment body with inline markup such as <br/>
+        comment_content = re.sub(r"<[^>]+>", " ", attributes.get("comment") or "")
+        commenter_info["Comment"] = clean_comment(comment_content)
+
+        return commenter_info
+
+
+class FallbackBackend:
+    """
+    Uses the HTTP backend and falls back to Selenium for any call it fails on, such
+    as a missing or rejected API key. A throttled call is raised instead, so the
+    scraper's rate limiter backs off and retries it rather than every worker
+    starting a browser. The Selenium backend is only started the first time it is needed.
+    """
+
+    def __init__(self, primary, fallback_factory=None):
+        self.primary = primary
+        self.fallback_factory = fallback_factory or selenium_backend
+        self._fallback = None
+        self._lock = threading.Lock()
+
+    @property
+    def fallback(self):
+        with self._lock:
+            if self._fallback is None:
+                self._fallback = self.fallback_factory()
+            return self._fallback
+
+    def spawn(self):
+        return FallbackBackend(self.primary.spawn(), self.fallback_factory)
+
+    def close(self):
+        self.primary.close()
+        if self._fallback is not None:
+            self._fallback.close()
+
+    def comment_urls(self, link):
+        """Stream the listing from the HTTP backend, falling back if it fails before yielding anything."""
+        found = False
+        try:
+            for listed in self.primary.comment_urls(link):
+                found = True
+                yield listed
+            return
+        except Exception as e:
+            if found or throttled(e):
+                raise
+            print(f"HTTP backend failed on comment_urls ({e}), falling back to Selenium")
+        yield from self.fallback.comment_urls(link)
+
+    def __getattr__(self, name):
+        primary_method = getattr(self.primary, name)
+
+        def call(*args, **kwargs):
+            try:
+                return primary_method(*args, **kwargs)
+            except Exception as e:
+                if throttled(e):
+                    raise
+                print(f"HTTP backend failed on {name} ({e}), falling back to Selenium")
+                return getattr(self.fallback, name)(*args, **kwargs)
+
+        return call
+
+
+def selenium_backend(rate_limiter=None):
+    """Start a SeleniumBackend. Selenium is slow to import, so it is only loaded here."""
+    from selenium_backend import SeleniumBackend
+
+    return SeleniumBackend(rate_limiter)
+
+
+def request_rates(backend, requests_per_second=None, max_requests_per_second=None):
+    """
+    The starting and highest request budget of a scrape, from REQUEST_RATES for the
+    `backend` name where not given. A starting budget given alone climbs to RateLimiter's default.
+    """
+    default_rate, default_max_rate = REQUEST_RATES.get(backend, REQUEST_RATES["selenium"])
+    if requests_per_second is None:
+        requests_per_second = default_rate if max_requests_per_second is None else min(default_rate,
+                                                                                        max_requests_per_second)
+        if max_requests_per_second is None:
+            max_requests_per_second = default_max_rate
+    return requests_per_second, max_requests_per_second
+
+
+def create_backend(name="selenium", rate_limiter=None, **options):
+    """
+    Create a fetch backend: 'selenium', 'http', or 'auto' (HTTP with Selenium fallback).
+    Listing pages are paced by `rate_limiter` when one is given.
+    """
+    if name == "selenium":
+        return selenium_backend(rate_limiter)
+    if name == "http":
+        return HttpBackend(rate_limiter=rate_limiter, **options)
+    if name == "auto":
+        return FallbackBackend(HttpBackend(rate_limiter=rate_limiter, **options),
+                               lambda: selenium_backend(rate_limiter))
+    raise ValueError(f"Unknown fetch backend: {name}")
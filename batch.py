@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from queue import Queue
+from dotenv import load_dotenv
+from openai import OpenAI
+from analysis import analyze_docket
+from attachments import AttachmentProcessor
+from comment_index import CommentIndex
+from backends import WEB_URL, create_backend, request_rates
+from downloads import DownloadManager
+from llm_cache import ResultCache
+from local_scorer import LocalScorer
+from metrics import METRICS
+from ratelimit import RateLimiter
+from scoring import ScoringEngine
+from scrapper import DocketScraper
+
+
+class BatchRunner:
+    """
+    Scrape and analyze many dockets with a bounded, shared set of resources:
+    `scrape_workers` scraper slots, each keeping its backends (browsers or HTTP
+    sessions) from one docket to the next, and `analysis_workers` scoring
+    engines. Dockets are analyzed as soon as their scrape finishes, so scraping
+    one docket overlaps the analysis of another, and a slow docket only holds up
+    its own slot. Each docket gets its own directory under `output_dir`, and
+    `output_dir`/index.json records the state of every docket as the batch runs,
+    and every analyzed docket is added to the search index `output_dir`/comments.sqlite.
+    """
+
+    def __init__(self, docket_ids, open_ai_key, output_dir="dockets", backend="selenium", scrape_workers=2,
+                 analysis_workers=2, comment_workers=1, requests_per_second=None, download_workers=4, concurrency=8,
+                 openai_base_url=None, cache_file="llm_cache.sqlite", local_model_file=None, ndjson=False,
+                 max_requests_per_second=None, **backend_options):
+        self.docket_ids = list(dict.fromkeys(docket_ids))
+        self.output_dir = output_dir
+        self.backend_name = backend
+        self.backend_options = backend_options
+        self.comment_workers = comment_workers
+        self.extension = "ndjson" if ndjson else "json"
+        self.index = {}
+        self._index_lock = threading.Lock()
+
+        self.scrape_workers = max(1, scrape_workers)
+        self._slots = Queue()
+        for _ in range(self.scrape_workers):
+            self._slots.put({"backend": None, "comment_backends": []})
+        # One budget for the whole batch: the site's limits do not depend on how many dockets are open
+        rate, max_rate = request_rates(backend, requests_per_second, max_requests_per_second)
+        self.rate_limiter = RateLimiter(rate, max_rate=max_rate)
+        self.downloads = DownloadManager(workers=download_workers)
+        self.attachments = AttachmentProcessor(download_workers=download_workers)
+
+        self.analysis_workers = max(1, analysis_workers)
+        self.client = OpenAI(api_key=open_ai_key, base_url=openai_base_url)
+        self.cache = ResultCache(cache_file) if cache_file else None
+        self._engines = Queue()
+        self._all_engines = []
+        for _ in range(self.analysis_workers):
+            engine = ScoringEngine(open_ai_key, base_url=openai_base_url, concurrency=concurrency, cache=self.cache)
+            self._all_engines.append(engine)
+            self._engines.put(engine)
+        self.local_scorer = LocalScorer.load(local_model_file) if local_model_file else None
+        os.makedirs(output_dir, exist_ok=True)
+        self.comment_index = CommentIndex(os.path.join(output_dir, "comments.sqlite"))
+
+    def _paths(self, docket_id):
+        directory = os.path.join(self.output_dir, docket_id)
+        return {
+            "directory": directory,
+            "docket": os.path.join(directory, f"docket.{self.extension}"),
+            "analysis": os.path.join(directory, f"docket_analysis.{self.extension}"),
+            "parquet": os.path.join(directory, "docket_comments.parquet"),
+            "images": os.path.join(directory, "images"),
+        }
+
+    def _update_index(self, docket_id, **fields):
+        with self._index_lock:
+            self.index.setdefault(docket_id, {"Docket ID": docket_id}).update(fields)
+            os.makedirs(self.output_dir, exist_ok=True)
+            temporary_file = os.path.join(self.output_dir, "index.json.tmp")
+            with open(temporary_file, "w", encoding="utf-8") as index_file:
+                json.dump(list(self.index.values()), index_file, indent=4, ensure_ascii=False)
+            os.replace(temporary_file, os.path.join(self.output_dir, "index.json"))
+
+    def _close_slot(self, slot):
+        for backend in [slot["backend"], *slot["comment_backends"]]:
+            try:
+                if backend is not None:
+                    backend.close()
+            except Exception as e:
+                print(f"Error closing backend: {e}")
+        slot["backend"] = None
+        slot["comment_backends"].clear()
+
+    def _scrape(self, docket_id):
+        """Scrape one docket on a free slot. Returns True when its output was written."""
+        paths = self._paths(docket_id)
+        os.makedirs(paths["images"], exist_ok=True)
+        slot = self._slots.get()
+        started = time.monotonic()
+        self._update_index(docket_id, Status="scraping", Files=paths)
+        try:
+            if slot["backend"] is None:
+                slot["backend"] = create_backend(self.backend_name, rate_limiter=self.rate_limiter,
+                                                 **self.backend_options)
+            previous_file = paths["docket"] if os.path.exists(paths["docket"]) else None
+            scraper = DocketScraper(f"{WEB_URL}/docket/{docket_id}", backend=slot["backend"],
+                                    workers=self.comment_workers, journal_file=f"{paths['docket']}.journal",
+                                    previous_file=previous_file, comment_backends=slot["comment_backends"],
+                                    downloads=self.downloads, rate_limiter=self.rate_limiter)
+            saved = scraper.run(paths["docket"])
+            self._update_index(docket_id, Status="scraped" if saved else "scrape failed",
+                               Title=scraper.docket_data.get("Title"), Failures=scraper.failures,
+                               **{"Scrape Seconds": round(time.monotonic() - started, 1)})
+            return saved
+        except Exception as e:
+            # A backend that failed mid-docket may be in any state, so the next docket gets fresh ones
+            self._close_slot(slot)
+            self._update_index(docket_id, Status="scrape failed", Error=str(e))
+            print(f"Error scraping docket {docket_id}: {e}")
+            return False
+        finally:
+            self._slots.put(slot)
+
+    def _analyze(self, docket_id):
+        """Analyze one scraped docket with a free scoring engine."""
+        paths = self._paths(docket_id)
+        engine = self._engines.get()
+        started = time.monotonic()
+        self._update_index(docket_id, Status="analyzing")
+        try:
+            previous_analysis = paths["analysis"] if os.path.exists(paths["analysis"]) else None
+            analyze_docket(paths["docket"], self.client, engine, self.cache, previous_analysis, self.local_scorer,
+                           paths["parquet"], paths["analysis"], paths["images"], self.attachments)
+            self.comment_index.index_docket(paths["analysis"], docket_id)
+            self._update_index(docket_id, Status="done",
+                               **{"Analysis Seconds": round(time.monotonic() - started, 1)})
+        except Exception as e:
+            self._update_index(docket_id, Status="analysis failed", Error=str(e))
+            print(f"Error analyzing docket {docket_id}: {e}")
+        finally:
+            self._engines.put(engine)
+
+    def run(self):
+        """Scrape and analyze every docket. Returns the index entries."""
+        try:
+            with ThreadPoolExecutor(max_workers=self.scrape_workers) as scrapers, \
+                    ThreadPoolExecutor(max_workers=self.analysis_workers) as analysts:
+                for docket_id in self.docket_ids:
+                    self._update_index(docket_id, Status="queued")
+                scrapes = {scrapers.submit(self._scrape, docket_id): docket_id for docket_id in self.docket_ids}
+                analyses = [analysts.submit(self._analyze, scrapes[future])
+                            for future in as_completed(scrapes) if future.result()]
+                for future in as_completed(analyses):
+                    future.result()
+        finally:
+            self.close()
+            METRICS.write_report(os.path.join(self.output_dir, "run_report.json"))
+        done = sum(entry.get("Status") == "done" for entry in self.index.values())
+        print(f"\nBatch completed: {done} of {len(self.docket_ids)} dockets analyzed. "
+              f"Index: {os.path.join(self.output_dir, 'index.json')}")
+        return list(self.index.values())
+
+    def close(self):
+        while not self._slots.empty():
+            self._close_slot(self._slots.get())
+        self.downloads.close()
+        self.attachments.close()
+        for engine in self._all_engines:
+            engine.close()
+        if self.cache is not None:
+            print(f"LLM cache: {self.cache.stats()}")
+            self.cache.close()
+        self.comment_index.close()
+
+
+def read_docket_ids(arguments):
+    """Docket IDs from the command line; an argument starting with '@' names a file with one ID per line."""
+    docket_ids = []
+    for argument in arguments:
+        if argument.startswith("@"):
+            with open(argument[1:], "r", encoding="utf-8") as id_file:
+                docket_ids.extend(line.strip() for line in id_file if line.strip() and not line.startswith("#"))
+        else:
+            docket_ids.append(argument)
+    return docket_ids
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Scrape and analyze many regulations.gov dockets.")
+    parser.add_argument("dockets", nargs="+", help="docket IDs, or @file with one ID per line")
+    parser.add_argument("--requests-per-second", type=float, default=None,
+                        help="starting request budget (0.1 for selenium, 0.25 for http)")
+    parser.add_argument("--max-requests-per-second", type=float, default=None,
+                        help="highest request budget (1 for selenium, 1000 an hour for http)")
+    args = parser.parse_args()
+    docket_ids = read_docket_ids(args.dockets)
+    if not docket_ids:
+        parser.error("no docket IDs given")
+    BatchRunner(docket_ids, os.getenv("OPENAI_API_KEY"), backend=os.getenv("SCRAPER_BACKEND", "selenium"),
+                requests_per_second=args.requests_per_second,
+                max_requests_per_second=args.max_requests_per_second).run()
+    if os.getenv("PROMETHEUS_FILE"):
+        METRICS.write_prometheus(os.getenv("PROMETHEUS_FILE"))
@@ -0,0 +1,330 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import threading
+import time
+import zlib
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty
+from openai import OpenAI
+from openai.types.moderation import Categories
+from analysis import analyze_docket, read_json_file
+from llm_cache import ResultCache, normalize_text
+from metrics import METRICS
+from scoring import ScoringEngine
+from utils import clean_text
+
+
+SIZES = [1000, 10000, 100000]
+# Share of synthetic comments that copy a template verbatim, copy it with a few
+# words changed, or are new text; form letters dominate real dockets
+FORM_LETTER_SHARE = 0.6
+NEAR_DUPLICATE_SHARE = 0.35
+STAGES = ["score_comments", "summarize_documents", "distribute_comments", "timeline", "clean_text"]
+# Metrics compared against the baseline; lower is better for all of them
+COMPARED = ["seconds", "peak_rss_mb", *STAGES]
+
+
+def synthetic_docket(size, seed=0, template_file="docket.json", downloads_dir="downloads"):
+    """
+    A docket of `size` comments built from the comments of a scraped docket.
+    Documents keep their downloaded content, so summaries read real HTML.
+    """
+    rng = random.Random(seed)
+    docket = read_json_file(template_file)
+    templates = [comment for document in docket["Documents"] for comment in document.get("Comments") or []]
+    vocabulary = sorted({word for comment in templates for word in (comment.get("Comment") or "").split()})
+    downloaded = sorted(glob.glob(os.path.join(downloads_dir, "*.htm")))
+
+    documents = []
+    for i, document in enumerate(docket["Documents"]):
+        document = {key: value for key, value in document.items() if key != "Comments"}
+        path = document.get("Document Path")
+        if not (path and os.path.exists(path)) and downloaded:
+            path = downloaded[i % len(downloaded)]
+        document["Document Path"] = os.path.abspath(path) if path else None
+        document["Comments"] = []
+        documents.append(document)
+
+    start = datetime(2022, 1, 1)
+    for i in range(size):
+        comment = dict(rng.choice(templates))
+        words = (comment.get("Comment") or "").split()
+        kind = rng.random()
+        if comment.get("Attachments", 0) or not words or kind < FORM_LETTER_SHARE:
+            pass
+        elif kind < FORM_LETTER_SHARE + NEAR_DUPLICATE_SHARE:
+            for _ in range(min(3, len(words))):
+                words[rng.randrange(len(words))] = rng.choice(vocabulary)
+            comment["Comment"] = " ".join(words)
+        else:
+            comment["Comment"] = " ".join(rng.choices(vocabulary, k=rng.randint(20, 200)))
+        comment["Comment ID"] = f"{docket.get('Docket ID')}-{i:07d}"
+        comment["Submitter Name"] = f"Commenter {i}"
+        posted = start + timedelta(days=rng.randrange(120))
+        comment["Posted On"] = f"{posted:%b} {posted.day}, {posted.year}"
+        documents[i % len(documents)]["Comments"].append(comment)
+    return {**{key: value for key, value in docket.items() if key != "Documents"}, "Documents": documents}
+
+
+class MockOpenAIServer:
+    """
+    Local stand-in for the chat completion and moderation endpoints, answering
+    after `latency` seconds with results recorded in an earlier analysis.
+    Texts that were never analyzed get a recorded answer picked by their hash,
+    so every run gets the same replies. `error_rate` of the requests get a 429.
+    """
+
+    def __init__(self, analysis_file="docket_analysis.json", latency=0.05, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = {"chat": 0, "moderations": 0, "throttled": 0}
+        self._lock = threading.Lock()
+        analysis = read_json_file(analysis_file) or {}
+        comments = [comment for document in analysis.get("Documents", []) for comment in document.get("Comments") or []]
+        self.scores = {normalize_text(comment["Comment"]): comment["Bot_Likelihood_Score"]
+                       for comment in comments if "Bot_Likelihood_Score" in comment}
+        self.sentiments = {normalize_text(comment["Comment"]): comment["Sentiment"]
+                           for comment in comments if comment.get("Sentiment")}
+        self.summaries = [summary for summary in [analysis.get("Analysis"),
+                                                  *(document.get("Analysis") for document in analysis.get("Documents", []))]
+                          if summary] or ["Theme: none recorded"]
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}/v1"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def _pick(options, text):
+        return options[zlib.crc32(text.encode("utf-8")) % len(options)]
+
+    def _chat(self, body):
+        prompt = body["messages"][-1]["content"]
+        if prompt.startswith("Analyze this comment"):
+            text = normalize_text(prompt.split("\n\n", 1)[-1])
+            content = str(self.scores.get(text, self._pick(sorted(self.scores.values()) or [2.5], text)))
+        else:
+            content = self._pick(self.summaries, prompt)
+        return {"id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}]}
+
+    def _moderations(self, body):
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        results = []
+        for text in inputs:
+            recorded = self.sentiments.get(normalize_text(text), {})
+            # A few unrecorded texts are flagged, so the sentiment chart has data
+            flagged = None if recorded else self._pick(["harassment"] + [None] * 49, text)
+            categories = {field.alias or name: bool(recorded.get(name)) or name == flagged
+                          for name, field in Categories.model_fields.items()}
+            results.append({"flagged": any(categories.values()), "categories": categories,
+                            "category_scores": {name: float(value) for name, value in categories.items()}})
+        return {"id": "modr-mock", "model": body.get("model"), "results": results}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 429:
+                    self.send_header("retry-after", "0.1")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(server.latency)
+                endpoint = "chat" if self.path.endswith("/chat/completions") else "moderations"
+                with server._lock:
+                    throttled = random.random() < server.error_rate
+                    server.requests["throttled" if throttled else endpoint] += 1
+                if throttled:
+                    self._send(429, {"error": {"message": "Rate limit reached", "type": "requests"}})
+                elif endpoint == "chat":
+                    self._send(200, server._chat(body))
+                else:
+                    self._send(200, server._moderations(body))
+
+        return Handler
+
+
+def _stage_seconds(report, stage):
+    return sum(histogram["sum"] for histogram in report["histograms"]
+               if histogram["name"] == "stage_seconds" and histogram["labels"].get("stage") == stage)
+
+
+def _run_size(size, docket_file, run_dir, base_url, concurrency, budget_per_minute, clean_text_repeat, results):
+    """Analyze one synthetic docket in a fresh process, so its peak RSS is its own."""
+    os.chdir(run_dir)
+    with open("benchmark.log", "w", encoding="utf-8") as log, redirect_stdout(log):
+        client = OpenAI(api_key="benchmark", base_url=base_url)
+        cache = ResultCache("llm_cache.sqlite")
+        engine = ScoringEngine("benchmark", base_url=base_url, concurrency=concurrency, cache=cache,
+                               requests_per_minute=budget_per_minute, tokens_per_minute=budget_per_minute)
+        started = time.perf_counter()
+        try:
+            analyze_docket(docket_file, client, engine, cache, parquet_file="docket_comments.parquet")
+        finally:
+            engine.close()
+            cache.close()
+        seconds = time.perf_counter() - started
+
+        documents = [document["Document Path"] for document in read_json_file(docket_file)["Documents"]
+                     if document.get("Document Path")]
+        pages = []
+        for path in documents:
+            with open(path, "r", encoding="utf-8", errors="replace") as html_file:
+                pages.append(html_file.read())
+        with METRICS.stage("clean_text"):
+            for _ in range(clean_text_repeat):
+                for page in pages:
+                    clean_text(page)
+
+    report = METRICS.report()
+    results.put({
+        "comments": size,
+        "seconds": round(seconds, 3),
+        "comments_per_second": round(size / seconds, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        **{stage: round(_stage_seconds(report, stage), 3) for stage in STAGES},
+        "clean_text_mb_per_second": round(sum(map(len, pages)) * clean_text_repeat / 2 ** 20
+                                          / max(_stage_seconds(report, "clean_text"), 1e-9), 1),
+    })
+
+
+def run_benchmark(sizes=SIZES, latency=0.05, error_rate=0.0, concurrency=8, budget_per_minute=10 ** 9,
+                  clean_text_repeat=20, work_dir="bench_data", seed=0):
+    """
+    Analyze a synthetic docket of each size against the mock server and return the
+    measurements. The request and token budgets per minute default to unlimited,
+    so the run measures this code rather than the account's rate limits.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    server = MockOpenAIServer(latency=latency, error_rate=error_rate).start()
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    try:
+        for size in sizes:
+            docket_file = os.path.abspath(os.path.join(work_dir, f"docket_{size}_{seed}.json"))
+            if not os.path.exists(docket_file):
+                with open(docket_file, "w", encoding="utf-8") as json_file:
+                    json.dump(synthetic_docket(size, seed), json_file, ensure_ascii=False)
+            run_dir = os.path.abspath(os.path.join(work_dir, f"run_{size}"))
+            shutil.rmtree(run_dir, ignore_errors=True)
+            os.makedirs(os.path.join(run_dir, "images"))
+
+            before = dict(server.requests)
+            queue = context.Queue()
+            process = context.Process(target=_run_size, args=(size, docket_file, run_dir, server.base_url, concurrency,
+                                                              budget_per_minute, clean_text_repeat, queue))
+            process.start()
+            while True:
+                try:
+                    result = queue.get(timeout=1)
+                    break
+                except Empty:
+                    if not process.is_alive():
+                        raise RuntimeError(f"Benchmark of {size} comments failed, see {run_dir}/benchmark.log")
+            process.join()
+            result["api_requests"] = {name: count - before[name] for name, count in server.requests.items()}
+            results[str(size)] = result
+            print(f"{size} comments: {result['seconds']}s, {result['comments_per_second']} comments/s, "
+                  f"peak RSS {result['peak_rss_mb']} MB")
+    finally:
+        server.close()
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "settings": {"latency": latency, "error_rate": error_rate, "concurrency": concurrency, "seed": seed,
+                     "clean_text_repeat": clean_text_repeat},
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "results": results,
+    }
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Print each measurement against the baseline. Returns the regressions beyond `tolerance`."""
+    if baseline["settings"] != results["settings"]:
+        print(f"Warning: baseline settings {baseline['settings']} differ from {results['settings']}")
+    regressions = []
+    print(f"{'comments':>9} {'metric':<20} {'baseline':>10} {'current':>10} {'change':>8}")
+    for size, result in results["results"].items():
+        previous = baseline["results"].get(size)
+        if previous is None:
+            continue
+        for metric in COMPARED:
+            old, new = previous.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            # Sub-second stages are noise at this resolution
+            regressed = change > tolerance and new - old > 0.5 if metric != "peak_rss_mb" else change > tolerance
+            if regressed:
+                regressions.append((size, metric, old, new))
+            print(f"{size:>9} {metric:<20} {old:>10} {new:>10} {change:>+8.0%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'comments':>9} {'seconds':>9} {'comments/s':>11} {'RSS MB':>8} "
+          + " ".join(f"{stage:>20}" for stage in STAGES))
+    for size, result in results["results"].items():
+        print(f"{size:>9} {result['seconds']:>9} {result['comments_per_second']:>11} {result['peak_rss_mb']:>8} "
+              + " ".join(f"{result[stage]:>20}" for stage in STAGES))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the analysis on synthetic dockets against a mock OpenAI server.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="comments per synthetic docket")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the mock server takes per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 429")
+    parser.add_argument("--concurrency", type=int, default=8, help="OpenAI requests in flight")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default="benchmark_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.sizes, args.latency, args.error_rate, args.concurrency, seed=args.seed)
+    print_results(results)
+    with open(args.output, "w", encoding="utf-8") as json_file:
+        json.dump(results, json_file, indent=4)
+
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as json_file:
+            regressions = compare(results, json.load(json_file), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions against {args.baseline}")
+            sys.exit(1)
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use("Agg")  # Render to files only; no display is needed, even in worker processes
+import matplotlib.pyplot as plt
+from wordcloud import WordCloud
+
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+WORDCLOUD_WORDS = 200  # WordCloud's default max_words; less frequent words are never drawn
+
+
+def render_score_distribution(scores, path):
+    fig, ax = plt.subplots(figsize=(8, 6))
+    labels = sorted(scores, key=float)
+    ax.bar([str(label) for label in labels], [scores[label] for label in labels],
+           color='skyblue', edgecolor='black')
+    ax.set_title("Distribution of Bot Likelihood Scores")
+    ax.set_xlabel("Bot_Likelihood_Score")
+    ax.set_ylabel("Frequency")
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def render_wordcloud(words, path):
+    fig, ax = plt.subplots(figsize=(10, 8))
+    if words:
+        wordcloud = WordCloud(width=800, height=400, background_color='white').generate_from_frequencies(words)
+        ax.imshow(wordcloud, interpolation='bilinear')
+    ax.axis('off')
+    ax.set_title("Word Cloud of Comments")
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def render_attachment_ratio(sizes, path):
+    without_attachments, with_attachments = sizes
+    ratio = without_attachments / with_attachments if with_attachments != 0 else None
+    fig, ax = plt.subplots(figsize=(8, 5))
+    ax.bar(['Comments without attachments', 'Comments with attachments'], sizes, color=['blue', 'orange'])
+    ax.set_title(f"Sizes and Ratio of Two Lists (Ratio: {ratio:.2f})" if ratio is not None else "Sizes of Two Lists")
+    ax.set_ylabel('Size')
+    ax.set_xlabel('Lists')
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def render_monthly_breakdown(months, path):
+    keys = sorted(months)
+    month_labels = [f"{MONTHS[int(key[5:]) - 1]} {key[:4]}" for key in keys]
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.bar(month_labels, [months[key] for key in keys], color='skyblue')
+    ax.set_title("Monthly Breakdown of Comments")
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Number of Comments")
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def render_sentiments(sentiments, path):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.bar(list(sentiments.keys()), list(sentiments.values()), color='skyblue')
+    ax.set_title('Sentiment Analysis Distribution', fontsize=16)
+    ax.set_xlabel('Sentiment Categories', fontsize=12)
+    ax.set_ylabel('Count', fontsize=12)
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def comment_chart_jobs(stats, image_dir="images"):
+    """The comment charts as (renderer, data, path) jobs, from a CommentStats."""
+    return [
+        (render_score_distribution, {str(score): count for score, count in stats.scores.items()},
+         os.path.join(image_dir, 'score_distribution.png')),
+        (render_wordcloud, dict(stats.words.most_common(WORDCLOUD_WORDS)),
+         os.path.join(image_dir, 'comment_wordcloud.png')),
+        (render_attachment_ratio, [stats.without_attachments, stats.with_attachments],
+         os.path.join(image_dir, 'comment_ratio.png')),
+        (render_monthly_breakdown, dict(stats.months), os.path.join(image_dir, 'comments_monthly_breakdown.png')),
+        (render_sentiments, dict(stats.sentiments), os.path.join(image_dir, 'comments_sentiment_analysis.png')),
+    ]
+
+
+def data_hash(renderer, data):
+    return hashlib.sha256(json.dumps([renderer.__name__, data], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def render_charts(jobs, workers=None, manifest_file="images/.chart_hashes.json"):
+    """
+    Render chart jobs in a process pool. A chart whose input data hashes the same
+    as in the last run, and whose image is still on disk, is not redrawn.
+    Returns the image paths in job order.
+    """
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    hashes = {path: data_hash(renderer, data) for renderer, data, path in jobs}
+    stale = [(renderer, data, path) for renderer, data, path in jobs
+             if manifest.get(path) != hashes[path] or not os.path.exists(path)]
+    if len(stale) < len(jobs):
+        print(f"Skipping {len(jobs) - len(stale)} unchanged charts")
+
+    if stale:
+        for _, _, path in stale:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Spawned workers do not inherit the caller's threads, event loops or open connections
+        with ProcessPoolExecutor(max_workers=workers or min(len(stale), os.cpu_count() or 1),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {path: pool.submit(renderer, data, path) for renderer, data, path in stale}
+            for path, future in futures.items():
+                try:
+                    future.result()
+                    manifest[path] = hashes[path]
+                except Exception as e:
+                    print(f"Error rendering {path}: {e}")
+                    manifest.pop(path, None)
+
+        os.makedirs(os.path.dirname(manifest_file) or ".", exist_ok=True)
+        with open(manifest_file, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=4)
+
+    return [path for _, _, path in jobs]
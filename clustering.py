@@ -0,0 +1,227 @@
+import hashlib
+import re
+import zlib
+import numpy as np
+from llm_cache import normalize_text
+from prompts import scoring_text
+
+
+def shingles(text, size=5):
+    """Word `size`-grams of a comment, lower-cased."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash_signatures(texts, num_perm=128, shingle_size=5, seed=1):
+    """
+    One MinHash signature row per text, estimating Jaccard similarity of their shingles.
+    Each permutation is a multiply-shift hash applied to every shingle of every text at
+    once, then reduced to a minimum per text.
+    """
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+    increments = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+
+    shingle_hashes = [np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text, shingle_size)),
+                                  dtype=np.uint64) for text in texts]
+    lengths = np.array([hashes.size for hashes in shingle_hashes])
+    signatures = np.full((len(texts), num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+    if not lengths.any():
+        return signatures
+    all_hashes = np.concatenate(shingle_hashes)
+    nonempty = lengths > 0
+    offsets = (np.cumsum(lengths) - lengths)[nonempty]
+
+    for permutation in range(num_perm):
+        # uint64 arithmetic wraps around, which is what multiply-shift hashing relies on
+        values = ((multipliers[permutation] * all_hashes + increments[permutation]) >> np.uint64(32)).astype(np.uint32)
+        signatures[nonempty, permutation] = np.minimum.reduceat(values, offsets)
+    return signatures
+
+
+def cluster_signatures(signatures, threshold=0.8, bands=16):
+    """
+    Group rows whose signatures agree on at least `threshold` of their hashes.
+    Rows sharing a locality-sensitive band bucket are compared with the first row
+    of that bucket and merged with union-find. Returns a cluster label per row.
+    """
+    count, num_perm = signatures.shape
+    rows = num_perm // bands
+    parent = list(range(count))
+    # Collapse each band to one key; colliding keys are caught by the similarity check
+    band_multipliers = np.random.default_rng(0).integers(1, 2 ** 63, rows, dtype=np.uint64) | np.uint64(1)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        band_keys = (signatures[:, band * rows:(band + 1) * rows].astype(np.uint64) * band_multipliers).sum(axis=1)
+        _, buckets = np.unique(band_keys, return_inverse=True)
+        order = np.argsort(buckets, kind="stable")
+        starts = np.flatnonzero(np.diff(buckets[order], prepend=-1))
+        ends = np.append(starts[1:], count)
+        shared = ends - starts > 1
+        for start, end in zip(starts[shared], ends[shared]):
+            members = order[start:end]
+            similarity = (signatures[members[1:]] == signatures[members[0]]).mean(axis=1)
+            root = find(members[0])
+            for member in members[1:][similarity >= threshold]:
+                parent[find(member)] = root
+
+    return [find(i) for i in range(count)]
+
+
+def cluster_comments(comments, threshold=0.8, num_perm=128, bands=16, shingle_size=5):
+    """
+    Group near-duplicate comments, such as form letters from a mail campaign, and
+    record 'Cluster ID' and 'Cluster Size' on each comment with text to score
+    (prompts.scoring_text). The ID is derived from the first member's text, so it
+    is stable across runs.
+    Returns the clusters as lists of indices into `comments`, first member first.
+    """
+    indices = [i for i, comment in enumerate(comments) if scoring_text(comment)]
+    if not indices:
+        return []
+    # Exact copies share a signature, so only distinct texts are hashed
+    texts = [normalize_text(scoring_text(comments[i])) for i in indices]
+    distinct = list(dict.fromkeys(texts))
+    labels = cluster_signatures(minhash_signatures(distinct, num_perm, shingle_size), threshold, bands)
+    label_of = dict(zip(distinct, labels))
+
+    clusters = {}
+    for index, text in zip(indices, texts):
+        clusters.setdefault(label_of[text], []).append(index)
+
+    for members in clusters.values():
+        first_id = cluster_id(normalize_text(scoring_text(comments[members[0]])))
+        for i in members:
+            comments[i]["Cluster ID"] = first_id
+            comments[i]["Cluster Size"] = len(members)
+    return list(clusters.values())
+
+
+def cluster_id(normalized_text):
+    """The 'Cluster ID' of a cluster whose first member has this normalized text."""
+    return hashlib.blake2b(normalized_text.encode("utf-8"), digest_size=6).hexdigest()
+
+
+class ClusterIndex:
+    """
+    Near-duplicate clusters of a whole docket, built from a first pass over its
+    comments, so a stream scored a batch at a time gets the same 'Cluster ID' and
+    'Cluster Size' as cluster_comments over all of them at once. Only a digest and a
+    MinHash signature are kept per distinct text, and the score of each cluster is
+    remembered once one of its members is scored, so later batches reuse it.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, bands=16, shingle_size=5, chunk_size=10000):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.chunk_size = chunk_size
+        self._rows = {}  # digest of a distinct normalized text -> row
+        self._counts = []  # comments per row
+        self._ids = []  # cluster ID of each row, were it the first member of its cluster
+        self._pending = []
+        self._signatures = []
+        self._firsts = None  # row -> first row of its cluster
+        self._sizes = None  # row -> comments in its cluster
+        self._scores = {}
+
+    @staticmethod
+    def _digest(normalized_text):
+        return hashlib.blake2b(normalized_text.encode("utf-8"), digest_size=16).digest()
+
+    def add(self, comment):
+        """Count a comment of the first pass; comments without text to score are skipped."""
+        text = scoring_text(comment)
+        if not text:
+            return
+        normalized = normalize_text(text)
+        digest = self._digest(normalized)
+        row = self._rows.get(digest)
+        if row is None:
+            row = self._rows[digest] = len(self._counts)
+            self._counts.append(0)
+            self._ids.append(cluster_id(normalized))
+            self._pending.append(normalized)
+            if len(self._pending) >= self.chunk_size:
+                self._sign()
+        self._counts[row] += 1
+
+    def _sign(self):
+        if self._pending:
+            self._signatures.append(minhash_signatures(self._pending, self.num_perm, self.shingle_size))
+            self._pending = []
+
+    def build(self):
+        """Cluster the distinct texts counted so far. Returns the index."""
+        self._sign()
+        if not self._counts:
+            self._firsts = self._sizes = np.zeros(0, dtype=np.int64)
+            return self
+        labels = np.asarray(cluster_signatures(np.vstack(self._signatures), self.threshold, self.bands))
+        self._signatures = []
+        # Rows are in order of first appearance, so a cluster's first row holds its first member
+        _, firsts, inverse = np.unique(labels, return_index=True, return_inverse=True)
+        sizes = np.bincount(inverse, weights=self._counts).astype(np.int64)
+        self._firsts = firsts[inverse]
+        self._sizes = sizes[inverse]
+        return self
+
+    def assign(self, comments):
+        """
+        Set 'Cluster ID' and 'Cluster Size' of the docket on each comment with text to
+        score, and the score of its cluster when an earlier batch scored it. A text the
+        first pass did not see is a cluster of its own. Returns the clusters of
+        `comments` as lists of indices into it, first member first, like cluster_comments.
+        """
+        clusters = {}
+        for i, comment in enumerate(comments):
+            text = scoring_text(comment)
+            if not text:
+                continue
+            normalized = normalize_text(text)
+            row = self._rows.get(self._digest(normalized))
+            if row is None:
+                first_id, size = cluster_id(normalized), 1
+            else:
+                first_id, size = self._ids[self._firsts[row]], int(self._sizes[row])
+            comment["Cluster ID"] = first_id
+            comment["Cluster Size"] = size
+            clusters.setdefault(first_id, []).append(i)
+            scored = self._scores.get(first_id)
+            if scored is not None and "Bot_Likelihood_Score" not in comment:
+                comment["Bot_Likelihood_Score"] = scored["Bot_Likelihood_Score"]
+                comment["Sentiment"] = dict(scored["Sentiment"]) if scored.get("Sentiment") else None
+                if "Score Source" in scored:
+                    comment["Score Source"] = scored["Score Source"]
+        return list(clusters.values())
+
+    def remember(self, comments):
+        """Keep the score of the first scored member of each cluster for later batches."""
+        for comment in comments:
+            first_id = comment.get("Cluster ID")
+            if first_id is not None and first_id not in self._scores and "Bot_Likelihood_Score" in comment:
+                self._scores[first_id] = {key: comment[key] for key in ("Bot_Likelihood_Score", "Sentiment", "Score Source")
+                                          if key in comment}
+
+
+def fan_out_scores(comments, clusters):
+    """Copy the score of a scored member of each cluster to its unscored members."""
+    for members in clusters:
+        scored = next((comments[i] for i in members if "Bot_Likelihood_Score" in comments[i]), None)
+        if scored is None:
+            continue
+        for i in members:
+            if "Bot_Likelihood_Score" not in comments[i]:
+                comments[i]["Bot_Likelihood_Score"] = scored["Bot_Likelihood_Score"]
+                comments[i]["Sentiment"] = dict(scored["Sentiment"]) if scored.get("Sentiment") else None
+                if "Score Source" in scored:
+                    comments[i]["Score Source"] = scored["Score Source"]
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+from openai.types.moderation import Categories
+from records import CATEGORY_BITS, Comment
+
+
+# Moderation categories always get a column, so frames built from different batches line up
+SENTIMENT_CATEGORIES = list(Categories.model_fields)
+CATEGORICAL_COLUMNS = ["Document ID", "Score Source", "Cluster ID"]
+
+
+def comments_to_frame(comments, document_ids=None):
+    """
+    One typed row per comment: dates parsed, scores as floats, repeated labels as
+    categoricals and each moderation category as a boolean 'Sentiment.<category>'
+    column that is True only when the category was flagged.
+    """
+    flags = sentiment_flags(comments)
+
+    def column(name, dtype, default=None):
+        return pd.Series([comment.get(name, default) for comment in comments], dtype=dtype)
+
+    frame = pd.DataFrame({
+        "Comment ID": column("Comment ID", "string"),
+        "Document ID": pd.Series(document_ids if document_ids is not None else [None] * len(comments),
+                                 dtype="string").astype("category"),
+        "Submitter Name": column("Submitter Name", "string"),
+        "Posted On": pd.to_datetime(column("Posted On", object), format='%b %d, %Y', errors='coerce'),
+        "Attachments": column("Attachments", "float64", 0).fillna(0).astype("int32"),
+        "Bot_Likelihood_Score": pd.to_numeric(column("Bot_Likelihood_Score", object), errors='coerce'),
+        "Score Source": column("Score Source", "string").astype("category"),
+        "Cluster ID": column("Cluster ID", "string").astype("category"),
+        "Cluster Size": column("Cluster Size", "Int32"),
+        "Posting Burst": column("Posting Burst", "boolean"),
+        "Comment": column("Comment", "string"),
+    })
+    for category, flagged in flags.items():
+        frame[f"Sentiment.{category}"] = flagged
+    return frame
+
+
+def sentiment_flags(comments):
+    """
+    Per moderation category, whether each comment was flagged for it. The
+    categories of records.Comment are read from their bitmask without decoding it.
+    """
+    if all(isinstance(comment, Comment) for comment in comments):
+        masks = np.fromiter((comment.sentiment_mask() for comment in comments), dtype=np.int64, count=len(comments))
+        flags = {category: (masks >> bit & 1).astype(bool) for category, bit in CATEGORY_BITS.items()}
+        return {category: flagged for category, flagged in flags.items()
+                if category in SENTIMENT_CATEGORIES or flagged.any()}
+    sentiments = [comment.get("Sentiment") or {} for comment in comments]
+    extra_categories = sorted({category for sentiment in sentiments for category in sentiment}
+                              - set(SENTIMENT_CATEGORIES))
+    return {category: [sentiment.get(category) is True for sentiment in sentiments]
+            for category in SENTIMENT_CATEGORIES + extra_categories}
+
+
+def frame_aggregates(frame):
+    """
+    The chart aggregates of a comment frame. Months, keyed like '2022-04' so years
+    stay apart, scores and moderation categories count every comment; words only
+    count comments without attachments.
+    """
+    has_attachments = frame["Attachments"] != 0
+    text_comments = frame[~has_attachments]
+    months = frame["Posted On"].dt.to_period("M").value_counts()
+    sentiments = frame.filter(like="Sentiment.").sum()
+    return {
+        "scores": frame["Bot_Likelihood_Score"].value_counts(),
+        "months": months.set_axis(months.index.strftime("%Y-%m")),
+        "sentiments": sentiments[sentiments > 0].rename(lambda name: name[len("Sentiment."):]),
+        "with_attachments": int(has_attachments.sum()),
+        "without_attachments": int((~has_attachments).sum()),
+        "texts": text_comments["Comment"].dropna(),
+    }
+
+
+class ParquetExporter:
+    """
+    Writes comment frames to one Parquet file, a frame at a time, so a streamed
+    docket can be exported without holding all of its comments. The first frame
+    fixes the columns; later frames are aligned to them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._columns = None
+        self._schema = None
+        self._writer = None
+
+    def write(self, frame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._columns is None:
+            self._columns = list(frame.columns)
+        table = pa.Table.from_pandas(frame.reindex(columns=self._columns, fill_value=False), preserve_index=False)
+        if self._writer is None:
+            # Pin dictionary types, whose index width otherwise depends on each frame's categories
+            self._schema = pa.schema([pa.field(field.name, pa.dictionary(pa.int32(), pa.string()))
+                                      if field.name in CATEGORICAL_COLUMNS else field
+                                      for field in table.schema]).remove_metadata()
+            self._writer = pq.ParquetWriter(self.path, self._schema)
+        self._writer.write_table(table.cast(self._schema))
+        self.rows += len(frame)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            print(f"Exported {self.rows} comments to {self.path}")
+
+
+def export_parquet(frame, path):
+    exporter = ParquetExporter(path)
+    exporter.write(frame)
+    exporter.close()
+    return path
@@ -0,0 +1,372 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from metrics import METRICS
+from utils import docket_to_records, iter_html_text, iter_ndjson
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dockets (
+    docket_id TEXT PRIMARY KEY,
+    title TEXT,
+    agency TEXT,
+    docket_type TEXT,
+    summary TEXT,
+    analysis TEXT,
+    indexed_at REAL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    document_id TEXT,
+    docket_id TEXT,
+    title TEXT,
+    posted_by TEXT,
+    posted_date TEXT,
+    path TEXT,
+    content TEXT,
+    analysis TEXT
+);
+CREATE TABLE IF NOT EXISTS comments (
+    id INTEGER PRIMARY KEY,
+    comment_id TEXT,
+    docket_id TEXT,
+    document_id TEXT,
+    submitter_name TEXT,
+    organization TEXT,
+    posted_on TEXT,
+    attachments INTEGER,
+    bot_score REAL,
+    score_source TEXT,
+    cluster_id TEXT,
+    comment TEXT,
+    fields TEXT,
+    attachment_text TEXT
+);
+CREATE TABLE IF NOT EXISTS comment_categories (
+    category TEXT NOT NULL,
+    comment INTEGER NOT NULL REFERENCES comments (id) ON DELETE CASCADE,
+    PRIMARY KEY (category, comment)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS documents_docket ON documents (docket_id);
+CREATE INDEX IF NOT EXISTS comments_docket ON comments (docket_id, posted_on);
+CREATE INDEX IF NOT EXISTS comments_posted_on ON comments (posted_on);
+CREATE INDEX IF NOT EXISTS comments_bot_score ON comments (bot_score);
+CREATE INDEX IF NOT EXISTS comment_categories_comment ON comment_categories (comment);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(
+    comment, submitter_name, organization, attachment_text, content='comments', content_rowid='id',
+    tokenize='porter unicode61');
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, content, analysis, content='documents', content_rowid='id', tokenize='porter unicode61');
+"""
+
+# Commenter fields with a column of their own; the others are kept as JSON in `fields`
+COMMENT_COLUMNS = {"Comment ID", "Submitter Name", "Organization Name", "Posted On", "Attachments",
+                   "Bot_Likelihood_Score", "Score Source", "Cluster ID", "Comment", "Sentiment",
+                   "Attachment Text"}
+# How SQLite rejects a full-text query that is not valid FTS5 syntax; other errors, such as a
+# locked database, are raised as they are
+FTS5_QUERY_ERRORS = ("fts5: syntax error", "no such column", "unterminated string", "unknown special query")
+
+
+def iso_date(value):
+    """'Apr 4, 2022' as '2022-04-04', so dates sort and compare as text; None if it does not parse."""
+    try:
+        return datetime.strptime(value, "%b %d, %Y").date().isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def month_range(month):
+    """First and last day of a 'YYYY-MM' month."""
+    first = datetime.strptime(month, "%Y-%m").date()
+    following = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+    return first.isoformat(), date.fromordinal(following.toordinal() - 1).isoformat()
+
+
+def read_records(file_path):
+    """Records of a docket or analysis stored as NDJSON or as one JSON document."""
+    if file_path.endswith(".ndjson"):
+        return iter_ndjson(file_path)
+    with open(file_path, "r", encoding="utf-8") as json_file:
+        return docket_to_records(json.load(json_file))
+
+
+def document_text(document):
+    """Text of a document, from its extracted sections or its downloaded HTML, PDF or Word file."""
+    if document.get("Document"):
+        return "\n\n".join(f"{key}:\n{value}" for key, value in document["Document"].items())
+    path = document.get("Document Path") or ""
+    try:
+        if path.endswith(".htm"):
+            return "\n\n".join(iter_html_text(path))
+        if path.endswith((".pdf", ".docx")):
+            # Loaded here, so indexing scraped HTML never imports the attachment pipeline
+            from attachments import extract_text
+
+            return extract_text(path, max_pages=None, max_chars=None) or None
+    except Exception as e:
+        print(f"Error reading document '{path}': {e}")
+    return None
+
+
+class CommentIndex:
+    """
+    SQLite database of scraped or analyzed dockets for fast queries across them.
+    Comments, with the text of their attachments, and documents have FTS5 full-text
+    indexes; comments are also indexed by docket, posting date, bot likelihood
+    score and moderation category.
+    Indexing a docket again replaces what was indexed for it before.
+    """
+
+    def __init__(self, path="comments.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._migrate()
+        self._db.executescript(SCHEMA)
+        if self._rebuild_text:
+            self._db.execute("INSERT INTO comments_fts (comments_fts) VALUES ('rebuild')")
+
+    def _migrate(self):
+        """Add the attachment text to an index created before attachments were read."""
+        columns = [row["name"] for row in self._db.execute("PRAGMA table_info(comments)")]
+        self._rebuild_text = bool(columns) and "attachment_text" not in columns
+        if self._rebuild_text:
+            self._db.execute("ALTER TABLE comments ADD COLUMN attachment_text TEXT")
+            self._db.execute("DROP TABLE comments_fts")
+
+    @METRICS.timed("index_docket")
+    def index_docket(self, file_path, docket_id=None, batch_size=1000):
+        """
+        Load a docket.json/docket_analysis.json (or .ndjson) into the index.
+        `docket_id` is only needed when the file's header has none. Returns the number of comments indexed.
+        """
+        started = time.perf_counter()
+        comments = 0
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                batch = []
+                for record in read_records(file_path):
+                    data = record["data"]
+                    if record["type"] == "docket":
+                        docket_id = data.get("Docket ID") or docket_id
+                        if not docket_id:
+                            raise ValueError(f"{file_path} has no Docket ID; pass docket_id")
+                        self._delete_docket(docket_id)
+                        self._insert_docket(docket_id, data)
+                    elif record["type"] == "document":
+                        self._insert_document(docket_id, data)
+                    elif record["type"] == "comment":
+                        batch.append((record.get("document"), data))
+                        if len(batch) >= batch_size:
+                            comments += self._insert_comments(docket_id, batch)
+                            batch = []
+                comments += self._insert_comments(docket_id, batch)
+                self._index_text(docket_id)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        print(f"Indexed {comments} comments of {docket_id} in {time.perf_counter() - started:.1f}s: {self.path}")
+        return comments
+
+    def _delete_docket(self, docket_id):
+        # The full-text indexes keep no copy of the text, so entries are removed with the text they were built from
+        self._db.execute("INSERT INTO comments_fts (comments_fts, rowid, comment, submitter_name, organization, "
+                         "attachment_text) SELECT 'delete', id, comment, submitter_name, organization, attachment_text "
+                         "FROM comments WHERE docket_id = ?",
+                         (docket_id,))
+        self._db.execute("INSERT INTO documents_fts (documents_fts, rowid, title, content, analysis) "
+                         "SELECT 'delete', id, title, content, analysis FROM documents WHERE docket_id = ?",
+                         (docket_id,))
+        self._db.execute("DELETE FROM comments WHERE docket_id = ?", (docket_id,))
+        self._db.execute("DELETE FROM documents WHERE docket_id = ?", (docket_id,))
+        self._db.execute("DELETE FROM dockets WHERE docket_id = ?", (docket_id,))
+
+    def _index_text(self, docket_id):
+        """Add a docket's comments and documents to the full-text indexes, in bulk rather than row by row."""
+        self._db.execute("INSERT INTO comments_fts (rowid, comment, submitter_name, organization, attachment_text) "
+                         "SELECT id, comment, submitter_name, organization, attachment_text FROM comments "
+                         "WHERE docket_id = ?",
+                         (docket_id,))
+        self._db.execute("INSERT INTO documents_fts (rowid, title, content, analysis) "
+                         "SELECT id, title, content, analysis FROM documents WHERE docket_id = ?", (docket_id,))
+
+    def _insert_docket(self, docket_id, docket):
+        self._db.execute("INSERT INTO dockets VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (docket_id, docket.get("Title"), docket.get("Agency"), docket.get("Docket Type"),
+                          docket.get("Summary"), docket.get("Analysis"), time.time()))
+
+    def _insert_document(self, docket_id, document):
+        self._db.execute("INSERT INTO documents (document_id, docket_id, title, posted_by, posted_date, path, "
+                         "content, analysis) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (document.get("Document ID"), docket_id, document.get("Proposed Rule Title"),
+                          document.get("Posted By"), iso_date(document.get("Posted Date")),
+                          document.get("Document Path"), document_text(document), document.get("Analysis")))
+
+    def _insert_comments(self, docket_id, batch):
+        # Row IDs are assigned here so comments and their categories can be inserted a batch at a time
+        next_id = self._db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM comments").fetchone()[0]
+        rows = []
+        categories = []
+        for row_id, (document_id, comment) in enumerate(batch, start=next_id):
+            rows.append((row_id, comment.get("Comment ID"), docket_id, document_id, comment.get("Submitter Name"),
+                         comment.get("Organization Name"), iso_date(comment.get("Posted On")),
+                         comment.get("Attachments", 0), comment.get("Bot_Likelihood_Score"),
+                         comment.get("Score Source"), comment.get("Cluster ID"), comment.get("Comment"),
+                         json.dumps({key: value for key, value in comment.items() if key not in COMMENT_COLUMNS},
+                                    ensure_ascii=False),
+                         comment.get("Attachment Text") or None))
+            categories.extend((category, row_id)
+                              for category, flagged in (comment.get("Sentiment") or {}).items() if flagged is True)
+        self._db.executemany("INSERT INTO comments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self._db.executemany("INSERT INTO comment_categories VALUES (?, ?)", categories)
+        return len(batch)
+
+    def _query(self, sql, params, text=None):
+        """Rows of `sql`, whose first parameter is the FTS5 query `text` when one is given."""
+        with self._lock:
+            try:
+                return [dict(row) for row in self._db.execute(sql, params)]
+            except sqlite3.OperationalError as e:
+                if not text or not str(e).startswith(FTS5_QUERY_ERRORS):
+                    raise
+        # Not valid FTS5 query syntax, e.g. a bare hyphenated ID, which FTS5 reads as a
+        # column filter ("no such column: 21"): search for the text as a phrase
+        phrase = text.replace('"', '""')
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, (f'"{phrase}"', *params[1:]))]
+
+    def search(self, text=None, docket_id=None, document_id=None, min_score=None, max_score=None, since=None,
+               until=None, month=None, category=None, with_attachments=None, limit=50):
+        """
+        Comments matching every given filter. `text` is an FTS5 query (words, "phrases",
+        OR, NOT, prefix*) and ranks the results; without it, newest comments come first.
+        Dates are 'YYYY-MM-DD', `month` is 'YYYY-MM' and `category` a moderation category.
+        """
+        if month:
+            since, until = month_range(month)
+        conditions = []
+        params = []
+        if text:
+            conditions.append("comments_fts MATCH ?")
+            params.append(text)
+        for condition, value in (("c.docket_id = ?", docket_id), ("c.document_id = ?", document_id),
+                                 ("c.bot_score >= ?", min_score), ("c.bot_score <= ?", max_score),
+                                 ("c.posted_on >= ?", since), ("c.posted_on <= ?", until),
+                                 ("c.id IN (SELECT comment FROM comment_categories WHERE category = ?)", category)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        if with_attachments is not None:
+            conditions.append("c.attachments > 0" if with_attachments else "c.attachments = 0")
+
+        columns = ("c.comment_id, c.docket_id, c.document_id, c.submitter_name, c.organization, c.posted_on, "
+                   "c.attachments, c.bot_score, c.score_source, c.cluster_id")
+        if text:
+            sql = (f"SELECT {columns}, snippet(comments_fts, -1, '[', ']', '...', 16) AS snippet "
+                   f"FROM comments_fts JOIN comments c ON c.id = comments_fts.rowid")
+            order = "rank"
+        else:
+            sql = f"SELECT {columns}, substr(c.comment, 1, 120) AS snippet FROM comments c"
+            order = "c.posted_on DESC"
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._query(f"{sql}{where} ORDER BY {order} LIMIT ?", [*params, limit], text)
+
+    def search_documents(self, text, docket_id=None, limit=20):
+        """Documents whose title, text or analysis match an FTS5 query, best matches first."""
+        sql = ("SELECT d.document_id, d.docket_id, d.title, d.posted_date, d.path, "
+               "snippet(documents_fts, 1, '[', ']', '...', 24) AS snippet "
+               "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid WHERE documents_fts MATCH ?")
+        params = [text]
+        if docket_id is not None:
+            sql += " AND d.docket_id = ?"
+            params.append(docket_id)
+        return self._query(f"{sql} ORDER BY rank LIMIT ?", [*params, limit], text)
+
+    def stats(self):
+        with self._lock:
+            return {table: self._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ("dockets", "documents", "comments")}
+
+    def close(self):
+        with self._lock:
+            self._db.execute("PRAGMA optimize")
+            self._db.close()
+
+
+def build_index(file_path, index_file="comments.sqlite", docket_id=None):
+    """Index one docket file into `index_file`. Returns the number of comments indexed."""
+    index = CommentIndex(index_file)
+    try:
+        return index.index_docket(file_path, docket_id)
+    finally:
+        index.close()
+
+
+def _print_rows(rows, elapsed):
+    for row in rows:
+        score = "" if row.get("bot_score") is None else f" score={row['bot_score']}"
+        name = row.get("submitter_name") or row.get("organization") or row.get("title") or ""
+        print(f"{row.get('comment_id') or row.get('document_id')}  {row.get('posted_on') or row.get('posted_date') or ''}"
+              f"{score}  {name}\n    {(row.get('snippet') or '').replace(chr(10), ' ')}")
+    print(f"{len(rows)} results in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index dockets in SQLite and search them.")
+    parser.add_argument("--db", default="comments.sqlite", help="index database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = commands.add_parser("index", help="index docket or analysis files")
+    index_parser.add_argument("files", nargs="+")
+    index_parser.add_argument("--docket-id", help="for files whose header has no Docket ID")
+
+    search_parser = commands.add_parser("search", help="search comments")
+    search_parser.add_argument("text", nargs="?", help="FTS5 query, e.g. 'apple AND (price OR yield)'")
+    search_parser.add_argument("--docket")
+    search_parser.add_argument("--document")
+    search_parser.add_argument("--min-score", type=float)
+    search_parser.add_argument("--max-score", type=float)
+    search_parser.add_argument("--since", help="YYYY-MM-DD")
+    search_parser.add_argument("--until", help="YYYY-MM-DD")
+    search_parser.add_argument("--month", help="YYYY-MM")
+    search_parser.add_argument("--category", help="moderation category, e.g. harassment")
+    search_parser.add_argument("--limit", type=int, default=50)
+
+    documents_parser = commands.add_parser("documents", help="search documents")
+    documents_parser.add_argument("text")
+    documents_parser.add_argument("--docket")
+    documents_parser.add_argument("--limit", type=int, default=20)
+
+    commands.add_parser("stats", help="count what is indexed")
+    args = parser.parse_args()
+
+    comment_index = CommentIndex(args.db)
+    try:
+        if args.command == "index":
+            for file_path in args.files:
+                comment_index.index_docket(file_path, args.docket_id)
+        elif args.command == "search":
+            started = time.perf_counter()
+            results = comment_index.search(args.text, args.docket, args.document, args.min_score, args.max_score,
+                                           args.since, args.until, args.month, args.category, limit=args.limit)
+            _print_rows(results, time.perf_counter() - started)
+        elif args.command == "documents":
+            started = time.perf_counter()
+            _print_rows(comment_index.search_documents(args.text, args.docket, args.limit),
+                        time.perf_counter() - started)
+        else:
+            print(comment_index.stats())
+    finally:
+        comment_index.close()
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from metrics import METRICS
+
+
+# Content types that are kept, and the extension they are stored under
+ACCEPTED_TYPES = {
+    "text/html": "htm",
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "text/plain": "txt",
+}
+
+
+class DownloadManager:
+    """
+    Parallel document downloads into content-addressed files, named by the
+    SHA-256 of their bytes, so a document fetched twice is stored once.
+    The validators of each URL (ETag, Last-Modified) are kept in `index.json`
+    and sent back as a conditional request, so unchanged documents are not
+    downloaded again. An interrupted download is resumed with a Range request.
+    """
+
+    def __init__(self, directory="downloads", workers=4, max_retries=3, timeout=30, session=None):
+        self.directory = directory
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.bytes_downloaded = 0
+        self._partial_dir = os.path.join(directory, ".partial")
+        self._index_file = os.path.join(directory, "index.json")
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self.session = session or requests.Session()
+        retry = Retry(total=max_retries, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504],
+                      respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        os.makedirs(self._partial_dir, exist_ok=True)
+        try:
+            with open(self._index_file, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def submit(self, url):
+        """Start downloading `url` in the background; the Future resolves to its path or None."""
+        with self._lock:
+            if url not in self._in_flight:
+                self._in_flight[url] = self._pool.submit(self.download, url)
+            return self._in_flight[url]
+
+    @METRICS.timed("download")
+    def download(self, url):
+        """Download `url` unless the stored copy is current. Returns the file path, or None on failure."""
+        try:
+            for attempt in range(self.max_retries):
+                try:
+                    return self._download(url)
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                    print(f"Download of {url} interrupted (attempt {attempt + 1}): {e}")
+                    # The session already retried the connection; only a transfer cut short is resumed
+                    if not os.path.exists(self._partial_paths(url)[0]):
+                        break
+                    METRICS.count("retries_total", stage="download")
+            print(f"Failed to download {url}")
+        except Exception as e:
+            print(f"An error occurred: {e}")
+        METRICS.count("failures_total", stage="download")
+        return None
+
+    def _partial_paths(self, url):
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self._partial_dir, f"{name}.part"), os.path.join(self._partial_dir, f"{name}.json")
+
+    def _download(self, url):
+        entry = self.index.get(url, {})
+        part_file, part_meta_file = self._partial_paths(url)
+        part_meta = {}
+        if os.path.exists(part_file) and os.path.exists(part_meta_file):
+            with open(part_meta_file, "r", encoding="utf-8") as f:
+                part_meta = json.load(f)
+
+        headers = {}
+        offset = 0
+        if part_meta.get("validator"):
+            METRICS.count("download_resumes_total")
+            offset = os.path.getsize(part_file)
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = part_meta["validator"]
+        elif entry.get("path") and os.path.exists(entry["path"]):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304:
+                METRICS.count("downloads_total", result="not_modified")
+                return entry["path"]
+            if response.status_code == 416 and offset:
+                return self._store(url, part_file, part_meta_file, part_meta)  # The partial file was complete
+            if response.status_code not in (200, 206):
+                print(f"Failed to download {url}. Status Code: {response.status_code}")
+                METRICS.count("failures_total", stage="download")
+                return None
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if response.status_code == 200:
+                if content_type not in ACCEPTED_TYPES:
+                    print(f"Skipping {url}: unsupported Content-Type '{content_type}'")
+                    METRICS.count("downloads_total", result="unsupported")
+                    return None
+                # A full response means the server ignored the Range or the document changed
+                offset = 0
+                part_meta = {"extension": ACCEPTED_TYPES[content_type],
+                             "etag": response.headers.get("ETag"),
+                             "last_modified": response.headers.get("Last-Modified")}
+                # Only a strong ETag or a date can validate a resumed range
+                etag = part_meta["etag"]
+                part_meta["validator"] = etag if etag and not etag.startswith("W/") else part_meta["last_modified"]
+                with open(part_meta_file, "w", encoding="utf-8") as f:
+                    json.dump(part_meta, f)
+
+            with open(part_file, "ab" if offset else "wb") as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+                    with self._lock:
+                        self.bytes_downloaded += len(chunk)
+                    METRICS.count("download_bytes_total", len(chunk))
+
+        return self._store(url, part_file, part_meta_file, part_meta)
+
+    def _store(self, url, part_file, part_meta_file, part_meta):
+        digest = hashlib.sha256()
+        with open(part_file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        path = os.path.join(self.directory, f"{digest.hexdigest()[:32]}.{part_meta['extension']}")
+        if os.path.exists(path):
+            os.remove(part_file)  # Same bytes as a document already stored
+            METRICS.count("downloads_total", result="duplicate")
+        else:
+            os.replace(part_file, path)
+            METRICS.count("downloads_total", result="stored")
+        os.remove(part_meta_file)
+
+        with self._lock:
+            self.index[url] = {"path": path, "etag": part_meta.get("etag"), "last_modified": part_meta.get("last_modified")}
+            self._save_index()
+        print(f"Document downloaded successfully: {path}")
+        return path
+
+    def _save_index(self):
+        temporary_file = f"{self._index_file}.tmp"
+        with open(temporary_file, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, indent=4)
+        os.replace(temporary_file, self._index_file)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        self.session.close()
+        if self.bytes_downloaded:
+            print(f"Downloaded {self.bytes_downloaded} bytes")
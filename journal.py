@@ -0,0 +1,72 @@
+import json
+import os
+import threading
+
+
+class ScrapeJournal:
+    """
+    Append-only JSON-lines record of finished scrape work, one line per docket,
+    document, comment listing or comment, keyed by URL. Reopening an existing
+    journal loads everything already finished so a rerun can skip it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.docket = None
+        self.documents = {}
+        self.listings = {}
+        self.comments = {}
+        self._load()
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave the last line half written
+                    continue
+                if entry["type"] == "docket":
+                    self.docket = entry["data"]
+                elif entry["type"] == "document":
+                    self.documents[entry["url"]] = entry["data"]
+                elif entry["type"] == "listing":
+                    self.listings[entry["url"]] = entry["data"]
+                elif entry["type"] == "comment":
+                    self.comments[entry["url"]] = entry["data"]
+        print(f"Resuming from {self.path}: {len(self.documents)} documents, {len(self.comments)} comments")
+
+    def _append(self, entry_type, url, data):
+        line = json.dumps({"type": entry_type, "url": url, "data": data}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def record_docket(self, docket_data):
+        self.docket = docket_data
+        self._append("docket", None, docket_data)
+
+    def record_document(self, link, doc):
+        self.documents[link] = doc
+        self._append("document", link, doc)
+
+    def record_listing(self, link, comment_urls):
+        self.listings[link] = comment_urls
+        self._append("listing", link, comment_urls)
+
+    def record_comment(self, comment_url, commenter_info):
+        self.comments[comment_url] = commenter_info
+        self._append("comment", comment_url, commenter_info)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def discard(self):
+        """Remove the journal once its work has been saved for good."""
+        self.close()
+        os.remove(self.path)
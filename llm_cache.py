@@ -0,0 +1,72 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+
+
+MISSING = object()
+
+
+def normalize_text(text):
+    """Normalize text so trivially different copies of a comment share one cache entry."""
+    return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+class ResultCache:
+    """
+    Persistent cache of LLM and moderation results in SQLite, keyed by a hash of
+    the model, the prompt template and the normalized input text. Once more than
+    `max_entries` results are stored, the least recently used tenth is evicted.
+    """
+
+    def __init__(self, path="llm_cache.sqlite", max_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS results "
+                         "(key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self._count = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    @staticmethod
+    def key(model, template, text):
+        digest = hashlib.sha256()
+        for part in (model, template, normalize_text(text)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached value for `key`, or MISSING."""
+        with self._lock:
+            row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return MISSING
+            self.hits += 1
+            self._db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        with self._lock:
+            cursor = self._db.execute("INSERT OR IGNORE INTO results (key, value, last_used) VALUES (?, ?, ?)",
+                                      (key, json.dumps(value), time.time()))
+            self._count += cursor.rowcount
+            if self._count > self.max_entries:
+                evicted = self._db.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                    (self._count - self.max_entries + self.max_entries // 10,)).rowcount
+                self._count -= evicted
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": self._count}
+
+    def close(self):
+        self._db.close()
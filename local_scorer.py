@@ -0,0 +1,137 @@
+import json
+import re
+import numpy as np
+import pandas as pd
+from clustering import cluster_comments
+from timeline import analyze_timeline
+
+
+FEATURES = ["type_token_ratio", "log_word_count", "mean_word_length", "uppercase_ratio",
+            "log_cluster_size", "log_same_day_ratio", "posting_burst"]
+
+
+def posting_days(posted_on):
+    """Comments per posting day, from the 'Posted On' dates of a docket's comments."""
+    return pd.to_datetime(pd.Series(posted_on, dtype=object), format='%b %d, %Y', errors='coerce').value_counts()
+
+
+def comment_features(comments, day_counts=None):
+    """
+    Stylometric and campaign features of each comment, one row per comment:
+    vocabulary richness, length, casing, how many near-duplicates it has, how
+    crowded its posting day was compared to an average day and whether it was
+    posted during a burst (timeline.analyze_timeline). Posting days are counted
+    over `comments` unless `day_counts` (posting_days) covers a larger set.
+    """
+    texts = [comment.get("Comment") or "" for comment in comments]
+    words = [re.findall(r"\w+", text) for text in texts]
+    word_counts = np.array([len(item) for item in words], dtype=float)
+    distinct_counts = np.array([len({word.lower() for word in item}) for item in words], dtype=float)
+    letter_counts = np.array([sum(len(word) for word in item) for item in words], dtype=float)
+    upper_counts = np.array([sum(char.isupper() for char in text) for text in texts], dtype=float)
+    cluster_sizes = np.array([comment.get("Cluster Size", 1) for comment in comments], dtype=float)
+    bursts = np.array([bool(comment.get("Posting Burst")) for comment in comments], dtype=float)
+
+    posted = pd.to_datetime(pd.Series([comment.get("Posted On") for comment in comments], dtype=object),
+                            format='%b %d, %Y', errors='coerce')
+    if day_counts is None:
+        day_counts = posted.value_counts()
+    # The average day as seen by a comment: days weighted by their comments
+    mean_day = float((day_counts ** 2).sum() / day_counts.sum()) if day_counts.sum() else 1.0
+    same_day_ratio = np.nan_to_num(posted.map(day_counts).to_numpy(dtype=float, na_value=np.nan) / mean_day, nan=1.0)
+
+    safe_words = np.maximum(word_counts, 1)
+    return np.column_stack([
+        distinct_counts / safe_words,
+        np.log1p(word_counts),
+        letter_counts / safe_words,
+        upper_counts / np.maximum(letter_counts, 1),
+        np.log(np.maximum(cluster_sizes, 1)),
+        np.log(np.maximum(same_day_ratio, 1e-3)),
+        bursts,
+    ])
+
+
+class LocalScorer:
+    """
+    Ridge regression over comment_features, trained on bot likelihood scores from
+    earlier GPT runs. Scores inside `uncertain_band` are worth asking GPT about.
+    A model saved before a feature was added keeps working on the features it knows.
+    """
+
+    def __init__(self, weights, intercept, mean, std, uncertain_band=(1.5, 3.5), features=None):
+        self.features = list(features or FEATURES)
+        self._columns = [FEATURES.index(feature) for feature in self.features]
+        self.weights = np.asarray(weights, dtype=float)
+        self.intercept = float(intercept)
+        self.mean = np.asarray(mean, dtype=float)
+        self.std = np.asarray(std, dtype=float)
+        self.uncertain_band = tuple(uncertain_band)
+
+    @classmethod
+    def train(cls, comments, l2=1.0, **options):
+        """
+        Fit on comments without attachments that carry a Bot_Likelihood_Score. Scores of
+        exactly 2.5 are left out, since that is also what a failed GPT call or unparsable reply yields.
+        """
+        labeled = [comment for comment in comments
+                   if comment.get("Comment") and not comment.get("Attachments", 0)
+                   and comment.get("Bot_Likelihood_Score") not in (None, 2.5)]
+        if not labeled:
+            raise ValueError("No scored comments to train on")
+        features = comment_features(labeled)
+        targets = np.array([comment["Bot_Likelihood_Score"] for comment in labeled], dtype=float)
+
+        mean = features.mean(axis=0)
+        std = features.std(axis=0)
+        std[std == 0] = 1.0
+        standardized = (features - mean) / std
+        intercept = targets.mean()
+        weights = np.linalg.solve(standardized.T @ standardized + l2 * np.eye(len(FEATURES)),
+                                  standardized.T @ (targets - intercept))
+        print(f"Trained local scorer on {len(labeled)} comments")
+        return cls(weights, intercept, mean, std, **options)
+
+    def predict(self, comments, day_counts=None):
+        """Bot likelihood scores between 0 and 5 for every comment."""
+        if not comments:
+            return np.empty(0)
+        standardized = (comment_features(comments, day_counts)[:, self._columns] - self.mean) / self.std
+        return np.clip(standardized @ self.weights + self.intercept, 0, 5)
+
+    def is_uncertain(self, scores):
+        low, high = self.uncertain_band
+        return (scores >= low) & (scores <= high)
+
+    def save(self, path="local_model.json"):
+        with open(path, "w", encoding="utf-8") as model_file:
+            json.dump({"features": self.features, "weights": self.weights.tolist(), "intercept": self.intercept,
+                       "mean": self.mean.tolist(), "std": self.std.tolist(),
+                       "uncertain_band": list(self.uncertain_band)}, model_file, indent=4)
+
+    @classmethod
+    def load(cls, path="local_model.json"):
+        with open(path, "r", encoding="utf-8") as model_file:
+            model = json.load(model_file)
+        if not set(model["features"]) <= set(FEATURES):
+            raise ValueError(f"Model '{path}' was trained on different features; retrain it")
+        return cls(model["weights"], model["intercept"], model["mean"], model["std"], model["uncertain_band"],
+                   model["features"])
+
+
+def train_local_model(analysis_file="docket_analysis.json", model_file="local_model.json"):
+    """Train the local scorer from the scores of an earlier analysis and save it."""
+    with open(analysis_file, "r", encoding="utf-8") as json_file:
+        docket = json.load(json_file)
+    comments = [comment for document in docket.get("Documents", []) for comment in document.get("Comments") or []]
+    if not any("Cluster Size" in comment for comment in comments):
+        cluster_comments(comments)
+    if not any("Posting Burst" in comment for comment in comments):
+        analyze_timeline(comments)
+    scorer = LocalScorer.train(comments)
+    scorer.save(model_file)
+    return scorer
+
+
+if __name__ == "__main__":
+    train_local_model()
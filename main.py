@@ -1,21 +1,171 @@
+import argparse
 import os
+import sys
 from dotenv import load_dotenv
+from metrics import METRICS
 
-from scrapper import DocketScraper
-from analysis import analyze
 
+DEFAULT_DOCKET = "FCIC-21-0007"
 
 # Load environment variables from the .env file
 load_dotenv()
 
 
-if __name__ == "__main__":
-    url = "https://www.regulations.gov/docket/FCIC-21-0007"
-    output_file = "docket.json"
+def _docket_url(docket):
+    """The regulations.gov URL of a docket given by ID or URL."""
+    return docket if docket.startswith("http") else f"https://www.regulations.gov/docket/{docket}"
+
+
+def _existing(path):
+    return path if path and os.path.exists(path) else None
+
+
+# Each command imports what it needs when it runs: Selenium, OpenAI, pandas and
+# matplotlib take seconds to import, and most runs only need some of them.
+
+def scrape(args):
+    from scrapper import DocketScraper
+
+    # Later runs only fetch the comments added or changed since the previous output
+    scraper = DocketScraper(_docket_url(args.docket), backend=args.backend, workers=args.workers,
+                            requests_per_second=args.requests_per_second,
+                            max_requests_per_second=args.max_requests_per_second, journal_file=f"{args.output}.journal",
+                            previous_file=None if args.full else _existing(args.output))
+    scraper.run(args.output)
+    return args.output
+
+
+def analyze(args):
+    import analysis
+
+    output = args.output or ("docket_analysis.ndjson" if args.input.endswith(".ndjson") else "docket_analysis.json")
+    analysis_output = analysis.analyze(args.input, os.getenv("OPENAI_API_KEY"),
+                                       previous_analysis=None if args.full else _existing(output),
+                                       concurrency=args.concurrency, cache_file=args.cache,
+                                       local_model_file=_existing(args.local_model), parquet_file=args.parquet,
+                                       attachment_dir=None if args.no_attachments else args.attachments,
+                                       image_dir=None if args.no_charts else args.images, output_file=output)
+    if args.index:
+        index(argparse.Namespace(files=[analysis_output], db=args.index, docket_id=None))
+    return analysis_output
+
+
+def charts(args):
+    from analysis import chart_analysis
+
+    return chart_analysis(args.input, args.images)
+
+
+def index(args):
+    from comment_index import build_index
+
+    # Searchable with `python comment_index.py search ...`
+    for file_path in args.files:
+        build_index(file_path, args.db, args.docket_id)
+
 
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+def run(args):
+    """Scrape and analyze, either one after the other or pipelined."""
+    if not args.pipeline:
+        scrape(argparse.Namespace(**vars(args), output=args.docket_file))
+        return analyze(argparse.Namespace(**vars(args), input=args.docket_file, output=args.analysis_file))
 
-    scraper = DocketScraper(url)
-    scraper.run(output_file)
+    from pipeline import run_pipeline
 
-    analyze(output_file, OPENAI_API_KEY)
+    # Score and summarize while the scrape is still running
+    analysis_output = run_pipeline(
+        _docket_url(args.docket), os.getenv("OPENAI_API_KEY"), args.docket_file, args.analysis_file,
+        previous_analysis=None if args.full else _existing(args.analysis_file), concurrency=args.concurrency,
+        cache_file=args.cache, local_model_file=_existing(args.local_model), parquet_file=args.parquet,
+        attachment_dir=None if args.no_attachments else args.attachments,
+        image_dir=None if args.no_charts else args.images, backend=args.backend, workers=args.workers,
+        requests_per_second=args.requests_per_second, max_requests_per_second=args.max_requests_per_second,
+        journal_file=f"{args.docket_file}.journal",
+        previous_file=None if args.full else _existing(args.docket_file))
+    if args.index:
+        index(argparse.Namespace(files=[analysis_output], db=args.index, docket_id=None))
+    return analysis_output
+
+
+def add_scrape_arguments(parser):
+    parser.add_argument("--docket", default=DEFAULT_DOCKET, help="docket ID or regulations.gov URL")
+    parser.add_argument("--backend", default=os.getenv("SCRAPER_BACKEND", "selenium"),
+                        choices=["selenium", "http", "auto"])
+    parser.add_argument("--workers", type=int, default=1, help="comment pages fetched concurrently")
+    parser.add_argument("--requests-per-second", type=float, default=None,
+                        help="starting request budget (0.1 for selenium, 0.25 for http)")
+    parser.add_argument("--max-requests-per-second", type=float, default=None,
+                        help="highest request budget (1 for selenium, 1000 an hour for http)")
+
+
+def add_analyze_arguments(parser):
+    parser.add_argument("--concurrency", type=int, default=8, help="OpenAI requests in flight")
+    parser.add_argument("--cache", default="llm_cache.sqlite", help="LLM result cache")
+    parser.add_argument("--local-model", default="local_model.json", help="local bot scorer, used if it exists")
+    parser.add_argument("--parquet", default="docket_comments.parquet", help="Parquet export of the comments")
+    parser.add_argument("--images", default="images", help="chart directory")
+    parser.add_argument("--no-charts", action="store_true", help="skip the charts; matplotlib is not loaded")
+    parser.add_argument("--attachments", default="downloads/attachments", help="attachment download directory")
+    parser.add_argument("--no-attachments", action="store_true", help="do not download comment attachments")
+    parser.add_argument("--index", default="comments.sqlite", help="search index to load the analysis into")
+    parser.add_argument("--no-index", dest="index", action="store_const", const=None)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape and analyze regulations.gov dockets.")
+    commands = parser.add_subparsers(dest="command")
+
+    run_parser = commands.add_parser("run", help="scrape and analyze a docket (the default)")
+    add_scrape_arguments(run_parser)
+    add_analyze_arguments(run_parser)
+    run_parser.add_argument("--docket-file", default="docket.json")
+    run_parser.add_argument("--analysis-file", default="docket_analysis.json")
+    run_parser.add_argument("--pipeline", action="store_true",
+                            default=os.getenv("PIPELINE", "").lower() in ("1", "true", "yes"),
+                            help="score and summarize while scraping")
+    run_parser.add_argument("--full", action="store_true", help="ignore the previous outputs")
+
+    scrape_parser = commands.add_parser("scrape", help="scrape a docket")
+    add_scrape_arguments(scrape_parser)
+    scrape_parser.add_argument("--output", default="docket.json", help=".json, or .ndjson to stream")
+    scrape_parser.add_argument("--full", action="store_true", help="fetch every comment again")
+
+    analyze_parser = commands.add_parser("analyze", help="analyze a scraped docket")
+    analyze_parser.add_argument("--input", default="docket.json")
+    analyze_parser.add_argument("--output", default=None, help="defaults to docket_analysis.json (.ndjson)")
+    add_analyze_arguments(analyze_parser)
+    analyze_parser.add_argument("--full", action="store_true", help="score every comment again")
+
+    charts_parser = commands.add_parser("charts", help="draw the charts of an analysis")
+    charts_parser.add_argument("--input", default="docket_analysis.json")
+    charts_parser.add_argument("--images", default="images", help="chart directory")
+
+    index_parser = commands.add_parser("index", help="load analyzed dockets into the search index")
+    index_parser.add_argument("files", nargs="*", default=["docket_analysis.json"])
+    index_parser.add_argument("--db", default="comments.sqlite")
+    index_parser.add_argument("--docket-id", help="for files whose header has no Docket ID")
+
+    # Without a command, do what main.py always did: scrape and analyze the default docket
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in commands.choices and argv[0] not in ("-h", "--help"):
+        argv = ["run", *argv]
+    return parser.parse_args(argv)
+
+
+COMMANDS = {"run": run, "scrape": scrape, "analyze": analyze, "charts": charts, "index": index}
+# Commands whose run report is worth keeping; the others would overwrite it with an empty one
+REPORTED_COMMANDS = {"run", "scrape", "analyze"}
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command not in REPORTED_COMMANDS:
+        COMMANDS[args.command](args)
+        sys.exit(0)
+    try:
+        COMMANDS[args.command](args)
+    finally:
+        # Timings, counters and latency histograms of every stage, written even when the run fails
+        METRICS.write_report("run_report.json")
+        if os.getenv("PROMETHEUS_FILE"):
+            METRICS.write_prometheus(os.getenv("PROMETHEUS_FILE"))
@@ -0,0 +1,210 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Queue
+from openai import OpenAI
+from analysis import (carry_over_score, distribute_comments, load_previous_scores, score_comments,
+                      summarize_attachments, summarize_docket, summarize_document)
+from attachments import AttachmentProcessor
+from clustering import cluster_comments
+from comment_frame import ParquetExporter, comments_to_frame
+from llm_cache import ResultCache
+from local_scorer import LocalScorer
+from prompts import scoring_text
+from records import RecordView, partition
+from scoring import ScoringEngine
+from scrapper import DocketScraper
+from timeline import analyze_timeline
+from utils import records_to_docket, write_ndjson
+
+
+class ScrapeAnalyzePipeline:
+    """
+    Runs a scrape and its analysis at the same time. The scraper works on a
+    producer thread and hands over every record as soon as it is scraped;
+    comments are scored in batches of `batch_size`, or of whatever arrived in
+    `batch_wait` seconds, while scraping goes on, and each document is
+    summarized as soon as its download finishes. With an AttachmentProcessor,
+    the attachments of each batch are read in the background and scored once
+    the scrape is over. Clusters and posting bursts can only be found once every
+    comment is in, so the docket is clustered and flagged again at the end, and
+    the comments the local scorer may settle are only picked then.
+    """
+
+    def __init__(self, scraper, client, engine, cache=None, local_scorer=None, previous_analysis=None,
+                 batch_size=64, batch_wait=5.0, max_queued=10000, attachments=None):
+        self.scraper = scraper
+        self.client = client
+        self.engine = engine
+        self.cache = cache
+        self.local_scorer = local_scorer
+        self.attachments = attachments
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.scored = load_previous_scores(previous_analysis) if previous_analysis else {}
+        self._records = Queue(maxsize=max_queued)
+        self._summaries = {}
+        self._summaries_lock = threading.Lock()
+        self._summary_pool = ThreadPoolExecutor(max_workers=2)
+        self._scoring_pool = ThreadPoolExecutor(max_workers=2)
+
+    def _summarize(self, key, summarize, *args):
+        """Start a summary unless one for `key` is already running."""
+        with self._summaries_lock:
+            if key not in self._summaries:
+                self._summaries[key] = self._summary_pool.submit(summarize, *args)
+            return self._summaries[key]
+
+    def _on_download(self, document):
+        self._summarize(document.get("Document ID"), summarize_document, document, self.client, self.cache,
+                        self.engine)
+
+    def _on_record(self, record):
+        # Scoring and summaries write into the data, and the scraper still has to save it as scraped
+        self._records.put({**record, "data": dict(record["data"])})
+
+    def _scrape(self, output_file, errors):
+        try:
+            self.scraper.run(output_file, on_record=self._on_record, on_download=self._on_download)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            self._records.put(None)
+
+    def _score_batch(self, comments):
+        """
+        Score a batch while the scrape goes on. Whether the local scorer may settle a
+        comment depends on the clusters and bursts of the whole docket, so with one
+        only the moderation categories of each cluster's first member are requested here.
+        """
+        if self.local_scorer is None:
+            return score_comments(comments, self.engine)
+        eligible = RecordView.where(comments, scoring_text)
+        self.engine.score([eligible[members[0]] for members in cluster_comments(eligible)], bot_likelihood=False)
+        return comments
+
+    def _submit(self, batch, scoring, reading):
+        """Start scoring the plain-text comments of a batch and reading the attachments of the others."""
+        plain_comments = [comment for comment in batch if not comment.get("Attachments", 0)]
+        attachment_comments = [comment for comment in batch if comment.get("Attachments", 0)]
+        scoring.append(self._scoring_pool.submit(self._score_batch, plain_comments))
+        if self.attachments is not None and attachment_comments:
+            reading.append(self.attachments.start(attachment_comments))
+
+    def _iter_records(self):
+        """Yield scraped records, or None whenever the scraper has sent nothing for `batch_wait` seconds."""
+        while True:
+            try:
+                record = self._records.get(timeout=self.batch_wait)
+            except Empty:
+                yield None
+                continue
+            if record is None:
+                return
+            yield record
+
+    def run(self, output_file="docket.json", analysis_file="docket_analysis.json", parquet_file=None,
+            image_dir="images"):
+        """Scrape into `output_file` while writing the analysis to `analysis_file`. Returns `analysis_file`."""
+        errors = []
+        producer = threading.Thread(target=self._scrape, args=(output_file, errors), daemon=True)
+        producer.start()
+
+        records = []
+        scoring = []
+        reading = []
+        batch = []
+        batch_started = 0.0
+        for record in self._iter_records():
+            # A slow scrape still gets its comments scored once the oldest has waited `batch_wait` seconds
+            if batch and (len(batch) >= self.batch_size or time.monotonic() - batch_started >= self.batch_wait):
+                self._submit(batch, scoring, reading)
+                batch = []
+            if record is None:
+                continue
+            records.append(record)
+            data = record["data"]
+            if record["type"] == "docket":
+                self._summarize("docket", summarize_docket, data, self.client, self.cache)
+            elif record["type"] == "document":
+                # Documents that were not downloaded in this run start here
+                self._summarize(data.get("Document ID"), summarize_document, data, self.client, self.cache,
+                                self.engine)
+            elif record["type"] == "comment":
+                carry_over_score(data, self.scored)
+                if not batch:
+                    batch_started = time.monotonic()
+                batch.append(data)
+        if batch:
+            self._submit(batch, scoring, reading)
+        producer.join()
+        if errors:
+            raise errors[0]
+
+        for future in scoring:
+            future.result()
+        comment_records = [record for record in records if record["type"] == "comment"]
+        comments = [record["data"] for record in comment_records]
+        # Bursts and clusters of the whole docket, as analyze_docket finds them, replace those of the batches
+        timeline = analyze_timeline(comments)
+        plain_comments = partition(comments, lambda comment: comment.get("Attachments", 0))[1]
+        score_comments(plain_comments, self.engine, self.local_scorer)
+        attachment_comments = [comment for future in reading for comment in future.result()]
+        if attachment_comments:
+            score_comments(attachment_comments, self.engine, self.local_scorer)
+            summarize_attachments(attachment_comments, self.client, self.cache, self.engine)
+        for record in records:
+            if record["type"] == "docket":
+                record["data"]["Analysis"] = self._summaries["docket"].result()
+                record["data"]["Timeline"] = timeline.summary([comment.get("Cluster ID") for comment in comments])
+            elif record["type"] == "document":
+                summary = self._summaries[record["data"].get("Document ID")].result()
+                record["data"]["Analysis"] = summary.get("Analysis")
+        self._summary_pool.shutdown()
+        self._scoring_pool.shutdown()
+
+        frame = comments_to_frame(comments, [record.get("document") for record in comment_records])
+        exporter = ParquetExporter(parquet_file) if parquet_file else None
+        distribute_comments(frame, exporter, image_dir)
+        if exporter is not None:
+            exporter.close()
+
+        if analysis_file.endswith(".ndjson"):
+            write_ndjson(analysis_file, records)
+        else:
+            with open(analysis_file, "w", encoding="utf-8") as json_file:
+                json.dump(records_to_docket(records), json_file, indent=4, ensure_ascii=False)
+        return analysis_file
+
+
+def run_pipeline(url, open_ai_key, output_file="docket.json", analysis_file="docket_analysis.json",
+                 previous_analysis=None, concurrency=8, openai_base_url=None, cache_file="llm_cache.sqlite",
+                 local_model_file=None, parquet_file=None, attachment_dir="downloads/attachments", image_dir="images",
+                 **scraper_options):
+    """
+    Scrape `url` and analyze it in one pass; see ScrapeAnalyzePipeline. Comment
+    attachments are read into `attachment_dir`, and charts drawn into `image_dir`,
+    unless they are None.
+    `scraper_options` are passed to DocketScraper. Returns `analysis_file`.
+    """
+    client = OpenAI(api_key=open_ai_key, base_url=openai_base_url)
+    cache = ResultCache(cache_file) if cache_file else None
+    engine = ScoringEngine(open_ai_key, base_url=openai_base_url, concurrency=concurrency, cache=cache)
+    local_scorer = LocalScorer.load(local_model_file) if local_model_file else None
+    attachments = AttachmentProcessor(attachment_dir) if attachment_dir else None
+    try:
+        scraper = DocketScraper(url, **scraper_options)
+        pipeline = ScrapeAnalyzePipeline(scraper, client, engine, cache, local_scorer, previous_analysis,
+                                         attachments=attachments)
+        pipeline.run(output_file, analysis_file, parquet_file, image_dir)
+    finally:
+        if attachments is not None:
+            attachments.close()
+        engine.close()
+        if cache is not None:
+            print(f"LLM cache: {cache.stats()}")
+            cache.close()
+    outputs = [output_file, analysis_file, *([f"{image_dir}/"] if image_dir else []), "downloads/"]
+    print("\nAnalysis completed. Check results here:\n" + "\n".join(f"- {path}" for path in outputs))
+    return analysis_file
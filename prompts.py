@@ -0,0 +1,67 @@
+import json
+
+
+CHAT_MODEL = "gpt-3.5-turbo"
+MODERATION_MODEL = "text-moderation-latest"
+
+
+def bot_likelihood_messages(comment):
+    return [
+        {"role": "system",
+         "content": "You are an AI that can detect bot-generated comments. Score each comment from 0-5, \
+                    where 0 means very likely human-written and 5 means extremely likely bot-generated."},
+        {"role": "user",
+         "content": f"Analyze this comment and provide a score from 0-5 for bot likelihood:\n\n{comment}"}
+    ]
+
+
+def summary_messages(content):
+    return [
+        {"role": "system",
+         "content": "You are an AI that can identify the theme and extract insights from the content."},
+        {"role": "user",
+         "content": f"Analyze this content: \n\n{content}"}
+    ]
+
+
+def merge_summary_messages(summaries):
+    return [
+        {"role": "system",
+         "content": "You are an AI that can identify the theme and extract insights from the content."},
+        {"role": "user",
+         "content": f"These are analyses of consecutive parts of one document. Combine them into a single \
+analysis of the theme and insights of the whole document:\n\n{summaries}"}
+    ]
+
+
+# Prompt templates identify cached results, so editing a prompt invalidates them
+BOT_LIKELIHOOD_TEMPLATE = json.dumps(bot_likelihood_messages("{comment}"))
+SUMMARY_TEMPLATE = json.dumps(summary_messages("{content}"))
+MERGE_SUMMARY_TEMPLATE = json.dumps(merge_summary_messages("{summaries}"))
+MODERATION_TEMPLATE = "moderation"
+
+
+def parse_bot_score(bot_score_text):
+    """Clamp the model's reply to 0-5, or return the middle score if it is not a number."""
+    try:
+        return max(0, min(5, float(bot_score_text.strip())))
+    except (ValueError, AttributeError):
+        return 2.5  # Default middle score if parsing fails
+
+
+def scoring_text(comment, max_chars=8000):
+    """
+    The text a comment is scored on: its body, or for a comment with attachments, its
+    body followed by the attachments' extracted text, cut to `max_chars`. None when
+    there is nothing to score, e.g. attachments whose text has not been extracted.
+    """
+    if not comment.get("Attachments", 0):
+        return comment.get("Comment") or None
+    if not comment.get("Attachment Text"):
+        return None
+    return f"{comment.get('Comment') or ''}\n\n{comment['Attachment Text']}".strip()[:max_chars]
+
+
+def estimate_tokens(text):
+    """Rough token count used for rate limiting: about four characters per token."""
+    return len(text or "") // 4 + 1
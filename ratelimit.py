@@ -0,0 +1,80 @@
+import threading
+import time
+from metrics import METRICS
+
+
+def retry_after(error):
+    """Seconds a throttled request asked to wait in its Retry-After header, or None."""
+    response = getattr(error, "response", None)
+    if response is None or response.status_code not in (429, 503):
+        return None
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every worker of a scrape.
+    `rate` is the starting requests-per-second budget; a rate of 0 or less disables limiting.
+    While requests succeed quickly the rate climbs towards `max_rate` (four times
+    `rate` by default); a request slower than `slow_seconds` eases it off, and a
+    failed or throttled one halves it, down to `min_rate`.
+    """
+
+    def __init__(self, rate, burst=1, min_rate=None, max_rate=None, slow_seconds=10):
+        self.enabled = rate > 0
+        self.rate = rate
+        self.step = rate / 10
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        self.max_rate = max_rate if max_rate is not None else rate * 4
+        self.slow_seconds = slow_seconds
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the budget allows one more request."""
+        if not self.enabled:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            METRICS.count("rate_limit_wait_seconds_total", wait)
+            time.sleep(wait)
+
+    def backoff(self, retry_after=None):
+        """
+        Halve the rate after a failed or throttled request. A `retry_after` from the
+        server holds every worker back for that many seconds.
+        """
+        METRICS.count("rate_limit_backoffs_total")
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                self._tokens = 0
+
+    def success(self, seconds=None):
+        """
+        Speed up by a tenth of the starting rate after a healthy request, or slow down
+        by a quarter if the request took longer than `slow_seconds`.
+        """
+        with self._lock:
+            if seconds is not None and seconds > self.slow_seconds:
+                METRICS.count("rate_limit_slowdowns_total")
+                self.rate = max(self.min_rate, self.rate * 0.75)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.step)
@@ -0,0 +1,295 @@
+import sys
+import threading
+from array import array
+from collections.abc import MutableMapping, Sequence
+from openai.types.moderation import Categories
+
+
+# Bit positions of the moderation categories, two per category: flagged, and None
+# (a category the model did not rate). Categories the API adds later get the next free bits.
+CATEGORY_BITS = {category: 2 * i for i, category in enumerate(Categories.model_fields)}
+_category_lock = threading.Lock()
+# Most comments share a handful of masks, so each distinct mask is stored once
+_masks = {}
+
+
+def _category_bit(category):
+    bit = CATEGORY_BITS.get(category)
+    if bit is None:
+        with _category_lock:
+            bit = CATEGORY_BITS.setdefault(category, 2 * len(CATEGORY_BITS))
+    return bit
+
+
+def encode_sentiment(sentiment):
+    """A moderation categories dict as an int: bit 2i when category i is flagged, 2i + 1 when it is None."""
+    if sentiment is None:
+        return None
+    mask = 0
+    for category, flagged in sentiment.items():
+        if flagged is True:
+            mask |= 1 << _category_bit(category)
+        elif flagged is None:
+            mask |= 2 << _category_bit(category)
+    return _masks.setdefault(mask, mask)
+
+
+def decode_sentiment(mask):
+    """The categories dict of a mask from encode_sentiment, every known category included."""
+    if mask is None:
+        return None
+    sentiment = {}
+    for category, bit in CATEGORY_BITS.items():
+        if mask >> bit & 1:
+            sentiment[category] = True
+        elif mask >> bit & 2:
+            sentiment[category] = None
+        elif bit < 2 * len(Categories.model_fields):
+            sentiment[category] = False
+    return sentiment
+
+
+# Key order tuples, shared by every record whose fields were set in that order, so
+# keeping the order costs one pointer per record
+_key_orders = {}
+# (id of a shared key order, new key) -> the key order with the key appended; shared
+# orders are never freed, so their ids stay valid
+_appended = {}
+
+
+def _append_key(order, key):
+    extended = _appended.get((id(order), key))
+    if extended is None:
+        extended = order + (key,)
+        extended = _key_orders.setdefault(extended, extended)
+        _appended[(id(order), key)] = extended
+    return extended
+
+
+def _compact(value):
+    """Interned strings and tuples, so values repeated across records are stored once."""
+    if type(value) is str:
+        return sys.intern(value)
+    if type(value) is list and all(type(item) is str for item in value):
+        # An empty list becomes the shared empty tuple
+        return tuple(sys.intern(item) for item in value)
+    return value
+
+
+class Record(MutableMapping):
+    """
+    A docket, document or comment with its known fields in slots instead of a dict.
+    It reads and writes like the dict it replaces, keyed by the JSON field names,
+    and iterates in the order its fields were set, as a dict would; fields without
+    a slot are kept in a dict of their own. String values are interned, so
+    repeated names, dates and form letters take no extra memory.
+    """
+
+    __slots__ = ("_extra", "_order")
+    # JSON field name -> slot
+    FIELDS = {}
+    # JSON field name -> (encode, decode) for fields stored in another form
+    CODECS = {}
+
+    def __init__(self, data=()):
+        if not hasattr(data, "items"):
+            data = dict(data)
+        for key, value in data.items():
+            self._store(key, value)
+        order = tuple(data)
+        self._order = _key_orders.setdefault(order, order)
+
+    def __getitem__(self, key):
+        slot = self.FIELDS.get(key)
+        if slot is None:
+            extra = getattr(self, "_extra", None)
+            if extra is None or key not in extra:
+                raise KeyError(key)
+            return extra[key]
+        try:
+            value = getattr(self, slot)
+        except AttributeError:
+            raise KeyError(key) from None
+        codec = self.CODECS.get(key)
+        return codec[1](value) if codec else value
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._order = _append_key(getattr(self, "_order", ()), key)
+        self._store(key, value)
+
+    def _store(self, key, value):
+        codec = self.CODECS.get(key)
+        value = codec[0](value) if codec else _compact(value)
+        slot = self.FIELDS.get(key)
+        if slot is not None:
+            setattr(self, slot, value)
+            return
+        extra = getattr(self, "_extra", None)
+        if extra is None:
+            extra = self._extra = {}
+        extra[key] = value
+
+    def __delitem__(self, key):
+        slot = self.FIELDS.get(key)
+        try:
+            if slot is not None:
+                delattr(self, slot)
+            else:
+                del self._extra[key]
+        except (AttributeError, KeyError):
+            raise KeyError(key) from None
+        order = ()
+        for other in self._order:
+            if other != key:
+                order = _append_key(order, other)
+        self._order = order
+
+    def __contains__(self, key):
+        slot = self.FIELDS.get(key)
+        if slot is not None:
+            return hasattr(self, slot)
+        extra = getattr(self, "_extra", None)
+        return extra is not None and key in extra
+
+    def __iter__(self):
+        return iter(getattr(self, "_order", ()))
+
+    def __len__(self):
+        return len(getattr(self, "_order", ()))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def to_dict(self):
+        """The record as the dict it would have been, for json.dump."""
+        return {key: self[key] for key in self}
+
+
+def _slots(fields):
+    return tuple(fields.values())
+
+
+class Comment(Record):
+    FIELDS = {
+        "Comment ID": "comment_id",
+        "Submitter Name": "submitter_name",
+        "Organization Name": "organization",
+        "City": "city",
+        "State or Province": "state",
+        "Country": "country",
+        "ZIP/Postal Code": "zip_code",
+        "Category": "category",
+        "Posted On": "posted_on",
+        "Posted At": "posted_at",
+        "Last Modified": "last_modified",
+        "Attachments": "attachments",
+        "Attachment Types": "attachment_types",
+        "Attachment URLs": "attachment_urls",
+        "Comment": "comment",
+        "Attachment Text": "attachment_text",
+        "Attachment Analysis": "attachment_analysis",
+        "Bot_Likelihood_Score": "bot_score",
+        "Sentiment": "sentiment",
+        "Score Source": "score_source",
+        "Cluster ID": "cluster_id",
+        "Cluster Size": "cluster_size",
+        "Posting Burst": "posting_burst",
+    }
+    CODECS = {"Sentiment": (encode_sentiment, decode_sentiment)}
+    __slots__ = _slots(FIELDS)
+
+    def sentiment_mask(self):
+        """The encoded moderation categories; 0 when there are none."""
+        return getattr(self, "sentiment", None) or 0
+
+
+class Document(Record):
+    FIELDS = {
+        "Proposed Rule Title": "title",
+        "Posted By": "posted_by",
+        "Posted Date": "posted_date",
+        "Document ID": "document_id",
+        "Document Path": "path",
+        "Document": "document",
+        "Comments": "comments",
+        "Analysis": "analysis",
+    }
+    __slots__ = _slots(FIELDS)
+
+
+class Docket(Record):
+    FIELDS = {
+        "Title": "title",
+        "Docket ID": "docket_id",
+        "Agency": "agency",
+        "Summary": "summary",
+        "Docket Type": "docket_type",
+        "Number of Comments": "number_of_comments",
+        "Agenda": "agenda",
+        "Documents": "documents",
+        "Analysis": "analysis",
+        "Timeline": "timeline",
+    }
+    __slots__ = _slots(FIELDS)
+
+
+def from_json(data):
+    """
+    json.load object_hook: dockets, documents and comments become records as they
+    are parsed, so a docket's comments never exist as dicts all at once.
+    """
+    if "Comment" in data and "Attachments" in data:
+        return Comment(data)
+    if "Documents" in data:
+        return Docket(data)
+    # Timelines written before 'Comment Count' counted their bursts and clusters in 'Comments'
+    if "Document ID" in data or isinstance(data.get("Comments"), list):
+        return Document(data)
+    return data
+
+
+def to_json(value):
+    """json.dump default: records are written as the dicts they replace."""
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class RecordView(Sequence):
+    """
+    The records of `records` at `indices`, such as the comments of a docket that
+    have attachments, without copying them into another list.
+    """
+
+    __slots__ = ("records", "indices")
+
+    def __init__(self, records, indices):
+        self.records = records
+        self.indices = indices if isinstance(indices, array) else array("L", indices)
+
+    @classmethod
+    def where(cls, records, predicate):
+        return cls(records, (i for i, record in enumerate(records) if predicate(record)))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return RecordView(self.records, self.indices[i])
+        return self.records[self.indices[i]]
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __iter__(self):
+        records = self.records
+        for i in self.indices:
+            yield records[i]
+
+
+def partition(records, predicate):
+    """Views of the records that match `predicate` and of those that do not."""
+    matching = array("L")
+    other = array("L")
+    for i, record in enumerate(records):
+        (matching if predicate(record) else other).append(i)
+    return RecordView(records, matching), RecordView(records, other)
@@ -0,0 +1,235 @@
+import asyncio
+import random
+import threading
+import time
+from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+from llm_cache import MISSING, normalize_text
+from metrics import METRICS
+from prompts import (BOT_LIKELIHOOD_TEMPLATE, CHAT_MODEL, MERGE_SUMMARY_TEMPLATE, MODERATION_MODEL,
+                     MODERATION_TEMPLATE, SUMMARY_TEMPLATE, bot_likelihood_messages, estimate_tokens,
+                     merge_summary_messages, parse_bot_score, scoring_text, summary_messages)
+from summarizer import summarize_chunked
+
+
+class AsyncRateLimiter:
+    """Per-minute budget of requests or tokens, refilled continuously."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.rate = per_minute / 60
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                await asyncio.sleep((amount - self.level) / self.rate)
+
+
+class CommentScorer:
+    """
+    Scores comments for bot likelihood and moderation categories with overlapping
+    API calls. At most `concurrency` requests are in flight, requests and tokens are
+    held to per-minute budgets, and 429/5xx/connection errors are retried with
+    jittered exponential backoff. Moderation is sent in batches, since that
+    endpoint accepts a list of inputs. Identical texts are scored once, and
+    results already in `cache` are not requested at all.
+    """
+
+    RETRYABLE_ERRORS = (RateLimitError, InternalServerError, APIConnectionError)
+
+    def __init__(self, client, concurrency=8, requests_per_minute=3500, tokens_per_minute=90000,
+                 max_retries=6, moderation_batch_size=32, backoff_base=1.0, backoff_cap=60.0, cache=None):
+        self.client = client
+        self.cache = cache
+        self.max_retries = max_retries
+        self.moderation_batch_size = moderation_batch_size
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._requests = AsyncRateLimiter(requests_per_minute)
+        self._tokens = AsyncRateLimiter(tokens_per_minute)
+
+    def _retry_delay(self, error, attempt):
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def _call(self, make_request, tokens, endpoint="chat"):
+        for attempt in range(self.max_retries + 1):
+            await self._requests.acquire()
+            await self._tokens.acquire(tokens)
+            async with self._semaphore:
+                try:
+                    with METRICS.timer("api_call_seconds", endpoint=endpoint):
+                        return await make_request()
+                except self.RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        METRICS.count("failures_total", stage="api", endpoint=endpoint)
+                        raise
+                    delay = self._retry_delay(e, attempt)
+                    METRICS.count("retries_total", stage="api", endpoint=endpoint)
+                    print(f"Retrying OpenAI request in {delay:.1f}s: {e}")
+                except Exception:
+                    METRICS.count("failures_total", stage="api", endpoint=endpoint)
+                    raise
+            await asyncio.sleep(delay)
+
+    async def bot_likelihood(self, comment):
+        """
+        Score a comment's likelihood of being bot-generated, from 0 (human-like) to 5
+        (bot-like); 2.5 when the call fails.
+        """
+        if self.cache is not None:
+            key = self.cache.key(CHAT_MODEL, BOT_LIKELIHOOD_TEMPLATE, comment)
+            bot_score = self.cache.get(key)
+            if bot_score is not MISSING:
+                return bot_score
+        try:
+            response = await self._call(
+                lambda: self.client.chat.completions.create(model=CHAT_MODEL,
+                                                            messages=bot_likelihood_messages(comment)),
+                estimate_tokens(comment) + 100)
+            bot_score = parse_bot_score(response.choices[0].message.content)
+            if self.cache is not None:
+                self.cache.set(key, bot_score)
+            return bot_score
+        except Exception as e:
+            print(f"Error analyzing comment: {e}")
+            return 2.5  # Default middle score
+
+    async def _complete(self, messages, template, text):
+        """Cached chat completion of `text` in a prompt template, or "" if the call fails."""
+        if self.cache is not None:
+            key = self.cache.key(CHAT_MODEL, template, text)
+            content = self.cache.get(key)
+            if content is not MISSING:
+                return content
+        try:
+            response = await self._call(
+                lambda: self.client.chat.completions.create(model=CHAT_MODEL, messages=messages),
+                estimate_tokens(text) + 500)
+            content = response.choices[0].message.content.strip()
+            if self.cache is not None:
+                self.cache.set(key, content)
+            return content
+        except Exception as e:
+            print(f"Error analyzing content: {e}")
+            return ""
+
+    async def summarize(self, content):
+        """Same summary as analysis.summarize_content, without blocking."""
+        return await self._complete(summary_messages(content), SUMMARY_TEMPLATE, content)
+
+    async def merge_summaries(self, summaries):
+        text = "\n\n".join(f"PART {i}:\n{summary}" for i, summary in enumerate(summaries, 1))
+        return await self._complete(merge_summary_messages(text), MERGE_SUMMARY_TEMPLATE, text)
+
+    async def moderate(self, comments):
+        """Moderation categories for a batch of comments, or None for each if the call fails."""
+        try:
+            response = await self._call(
+                lambda: self.client.moderations.create(model=MODERATION_MODEL, input=comments),
+                sum(estimate_tokens(comment) for comment in comments), endpoint="moderations")
+            return [result.categories.__dict__ for result in response.results]
+        except Exception as e:
+            print(f"Error analyzing comment: {e}")
+            return [None] * len(comments)
+
+    async def moderations(self, comments):
+        """Moderation categories for any number of comments, batching the ones not in the cache."""
+        keys = [self.cache.key(MODERATION_MODEL, MODERATION_TEMPLATE, comment) if self.cache is not None else None
+                for comment in comments]
+        results = [self.cache.get(key) if self.cache is not None else MISSING for key in keys]
+        misses = [i for i, result in enumerate(results) if result is MISSING]
+        batches = [misses[i:i + self.moderation_batch_size]
+                   for i in range(0, len(misses), self.moderation_batch_size)]
+
+        moderated = await asyncio.gather(*(self.moderate([comments[i] for i in batch]) for batch in batches))
+        for batch, categories_list in zip(batches, moderated):
+            for i, categories in zip(batch, categories_list):
+                results[i] = categories
+                if self.cache is not None and categories is not None:
+                    self.cache.set(keys[i], categories)
+        return results
+
+    async def score(self, comments, bot_likelihood=True):
+        """
+        Score, in place, every comment with text to score (prompts.scoring_text) that has
+        no score yet. With `bot_likelihood=False` only the missing moderation categories are requested.
+        """
+        field = "Bot_Likelihood_Score" if bot_likelihood else "Sentiment"
+        pending = [comment for comment in comments if field not in comment and scoring_text(comment)]
+        # Identical texts, such as form letters, are sent once
+        representatives = {}
+        for comment in pending:
+            text = scoring_text(comment)
+            representatives.setdefault(normalize_text(text), text)
+        texts = list(representatives.values())
+
+        bot_texts = texts if bot_likelihood else []
+        scores, sentiments = await asyncio.gather(
+            asyncio.gather(*(self.bot_likelihood(text) for text in bot_texts)),
+            self.moderations(texts))
+
+        results = dict(zip(representatives, sentiments))
+        bot_scores = dict(zip(representatives, scores))
+        for comment in pending:
+            key = normalize_text(scoring_text(comment))
+            if bot_likelihood:
+                comment['Bot_Likelihood_Score'] = bot_scores[key]
+            sentiment = results[key]
+            comment['Sentiment'] = dict(sentiment) if sentiment else None
+        print(f"Scored {len(pending)} comments ({len(texts)} distinct texts)")
+        return comments
+
+
+class ScoringEngine:
+    """
+    Blocking front end to CommentScorer that keeps one event loop and client
+    alive across calls, so callers can score comments batch by batch.
+    The loop runs on its own thread, so several threads can score and summarize
+    at once while sharing the concurrency and rate limits.
+    Pass `base_url` to run against a local mock of the OpenAI endpoints.
+    """
+
+    def __init__(self, api_key, base_url=None, **options):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.scorer = CommentScorer(self.client, **options)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def score(self, comments, bot_likelihood=True):
+        return self._run(self.scorer.score(comments, bot_likelihood))
+
+    def summarize(self, content, chunk_tokens=3000):
+        """Summary of a document of any length; see summarizer.summarize_chunked."""
+        return self._run(summarize_chunked(self.scorer, content, chunk_tokens))
+
+    def summarize_all(self, contents, chunk_tokens=3000):
+        """Summaries of several documents, requested concurrently."""
+        async def summarize_all():
+            return await asyncio.gather(*(summarize_chunked(self.scorer, content, chunk_tokens)
+                                          for content in contents))
+        return self._run(summarize_all())
+
+    def close(self):
+        self._run(self.client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
@@ -1,238 +1,293 @@
-import time
 import json
-import random
-import re
-import html
-from urllib.parse import urlparse
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.wait import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from utils import download_pdf
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from queue import Queue
+from backends import create_backend, record_id, request_rates
+from downloads import DownloadManager
+from journal import ScrapeJournal
+from metrics import METRICS
+from ratelimit import RateLimiter, retry_after
+from utils import iter_ndjson, records_to_docket, write_ndjson
 
 
 class DocketScraper:
-    def __init__(self, url):
+    # Comments listed ahead of the one being written out
+    MAX_PENDING = 1000
+
+    def __init__(self, url, backend="selenium", workers=1, requests_per_second=None, max_retries=3,
+                 journal_file=None, previous_file=None, download_workers=4, comment_backends=None, downloads=None,
+                 rate_limiter=None, max_requests_per_second=None, **backend_options):
+        """
+        `backend` selects how pages are read: 'selenium', 'http' or 'auto'
+        (HTTP with Selenium fallback); `backend_options` are passed to it.
+        `workers` backends fetch comment pages concurrently, sharing a global
+        `requests_per_second` budget that climbs towards `max_requests_per_second`
+        while pages load quickly and backs off when fetches fail, are throttled or slow;
+        budgets not given are the backend's (backends.REQUEST_RATES).
+        Finished work is appended to `journal_file` so an interrupted run resumes where it stopped.
+        With `previous_file`, only comments that are new or changed since that output are fetched.
+        Documents are downloaded by `download_workers` threads while the comments are scraped.
+
+        To share resources between scrapers, pass a backend instance as `backend`,
+        a list to keep the comment worker backends in as `comment_backends`, a
+        DownloadManager as `downloads` and a RateLimiter as `rate_limiter`.
+        Shared resources are left open when the scraper finishes.
+        """
         self.url = url
-        self.driver = self._initialize_driver()
+        if rate_limiter is None:
+            rate, max_rate = request_rates(backend, requests_per_second, max_requests_per_second)
+            rate_limiter = RateLimiter(rate, max_rate=max_rate)
+        self.rate_limiter = rate_limiter
+        self._owns_backend = isinstance(backend, str)
+        self.backend = (create_backend(backend, rate_limiter=self.rate_limiter, **backend_options)
+                        if self._owns_backend else backend)
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self._owns_comment_backends = comment_backends is None
+        self._comment_backends = [] if comment_backends is None else comment_backends
+        self.journal = ScrapeJournal(journal_file) if journal_file else None
+        self._owns_downloads = downloads is None
+        self.downloads = DownloadManager(workers=download_workers) if downloads is None else downloads
         self.docket_data = {}
         self.documents_data = []
+        self.failures = 0
+        self.on_download = None
+        self.previous_documents = self._load_previous(previous_file) if previous_file else {}
 
     @staticmethod
-    def _initialize_driver():
-        """Initialize the Chrome WebDriver with custom settings."""
-        user_agents = [
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.93 Safari/536.36",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/536.36",
-            "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:89.0) Gecko/20100101 Firefox/90.0"
-        ]
-        chrome_options = Options()
-        chrome_options.add_argument(f'user-agent={random.choice(user_agents)}')
-        return webdriver.Chrome(options=chrome_options)
-
-    def _wait_for_element(self, by, value, timeout=30):
-        """Wait for an element to be present on the page."""
-        return WebDriverWait(self.driver, timeout).until(EC.presence_of_element_located((by, value)))
-
-    def _extract_agency(self):
+    def _load_previous(previous_file):
+        """Index the documents of an earlier scrape by Document ID."""
         try:
-            agenda_tab = self.driver.find_element(By.XPATH, "//a[contains(text(), 'Unified Agenda')]")
-            agenda_tab.click()
-            self._wait_for_element(By.CSS_SELECTOR, 'div.ua-abstract', 3000)
-            agenda_text = self._safe_find_element(By.XPATH, '//div[contains(@class, "ua-abstract")]//p')
-            self.docket_data['Agenda'] = agenda_text
-
-        except Exception as e:
-            print(f"Error navigating to Docket Agenda tab: {e}")
-        time.sleep(10)
+            if previous_file.endswith(".ndjson"):
+                previous = records_to_docket(iter_ndjson(previous_file))
+            else:
+                with open(previous_file, "r", encoding="utf-8") as json_file:
+                    previous = json.load(json_file)
+        except FileNotFoundError:
+            return {}
+        return {doc["Document ID"]: doc for doc in previous.get("Documents", []) if doc.get("Document ID")}
 
     def extract_docket_details(self):
         """Extract basic docket details."""
+        if self.journal and self.journal.docket is not None:
+            self.docket_data = self.journal.docket
+            return
         try:
-            self._wait_for_element(By.XPATH, '//main[@class="main-content"]', 30000)
-            self.docket_data['Title'] = self._safe_find_element(By.XPATH, '//h1[@class="h3 mt-0 mb-1 font-weight-bold js-title"]')
-            self.docket_data['Docket ID'] = self._safe_find_element(By.XPATH, '//label[contains(text(), "Docket ID")]/following-sibling::p')
-            self.docket_data['Agency'] = self._safe_find_element(By.XPATH, "//div[@class='col-md-12 mt-2 mb-4']//p[@class='lead text-muted mb-3 js-created-text']//strong")
-            self.docket_data['Summary'] = self._safe_find_element(By.XPATH, "//div[@class='px-2']//div[@class='PREAMB']//p")
-            self.docket_data['Docket Type'] = self._safe_find_element(By.XPATH, "//span[@class='text-uppercase text-muted d-inline-block ml-xs mb-0 align-bottom small font-weight-bold js-doctype']")
-            self._wait_for_element(By.XPATH, "//a[contains(text(), 'All Comments on Docket')]", 30000)
-            self.docket_data['Number of Comments'] = self._safe_find_element(By.XPATH, "//p[@class='mb-0 js-comments-posted']")
+            with METRICS.timer("page_load_seconds", page="docket"):
+                self.docket_data = self.backend.extract_docket(self.url)
+            if self.journal:
+                self.journal.record_docket(self.docket_data)
         except Exception as e:
+            METRICS.count("failures_total", stage="docket")
             print(f"Error extracting docket details: {e}")
 
-        self._extract_agency()
-
-    def navigate_to_tab(self, tab_name):
-        """Navigate to a specific tab."""
-        try:
-            tab = self.driver.find_element(By.XPATH, f"//a[contains(text(), '{tab_name}')]")
-            tab.click()
-            time.sleep(5)
-        except Exception as e:
-            print(f"Error navigating to {tab_name} tab: {e}")
-
     def extract_documents(self):
-        """Extract document details from the 'Docket Documents' tab."""
+        """Extract every proposed rule document of the docket."""
         try:
-            document_cards = self.driver.find_elements(By.CSS_SELECTOR, "div.card.card-type-proposed-rule.ember-view")
-            document_links = [card.find_element(By.XPATH, ".//h3[@class='h4 card-title']//a[@class='ember-view']").get_attribute("href")
-                              for card in document_cards]
-            for link in document_links:
-                self.driver.get(link)
-                time.sleep(5)
-                self._extract_single_document()
+            with METRICS.timer("page_load_seconds", page="document_list"):
+                links = self.backend.document_links(self.url)
+            for started in self._start_documents(links):
+                self._extract_single_document(*started)
         except Exception as e:
+            self._failed("documents")
             print(f"Error extracting document information: {e}")
 
-    def _extract_comments(self):
-        current_document_url = self.driver.current_url
-        current_document_comments_url = current_document_url + "/comment"
-        page = 1
-        comment_list = []
-
-        while page <= 2:
-            if page > 1:
-                current_document_comments_url += f"?pageNumber={page}"
-            try:
-                self.driver.get(current_document_comments_url)
-                WebDriverWait(self.driver, 20).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, 'div.results-container'))
-                )
-            except:
-                break
+    def _failed(self, stage):
+        self.failures += 1
+        METRICS.count("failures_total", stage=stage)
 
-            comment_cards = self.driver.find_elements(By.XPATH, '//div[contains(@class, "card-type-comment")]')
+    def _comment_backend_pool(self):
+        """Hand out the worker backends, leaving the main backend free for the listing."""
+        while len(self._comment_backends) < self.workers:
+            self._comment_backends.append(self.backend.spawn())
+        backends = Queue()
+        for backend in self._comment_backends:
+            backends.put(backend)
+        return backends
 
-            for comment_card in comment_cards:
-                comment_url = comment_card.find_element(By.XPATH,
-                                                        ".//h3[contains(@class, 'card-title')]/a").get_attribute("href")
-                comment_list.append(comment_url)
+    def _iter_comments(self, link, previous_comments=()):
+        """
+        Walk the comment listing on a background thread and hand each URL to the
+        worker pool as soon as it is found. Comments are yielded in listing order
+        as they finish, with at most MAX_PENDING held in memory.
+        Comments already in `previous_comments` and not modified since are kept as they are.
+        """
+        backends = self._comment_backend_pool()
+        known = {comment["Comment ID"]: comment for comment in previous_comments if comment.get("Comment ID")}
+        pending = Queue(maxsize=self.MAX_PENDING)
+        listing_errors = []
+        totals = []
 
-            time.sleep(10)
-            page += 1
-
-        comments = []
-        print("Total Comments: ", len(comment_list))
-        com_count = 1
-        for comment_url in comment_list:
-            print("Comment Number ", com_count)
-            com_count += 1
-            time.sleep(10)
+        def fetch(comment_url):
+            if self.journal and comment_url in self.journal.comments:
+                METRICS.count("comments_total", source="journal")
+                return self.journal.comments[comment_url]
+            backend = backends.get()
             try:
-                self.driver.get(comment_url)
-                WebDriverWait(self.driver, 20).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, 'main.main-content'))
-                )
-                comment_content = self.driver.find_element(By.XPATH,
-                                                      '//h2[contains(@class, "section-heading")]/following-sibling::div[1]').text
-                commenter_info = dict()
-                try:
-                    commenter_info_tab = self.driver.find_element(By.XPATH, '//div[@id="tab-submitter-info"]/ul')
-                    commenter_info_list = commenter_info_tab.find_elements(By.TAG_NAME, "li")
-
-                    for info in commenter_info_list:
-                        key = info.find_element(By.TAG_NAME, "label").get_attribute("innerHTML").strip().split('\n')[0]
-                        value = info.find_element(By.TAG_NAME, "p").get_attribute("innerHTML").strip()
-                        commenter_info[key] = value
-                except:
-                    pass
-                attachments = 0
-                attachment_types = []
-                try:
-                    attachments = self.driver.find_element(By.XPATH, '//span[contains(@class, "badge-pill")]').text
-                    attachment_urls = self.driver.find_elements(By.XPATH, '//a[contains(@class, "btn-block")]')
-                    for attachment_url in attachment_urls:
-                        att_url = attachment_url.get_attribute("href")
-                        file_type = urlparse(att_url).path.split('.')[-1]
-                        attachment_types.append(file_type)
-                except:
-                    pass
+                commenter_info = self._fetch_comment(backend, comment_url)
+                if commenter_info is not None:
+                    METRICS.count("comments_total", source="scraped")
+                    commenter_info["Comment ID"] = record_id(comment_url)
+                    if self.journal:
+                        self.journal.record_comment(comment_url, commenter_info)
+                return commenter_info
+            finally:
+                backends.put(backend)
 
-                try:
-                    posted_on = self.driver.find_element(By.XPATH,
-                                                    '//div[@class="col-md-12 mt-2 mb-4"]//p[@class="lead text-muted mb-3 js-posted-text"]'
-                                ).text.split("on")[-1].lstrip()
-                    commenter_info["Posted On"] = posted_on
-                except:
-                    pass
-
-                commenter_info["Attachments"] = int(attachments)
-                commenter_info["Attachment Types"] = attachment_types
+        def list_comments(executor):
+            try:
+                com_count = fetched = 0
+                for com_count, (comment_url, last_modified) in enumerate(self._comment_urls(link), start=1):
+                    previous = known.pop(record_id(comment_url), None)
+                    if previous is not None and previous.get("Last Modified") == last_modified:
+                        METRICS.count("comments_total", source="previous")
+                        pending.put((com_count, previous))
+                        continue
+                    pending.put((com_count, executor.submit(fetch, comment_url)))
+                    fetched += 1
+                totals.append((com_count, fetched))
+            except Exception as e:
+                listing_errors.append(e)
+            finally:
+                pending.put(None)
 
-                cleaned_comment = html.unescape(comment_content)
-                cleaned_comment = re.sub(r"\s+", " ", cleaned_comment).strip()
-                cleaned_comment = re.sub(r"•", "-", cleaned_comment)
-                commenter_info["Comment"] = cleaned_comment
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            lister = threading.Thread(target=list_comments, args=(executor,), daemon=True)
+            lister.start()
+            # Progress is printed here rather than from the pool threads, whose lines would interleave
+            while (item := pending.get()) is not None:
+                com_count, comment = item
+                if isinstance(comment, Future):
+                    comment = comment.result()
+                    print(f"Comment Number {com_count}", flush=True)
+                if comment is not None:
+                    yield comment
+            lister.join()
+        for com_count, fetched in totals:
+            print(f"Total Comments: {com_count} New or changed: {fetched}", flush=True)
+        if listing_errors:
+            raise listing_errors[0]
 
-                comments.append(commenter_info)
-            except:
-                continue
+        # Comments that dropped out of the listing are kept from the previous run
+        yield from known.values()
 
-        return comments
+    def _comment_urls(self, link):
+        """
+        Yield the listing of a document, replaying it from the journal when it was already walked.
+        Only complete listings are journaled: when the backend fails part-way, the error
+        propagates before record_listing, and the next run walks the listing again.
+        """
+        if self.journal and link in self.journal.listings:
+            yield from self.journal.listings[link]
+            return
+        comment_list = []
+        for listed in self.backend.comment_urls(link):
+            comment_list.append(listed)
+            yield listed
+        if self.journal:
+            self.journal.record_listing(link, comment_list)
 
-    def _extract_single_document(self):
-        """Extract details of a single document."""
-        doc = {}
-        try:
-            self._wait_for_element(By.XPATH, '//h1[@class="h3 mt-0 mb-1 font-weight-bold js-title"]')
-            try:
-                doc['Proposed Rule Title'] = self._wait_for_element(By.XPATH, '//h1[@class="h3 mt-0 mb-1 font-weight-bold js-title"]').text
-            except:
-                pass
-            try:
-                doc['Posted By'] = self._safe_find_element(By.XPATH, '//div[@class="col-md-12 mt-2 mb-4"]//p[@class="lead text-muted mb-3 js-posted-text"]//strong')
-            except:
-                pass
-            try:
-                doc['Posted Date'] = self._safe_find_element(By.XPATH, '//div[@class="col-md-12 mt-2 mb-4"]//p[@class="lead text-muted mb-3 js-posted-text"]').split("on")[-1].lstrip()
-            except:
-                pass
+    def _fetch_comment(self, backend, comment_url):
+        """Fetch a single comment, backing off and retrying while the site pushes back."""
+        for attempt in range(self.max_retries):
+            self.rate_limiter.acquire()
+            started = time.monotonic()
             try:
-                doc['Document ID'] = self._safe_find_element(By.XPATH, '//div[@class="card-block py-0 pl-2 small text-muted"]//p[@class="mb-0"]')
-            except:
-                pass
-            try:
-                doc['Comments Received'] = self._safe_find_element(By.XPATH, '//div[@class="card-block py-0 pl-2 small text-muted"]//p[@class="mb-0 js-comments-received"]')
-            except:
-                pass
+                with METRICS.timer("page_load_seconds", page="comment"):
+                    commenter_info = backend.extract_comment(comment_url)
+                self.rate_limiter.success(time.monotonic() - started)
+                return commenter_info
+            except Exception as e:
+                print(f"Error extracting comment {comment_url} (attempt {attempt + 1}): {e}")
+                METRICS.count("retries_total", stage="comment")
+                self.rate_limiter.backoff(retry_after(e))
+        self._failed("comment")
+        return None
 
-            extracted_data = {}
+    def _document_details(self, link, previous):
+        """
+        Extract a document's details and start downloading its content, unless a
+        journal or previous run has them. Returns the details and the download
+        Future, which is None when there is nothing to download.
+        """
+        if self.journal and link in self.journal.documents:
+            return dict(self.journal.documents[link]), None
+        if previous.get("Document Path"):
+            return {key: value for key, value in previous.items() if key != "Comments"}, None
+        with METRICS.timer("page_load_seconds", page="document"):
+            doc, document_url = self.backend.extract_document(link)
+        doc["Document Path"] = None
+        download = self.downloads.submit(document_url) if document_url else None
+        if download is not None and self.on_download is not None:
+            download.add_done_callback(
+                lambda future: self.on_download({**doc, "Document Path": future.result()}))
+        return doc, download
 
-            try:
-                # Get document content
-                class_list = ["AGY", "ACT", "SUM", "ADD", "FURINF", "SUPLINF"]
-                content_element = self.driver.find_element(By.XPATH,
-                                                      '//main[@class="main-content"]//div[@class="row mb-6"]//div[@class="col-md-12"]//div[@class="px-2"]')
-                for class_name in class_list:
-                    item = content_element.find_element(By.XPATH, f".//div[@class='{class_name}']")
-                    heading = item.find_element(By.TAG_NAME, "h2").text.strip()
-                    content = ""
-                    content_section = item.find_elements(By.TAG_NAME, "p")
-                    for item_content in content_section:
-                        content += item_content.text.strip()
-                    if heading:
-                        extracted_data[heading] = content
+    def _finish_document(self, link, doc, download):
+        """
+        Wait for the document's download and journal the finished details. A failed
+        download counts as a failure and is not journaled, so a rerun tries it again.
+        """
+        if download is not None:
+            doc["Document Path"] = download.result()
+            if doc["Document Path"] is None:
+                self._failed("download")
+            elif self.journal:
+                self.journal.record_document(link, doc)
+        return doc
 
-                doc["Document"] = {**extracted_data}
-            except:
-                pass
+    def _start_documents(self, links):
+        """Extract the details of every document first, so all of their downloads run in parallel."""
+        started = []
+        for link in links:
+            try:
+                previous = self.previous_documents.get(record_id(link), {})
+                started.append((link, previous, *self._document_details(link, previous)))
+            except Exception as e:
+                self._failed("document")
+                print(f"Error extracting single document: {e}")
+        return started
 
-            document_url = self.driver.find_element(By.XPATH, "//ul[@class='dropdown-menu']/li[2]/a").get_attribute("href")
-            file_name = download_pdf(document_url)
-            doc["Document Path"] = file_name
-            comments = self._extract_comments()
+    def _extract_single_document(self, link, previous, doc, download):
+        """Extract the comments of a single document and wait for its download."""
+        try:
+            comments = list(self._iter_comments(link, previous.get("Comments", [])))
+            doc = self._finish_document(link, doc, download)
             doc["Comments"] = comments
             self.documents_data.append(doc)
         except Exception as e:
+            self._failed("document")
             print(f"Error extracting single document: {e}")
 
-    def _safe_find_element(self, by, value):
-        """Safely find an element and return its text or None."""
+    def iter_records(self):
+        """
+        Scrape the documents, yielding the docket header, each document and each of
+        its comments as soon as they are ready, in the layout of utils.docket_to_records.
+        """
+        yield {"type": "docket", "data": self.docket_data}
         try:
-            return self.driver.find_element(by, value).text
-        except:
-            return None
+            with METRICS.timer("page_load_seconds", page="document_list"):
+                links = self.backend.document_links(self.url)
+        except Exception as e:
+            self._failed("documents")
+            print(f"Error extracting document information: {e}")
+            return
+        for link, previous, doc, download in self._start_documents(links):
+            try:
+                doc = self._finish_document(link, doc, download)
+                yield {"type": "document", "data": doc}
+                for comment in self._iter_comments(link, previous.get("Comments", [])):
+                    yield {"type": "comment", "document": doc.get("Document ID"), "data": comment}
+            except Exception as e:
+                self._failed("document")
+                print(f"Error extracting single document: {e}")
+
+    @staticmethod
+    def _tee(records, on_record):
+        for record in records:
+            on_record(record)
+            yield record
 
     def save_data(self, file_name="docket.json"):
         """Save extracted data to a JSON file."""
@@ -240,18 +295,55 @@ class DocketScraper:
             with open(file_name, "w", encoding="utf-8") as json_file:
                 data = {**self.docket_data, "Documents": self.documents_data}
                 json.dump(data, json_file, indent=4, ensure_ascii=False)
+            return True
+        except Exception as e:
+            print(f"Error saving data: {e}")
+        return False
+
+    def stream_data(self, file_name="docket.ndjson", records=None):
+        """Scrape and write each record to an NDJSON file as soon as it is ready."""
+        try:
+            write_ndjson(file_name, self.iter_records() if records is None else records)
+            return True
         except Exception as e:
             print(f"Error saving data: {e}")
+        return False
 
-    def run(self, output_file):
-        """Main execution workflow."""
+    @METRICS.timed("scrape")
+    def run(self, output_file, on_record=None, on_download=None):
+        """
+        Main execution workflow. An output file ending in .ndjson is written as a stream.
+        For pipelining, `on_record` is called with every record as soon as it is
+        scraped, and `on_download` with a document's details as soon as its
+        download finishes.
+        """
+        self.on_download = on_download
         try:
-            self.driver.get(self.url)
-            time.sleep(5)
             self.extract_docket_details()
-            self.navigate_to_tab("Docket Documents")
-            self.extract_documents()
-            self.save_data(output_file)
+            if on_record is not None:
+                records = self._tee(self.iter_records(), on_record)
+                if output_file.endswith(".ndjson"):
+                    saved = self.stream_data(output_file, records)
+                else:
+                    self.documents_data = records_to_docket(records)["Documents"]
+                    saved = self.save_data(output_file)
+            elif output_file.endswith(".ndjson"):
+                saved = self.stream_data(output_file)
+            else:
+                self.extract_documents()
+                saved = self.save_data(output_file)
+            # Keep the journal while anything is missing so a rerun can pick it up
+            if saved and self.journal and not self.failures:
+                self.journal.discard()
         finally:
-            self.driver.quit()
+            if self.journal:
+                self.journal.close()
+            if self._owns_downloads:
+                self.downloads.close()
+            if self._owns_backend:
+                self.backend.close()
+            if self._owns_comment_backends:
+                for backend in self._comment_backends:
+                    backend.close()
         print("Docket Data Scrape Completed")
+        return saved
@@ -0,0 +1,267 @@
+import random
+import time
+from urllib.parse import urlparse
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.wait import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+from backends import clean_comment
+from metrics import METRICS
+
+
+class SeleniumBackend:
+    """
+    Reads regulations.gov by rendering its pages in Chrome. Instead of sleeping a
+    fixed time, every step waits for the element it needs, for at most `timeout`
+    seconds. Listing pages are paced by `rate_limiter` when one is given and
+    loaded up to `max_retries` times before the listing fails.
+    """
+
+    # A page past the end of a listing renders no comment cards, so it is not waited on for long
+    EMPTY_LISTING_TIMEOUT = 10
+
+    def __init__(self, rate_limiter=None, timeout=30, max_retries=3):
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.driver = self._initialize_driver()
+
+    @staticmethod
+    def _initialize_driver():
+        """Initialize the Chrome WebDriver with custom settings."""
+        user_agents = [
+            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.93 Safari/536.36",
+            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/536.36",
+            "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:89.0) Gecko/20100101 Firefox/90.0"
+        ]
+        chrome_options = Options()
+        chrome_options.add_argument(f'user-agent={random.choice(user_agents)}')
+        return webdriver.Chrome(options=chrome_options)
+
+    def spawn(self):
+        """Create another backend for a worker thread."""
+        return SeleniumBackend(self.rate_limiter, self.timeout, self.max_retries)
+
+    def close(self):
+        self.driver.quit()
+
+    def _wait_for_element(self, by, value, timeout=None):
+        """Wait for an element to be present on the page."""
+        try:
+            return WebDriverWait(self.driver, timeout or self.timeout, poll_frequency=0.2).until(
+                EC.presence_of_element_located((by, value)))
+        except TimeoutException:
+            METRICS.count("wait_timeouts_total", backend="selenium")
+            raise
+
+    def _safe_find_element(self, by, value):
+        """Safely find an element and return its text or None."""
+        try:
+            return self.driver.find_element(by, value).text
+        except:
+            return None
+
+    def _extract_agency(self, docket_data):
+        try:
+            agenda_tab = self.driver.find_element(By.XPATH, "//a[contains(text(), 'Unified Agenda')]")
+            agenda_tab.click()
+            self._wait_for_element(By.CSS_SELECTOR, 'div.ua-abstract')
+            agenda_text = self._safe_find_element(By.XPATH, '//div[contains(@class, "ua-abstract")]//p')
+            docket_data['Agenda'] = agenda_text
+
+        except Exception as e:
+            print(f"Error navigating to Docket Agenda tab: {e}")
+
+    def extract_docket(self, url):
+        """Extract basic docket details."""
+        docket_data = {}
+        self.driver.get(url)
+        try:
+            self._wait_for_element(By.XPATH, '//main[@class="main-content"]')
+            docket_data['Title'] = self._safe_find_element(By.XPATH, '//h1[@class="h3 mt-0 mb-1 font-weight-bold js-title"]')
+            docket_data['Docket ID'] = self._safe_find_element(By.XPATH, '//label[contains(text(), "Docket ID")]/following-sibling::p')
+            docket_data['Agency'] = self._safe_find_element(By.XPATH, "//div[@class='col-md-12 mt-2 mb-4']//p[@class='lead text-muted mb-3 js-created-text']//strong")
+            docket_data['Summary'] = self._safe_find_element(By.XPATH, "//div[@class='px-2']//div[@class='PREAMB']//p")
+            docket_data['Docket Type'] = self._safe_find_element(By.XPATH, "//span[@class='text-uppercase text-muted d-inline-block ml-xs mb-0 align-bottom small font-weight-bold js-doctype']")
+            self._wait_for_element(By.XPATH, "//a[contains(text(), 'All Comments on Docket')]")
+            docket_data['Number of Comments'] = self._safe_find_element(By.XPATH, "//p[@class='mb-0 js-comments-posted']")
+        except Exception as e:
+            print(f"Error extracting docket details: {e}")
+
+        self._extract_agency(docket_data)
+        return docket_data
+
+    def navigate_to_tab(self, tab_name, ready=None):
+        """Navigate to a specific tab and wait for the `ready` (by, value) element of its content."""
+        try:
+            tab = self._wait_for_element(By.XPATH, f"//a[contains(text(), '{tab_name}')]")
+            tab.click()
+            if ready is not None:
+                self._wait_for_element(*ready)
+        except Exception as e:
+            print(f"Error navigating to {tab_name} tab: {e}")
+
+    def document_links(self, url):
+        """Collect the proposed rule links from the 'Docket Documents' tab."""
+        if self.driver.current_url != url:
+            self.driver.get(url)
+        self.navigate_to_tab("Docket Documents", (By.CSS_SELECTOR, "div.card.ember-view"))
+        document_cards = self.driver.find_elements(By.CSS_SELECTOR, "div.card.card-type-proposed-rule.ember-view")
+        return [card.find_element(By.XPATH, ".//h3[@class='h4 card-title']//a[@class='ember-view']").get_attribute("href")
+                for card in document_cards]
+
+    def extract_document(self, link):
+        """Extract details of a single document and the URL of its downloadable content."""
+        self.driver.get(link)
+        doc = {}
+        self._wait_for_element(By.XPATH, '//h1[@class="h3 mt-0 mb-1 font-weight-bold js-title"]')
+        try:
+            doc['Proposed Rule Title'] = self._wait_for_element(By.XPATH, '//h1[@class="h3 mt-0 mb-1 font-weight-bold js-title"]').text
+        except:
+            pass
+        try:
+            doc['Posted By'] = self._safe_find_element(By.XPATH, '//div[@class="col-md-12 mt-2 mb-4"]//p[@class="lead text-muted mb-3 js-posted-text"]//strong')
+        except:
+            pass
+        try:
+            doc['Posted Date'] = self._safe_find_element(By.XPATH, '//div[@class="col-md-12 mt-2 mb-4"]//p[@class="lead text-muted mb-3 js-posted-text"]').split("on")[-1].lstrip()
+        except:
+            pass
+        try:
+            doc['Document ID'] = self._safe_find_element(By.XPATH, '//div[@class="card-block py-0 pl-2 small text-muted"]//p[@class="mb-0"]')
+        except:
+            pass
+        try:
+            doc['Comments Received'] = self._safe_find_element(By.XPATH, '//div[@class="card-block py-0 pl-2 small text-muted"]//p[@class="mb-0 js-comments-received"]')
+        except:
+            pass
+
+        extracted_data = {}
+
+        try:
+            # Get document content
+            class_list = ["AGY", "ACT", "SUM", "ADD", "FURINF", "SUPLINF"]
+            content_element = self.driver.find_element(By.XPATH,
+                                                  '//main[@class="main-content"]//div[@class="row mb-6"]//div[@class="col-md-12"]//div[@class="px-2"]')
+            for class_name in class_list:
+                item = content_element.find_element(By.XPATH, f".//div[@class='{class_name}']")
+                heading = item.find_element(By.TAG_NAME, "h2").text.strip()
+                content = ""
+                content_section = item.find_elements(By.TAG_NAME, "p")
+                for item_content in content_section:
+                    content += item_content.text.strip()
+                if heading:
+                    extracted_data[heading] = content
+
+            doc["Document"] = {**extracted_data}
+        except:
+            pass
+
+        document_url = self.driver.find_element(By.XPATH, "//ul[@class='dropdown-menu']/li[2]/a").get_attribute("href")
+        return doc, document_url
+
+    def _load_listing_page(self, url):
+        """
+        Load a comment listing page, backing off and retrying while it fails to load.
+        Raises the last error once `max_retries` loads failed.
+        """
+        for attempt in range(self.max_retries):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            started = time.monotonic()
+            try:
+                with METRICS.timer("page_load_seconds", backend="selenium", page="comment_listing"):
+                    self.driver.get(url)
+                    self._wait_for_element(By.CSS_SELECTOR, 'div.results-container')
+            except Exception as e:
+                print(f"Error loading comment listing {url} (attempt {attempt + 1}): {e}")
+                METRICS.count("retries_total", stage="listing")
+                if self.rate_limiter is not None:
+                    self.rate_limiter.backoff()
+                if attempt + 1 == self.max_retries:
+                    raise
+                continue
+            try:
+                self._wait_for_element(By.XPATH, '//div[contains(@class, "card-type-comment")]',
+                                       self.EMPTY_LISTING_TIMEOUT)
+            except TimeoutException:
+                pass
+            if self.rate_limiter is not None:
+                self.rate_limiter.success(time.monotonic() - started)
+            return
+
+    def comment_urls(self, link):
+        """
+        Yield (comment URL, last modified) for each comment listed for a document, page by
+        page until a page loads without new comments. A page that does not load fails
+        the listing rather than ending it. The website does not show modification dates.
+        """
+        seen = set()
+        page = 1
+
+        while True:
+            self._load_listing_page(f"{link}/comment?pageNumber={page}")
+
+            comment_cards = self.driver.find_elements(By.XPATH, '//div[contains(@class, "card-type-comment")]')
+            new_comments = 0
+
+            for comment_card in comment_cards:
+                comment_url = comment_card.find_element(By.XPATH,
+                                                        ".//h3[contains(@class, 'card-title')]/a").get_attribute("href")
+                if comment_url not in seen:
+                    seen.add(comment_url)
+                    new_comments += 1
+                    yield comment_url, None
+
+            # Past the last page the site shows an empty or repeated listing
+            if not new_comments:
+                return
+            page += 1
+
+    def extract_comment(self, comment_url):
+        """Extract the submitter info, attachments and text of a comment."""
+        self.driver.get(comment_url)
+        # The comment body is rendered after the page frame, so wait for the body itself
+        comment_content = self._wait_for_element(
+            By.XPATH, '//h2[contains(@class, "section-heading")]/following-sibling::div[1]').text
+        commenter_info = dict()
+        try:
+            commenter_info_tab = self.driver.find_element(By.XPATH, '//div[@id="tab-submitter-info"]/ul')
+            commenter_info_list = commenter_info_tab.find_elements(By.TAG_NAME, "li")
+
+            for info in commenter_info_list:
+                key = info.find_element(By.TAG_NAME, "label").get_attribute("innerHTML").strip().split('\n')[0]
+                value = info.find_element(By.TAG_NAME, "p").get_attribute("innerHTML").strip()
+                commenter_info[key] = value
+        except:
+            pass
+        attachments = 0
+        attachment_types = []
+        attachment_urls = []
+        try:
+            attachments = self.driver.find_element(By.XPATH, '//span[contains(@class, "badge-pill")]').text
+            attachment_links = self.driver.find_elements(By.XPATH, '//a[contains(@class, "btn-block")]')
+            for attachment_link in attachment_links:
+                att_url = attachment_link.get_attribute("href")
+                file_type = urlparse(att_url).path.split('.')[-1]
+                attachment_types.append(file_type)
+                attachment_urls.append(att_url)
+        except:
+            pass
+
+        try:
+            posted_on = self.driver.find_element(By.XPATH,
+                                                 '//div[@class="col-md-12 mt-2 mb-4"]//p[@class="lead text-muted mb-3 js-posted-text"]'
+                        ).text.split("on")[-1].lstrip()
+            commenter_info["Posted On"] = posted_on
+        except:
+            pass
+
+        commenter_info["Attachments"] = int(attachments)
+        commenter_info["Attachment Types"] = attachment_types
+        commenter_info["Attachment URLs"] = attachment_urls
+        commenter_info["Comment"] = clean_comment(comment_content)
+
+        return commenter_info
@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+
+# What each command of main.py imports before it starts working, and the heavy
+# modules it must not load. Each check runs in a fresh interpreter.
+CHECKS = {
+    "main --help": ("import main", ["selenium", "openai", "pandas", "matplotlib"]),
+    "scrape": ("import main, scrapper", ["openai", "pandas", "matplotlib"]),
+    "scrape --backend http": ("import main, backends\nbackends.HttpBackend().close()", ["selenium", "openai"]),
+    "analyze": ("import main, analysis", ["selenium", "matplotlib", "wordcloud"]),
+    "analyze --no-charts": (
+        "import main, analysis\n"
+        "comments = [{'Comment': 'A comment about apples', 'Attachments': 0, 'Posted On': 'Apr 4, 2022',"
+        " 'Bot_Likelihood_Score': 1.0}]\n"
+        "analysis.distribute_comments(analysis.comments_to_frame(comments), image_dir=None)",
+        ["selenium", "matplotlib", "wordcloud"]),
+    "charts": ("import main, analysis, charts", ["selenium"]),
+    "index": ("import main, comment_index", ["selenium", "openai", "pandas", "matplotlib"]),
+}
+
+# Run in the child: time the check's code and list the forbidden modules it loaded
+PROBE = """
+import contextlib, io, json, sys, time
+started = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    exec({code!r})
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {forbidden!r} if name in sys.modules]}}))
+"""
+
+
+def measure(code, forbidden, runs=5):
+    """Fastest of `runs` fresh imports of `code`, in seconds, and the forbidden modules it loaded."""
+    timings = []
+    loaded = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", PROBE.format(code=code, forbidden=forbidden)],
+                                capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        loaded = result["loaded"]
+    return min(timings), loaded
+
+
+def run_checks(runs=5):
+    results = {}
+    for name, (code, forbidden) in CHECKS.items():
+        seconds, loaded = measure(code, forbidden, runs)
+        results[name] = {"seconds": round(seconds, 4), "loaded": loaded}
+        print(f"{name:<24} {seconds:>8.3f}s" + (f"  loads {', '.join(loaded)}" if loaded else ""))
+    return results
+
+
+def compare(results, baseline, tolerance=0.25, slack=0.05):
+    """
+    Checks slower than the baseline by more than `tolerance`, and by more than
+    `slack` seconds so tiny imports do not trip on noise.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        change = result["seconds"] / previous["seconds"] - 1 if previous["seconds"] else 0
+        if change > tolerance and result["seconds"] - previous["seconds"] > slack:
+            regressions.append(name)
+            print(f"Regression: {name} takes {result['seconds']:.3f}s, was {previous['seconds']:.3f}s ({change:+.0%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the import time and heavy imports of each CLI command.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per check; the fastest counts")
+    parser.add_argument("--output", default="startup_results.json")
+    parser.add_argument("--baseline", default="startup_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    results = run_checks(args.runs)
+    with open(args.output, "w", encoding="utf-8") as json_file:
+        json.dump(results, json_file, indent=4)
+
+    failures = [name for name, result in results.items() if result["loaded"]]
+    for name in failures:
+        print(f"Heavy import: {name} loads {', '.join(results[name]['loaded'])}")
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as json_file:
+            failures += compare(results, json.load(json_file), args.tolerance)
+    sys.exit(1 if failures else 0)
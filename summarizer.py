@@ -0,0 +1,93 @@
+import asyncio
+import re
+import zlib
+from prompts import estimate_tokens
+
+
+def split_units(text, max_tokens):
+    """
+    Split text into paragraphs, and paragraphs longer than `max_tokens` into
+    sentences, so no unit is larger than a chunk.
+    """
+    units = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            units.append(paragraph)
+            continue
+        for sentence in re.split(r"(?<=[.!?;])\s+", paragraph):
+            # A run-on "sentence", such as a table flattened to text, is cut by length
+            step = max_tokens * 4
+            units.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+    return units
+
+
+def chunk_text(text, chunk_tokens=3000):
+    """
+    Split text into chunks of about `chunk_tokens`, cutting only between paragraphs
+    or sentences. Text that fits in twice that is one chunk, unchanged.
+
+    Past half the budget, whether to cut after a unit depends only on a hash of that
+    unit, so cut points follow the text rather than its offsets: an edit moves the
+    boundaries of its own chunk at most, and the other chunks stay identical.
+    """
+    max_tokens = chunk_tokens * 2
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    min_tokens = chunk_tokens // 2
+    chunks = []
+    current = []
+    size = 0
+    for unit in split_units(text, chunk_tokens):
+        tokens = estimate_tokens(unit)
+        if current and size + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(unit)
+        size += tokens
+        # Cut with probability proportional to the unit's size, which puts cuts about
+        # chunk_tokens - min_tokens past the minimum on average
+        cut_probability = tokens / (chunk_tokens - min_tokens)
+        if size >= min_tokens and zlib.crc32(unit.encode("utf-8")) / 2 ** 32 < cut_probability:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+async def summarize_chunked(scorer, text, chunk_tokens=3000):
+    """
+    Map-reduce summary of a document on a CommentScorer: chunks are summarized
+    concurrently, then the partial summaries are merged, in rounds if they do not
+    fit in one prompt. Every call is cached, so only edited chunks are re-sent.
+    """
+    if not text:
+        return ""
+    chunks = chunk_text(text, chunk_tokens)
+    if len(chunks) == 1:
+        return await scorer.summarize(chunks[0])
+
+    summaries = await asyncio.gather(*(scorer.summarize(chunk) for chunk in chunks))
+    summaries = [summary for summary in summaries if summary]
+    while len(summaries) > 1:
+        groups = [[]]
+        size = 0
+        for summary in summaries:
+            tokens = estimate_tokens(summary)
+            if groups[-1] and size + tokens > chunk_tokens * 2:
+                groups.append([])
+                size = 0
+            groups[-1].append(summary)
+            size += tokens
+        merged = await asyncio.gather(*(scorer.merge_summaries(group) if len(group) > 1 else asyncio.sleep(0, group[0])
+                                        for group in groups))
+        merged = [summary for summary in merged if summary]
+        if len(merged) >= len(summaries):
+            break  # Merging made no progress, e.g. every merge call failed
+        summaries = merged
+    print(f"Summarized {len(chunks)} chunks of {estimate_tokens(text)} tokens")
+    return "\n\n".join(summaries)
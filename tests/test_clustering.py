@@ -0,0 +1,96 @@
+import random
+import numpy as np
+from clustering import ClusterIndex, cluster_comments, cluster_signatures, minhash_signatures, shingles
+
+WORDS = ("rule agency comment public health water energy cost price market small business family "
+         "community federal state local impact support oppose request extend period review data").split()
+
+
+def letter(seed, length=120):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def edited(text, changes, seed=0):
+    """`text` with `changes` words replaced."""
+    words = text.split()
+    rng = random.Random(seed)
+    for i in rng.sample(range(len(words)), changes):
+        words[i] = f"edit{i}"
+    return " ".join(words)
+
+
+def labels(texts, threshold=0.8, bands=16):
+    return cluster_signatures(minhash_signatures(texts), threshold, bands)
+
+
+def test_near_duplicates_cluster_and_distinct_texts_do_not():
+    form = letter(1)
+    texts = [form, edited(form, 1), edited(form, 2, seed=1), letter(2), letter(3)]
+    result = labels(texts)
+    assert result[0] == result[1] == result[2]
+    assert len({result[0], result[3], result[4]}) == 3
+
+
+def test_threshold_separates_heavier_edits():
+    form = letter(1)
+    texts = [form, edited(form, 1), edited(form, 5)]
+    result = labels(texts, 0.8)
+    assert result[0] == result[1] != result[2]
+    # A lower threshold needs narrower bands for such pairs to share a bucket at all
+    result = labels(texts, 0.5, bands=32)
+    assert result[0] == result[1] == result[2]
+
+
+def test_signatures_estimate_jaccard_similarity():
+    form = letter(1)
+    signatures = minhash_signatures([form, form, edited(form, 10), ""])
+    assert (signatures[0] == signatures[1]).all()
+    first, second = shingles(form), shingles(edited(form, 10))
+    jaccard = len(first & second) / len(first | second)
+    assert abs((signatures[0] == signatures[2]).mean() - jaccard) < 0.1
+    assert (signatures[3] == np.iinfo(np.uint32).max).all()
+
+
+def test_cluster_index_matches_cluster_comments_across_batches():
+    forms = [letter(seed) for seed in range(3)]
+    comments = [{"Comment": edited(forms[i % 3], i % 2, seed=i) if i % 5 else forms[i % 3], "Attachments": 0}
+                for i in range(30)]
+    comments += [{"Comment": letter(100 + i), "Attachments": 0} for i in range(5)]
+    comments.append({"Comment": "", "Attachments": 1})
+    whole = [dict(comment) for comment in comments]
+    cluster_comments(whole)
+
+    index = ClusterIndex()
+    for comment in comments:
+        index.add(comment)
+    index.build()
+    batches = [[dict(comment) for comment in comments[start:start + 7]] for start in range(0, len(comments), 7)]
+    for batch in batches:
+        index.assign(batch)
+    streamed = [comment for batch in batches for comment in batch]
+    assert [(c.get("Cluster ID"), c.get("Cluster Size")) for c in streamed] == [
+        (c.get("Cluster ID"), c.get("Cluster Size")) for c in whole]
+    assert sorted({c["Cluster Size"] for c in whole if "Cluster Size" in c}) == [1, 10]
+
+
+def test_cluster_index_reuses_remembered_scores():
+    form = letter(1)
+    index = ClusterIndex()
+    for text in (form, edited(form, 1), letter(2)):
+        index.add({"Comment": text, "Attachments": 0})
+    index.build()
+    first = [{"Comment": form, "Attachments": 0}]
+    index.assign(first)
+    first[0].update({"Bot_Likelihood_Score": 7, "Sentiment": {"hate": False}, "Score Source": "llm"})
+    index.remember(first)
+
+    later = [{"Comment": edited(form, 1), "Attachments": 0}, {"Comment": letter(2), "Attachments": 0},
+             {"Comment": "never seen in the first pass", "Attachments": 0}]
+    clusters = index.assign(later)
+    assert later[0]["Bot_Likelihood_Score"] == 7
+    assert later[0]["Score Source"] == "llm"
+    assert later[0]["Sentiment"] == {"hate": False}
+    assert "Bot_Likelihood_Score" not in later[1]
+    assert later[2]["Cluster Size"] == 1
+    assert clusters == [[0], [1], [2]]
@@ -0,0 +1,58 @@
+import json
+import sqlite3
+import pytest
+from comment_index import CommentIndex
+
+DOCKET = {
+    "Title": "Test docket",
+    "Docket ID": "FCIC-21-0007",
+    "Documents": [{
+        "Proposed Rule Title": "Apple pricing rule",
+        "Document ID": "FCIC-21-0007-0001",
+        "Posted Date": "Apr 1, 2022",
+        "Document": {"SUMMARY:": "Sets the price of apples sold in orchards."},
+        "Comments": [
+            {"Comment ID": "FCIC-21-0007-0002", "Submitter Name": "Ann", "Posted On": "Apr 4, 2022",
+             "Comment": "Apple prices are too high, see also FCIC-21-0007-0001.", "Attachments": 0,
+             "Bot_Likelihood_Score": 2, "Sentiment": {"harassment": False}},
+            {"Comment ID": "FCIC-21-0007-0003", "Submitter Name": "Bob", "Posted On": "Apr 5, 2022",
+             "Comment": "I support the orchard rule.", "Attachments": 0,
+             "Bot_Likelihood_Score": 9, "Sentiment": {"harassment": True}},
+        ],
+    }],
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = tmp_path / "docket.json"
+    path.write_text(json.dumps(DOCKET), encoding="utf-8")
+    index = CommentIndex(str(tmp_path / "comments.sqlite"))
+    assert index.index_docket(str(path)) == 2
+    yield index
+    index.close()
+
+
+def comment_ids(rows):
+    return [row["comment_id"] for row in rows]
+
+
+def test_fts_queries(index):
+    assert comment_ids(index.search("apple AND price*")) == ["FCIC-21-0007-0002"]
+    assert comment_ids(index.search("orchard OR apple", min_score=5)) == ["FCIC-21-0007-0003"]
+    assert comment_ids(index.search(category="harassment")) == ["FCIC-21-0007-0003"]
+    assert comment_ids(index.search(month="2022-04")) == ["FCIC-21-0007-0003", "FCIC-21-0007-0002"]
+
+
+def test_invalid_fts_syntax_falls_back_to_a_phrase(index):
+    # FTS5 reads the hyphens of a bare ID as a column filter and operators
+    assert comment_ids(index.search("FCIC-21-0007-0001")) == ["FCIC-21-0007-0002"]
+    assert comment_ids(index.search('too "high')) == ["FCIC-21-0007-0002"]
+    assert comment_ids(index.search("AND")) == []
+    assert [row["document_id"] for row in index.search_documents("FCIC-21-0007-0001")] == []
+    assert [row["document_id"] for row in index.search_documents("apple*")] == ["FCIC-21-0007-0001"]
+
+
+def test_other_errors_are_raised(index):
+    with pytest.raises(sqlite3.OperationalError, match="no such table"):
+        index._query("SELECT * FROM missing WHERE text MATCH ?", ["apple"], "apple")
@@ -0,0 +1,88 @@
+import json
+import os
+from journal import ScrapeJournal
+from scrapper import DocketScraper
+
+DOCUMENT = "https://www.regulations.gov/document/D-1-0001"
+COMMENTS = [f"https://www.regulations.gov/comment/D-1-{i:04d}" for i in range(2, 6)]
+
+
+class FakeBackend:
+    """A docket of one document and four comments, with comments that fail until `failing` is cleared."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.fetched = []
+
+    def spawn(self):
+        return self
+
+    def close(self):
+        pass
+
+    def extract_docket(self, url):
+        return {"Title": "Test docket", "Docket ID": "D-1"}
+
+    def document_links(self, url):
+        return [DOCUMENT]
+
+    def extract_document(self, link):
+        return {"Proposed Rule Title": "Test rule", "Document ID": "D-1-0001"}, None
+
+    def comment_urls(self, link):
+        for url in COMMENTS:
+            yield url, "2022-04-04T04:00:00Z"
+
+    def extract_comment(self, url):
+        self.fetched.append(url)
+        if url in self.failing:
+            raise RuntimeError("page did not load")
+        return {"Comment": f"Comment at {url}", "Attachments": 0}
+
+
+def scrape(tmp_path, backend):
+    scraper = DocketScraper("https://www.regulations.gov/docket/D-1", backend=backend, requests_per_second=0,
+                            max_retries=2, journal_file=str(tmp_path / "docket.journal"))
+    scraper.run(str(tmp_path / "docket.json"))
+    with open(tmp_path / "docket.json", encoding="utf-8") as json_file:
+        return scraper, json.load(json_file)
+
+
+def test_reopened_journal_resumes_finished_work(tmp_path):
+    path = str(tmp_path / "docket.journal")
+    journal = ScrapeJournal(path)
+    journal.record_docket({"Docket ID": "D-1"})
+    journal.record_document(DOCUMENT, {"Document ID": "D-1-0001"})
+    journal.record_listing(DOCUMENT, [[COMMENTS[0], "2022-04-04T04:00:00Z"]])
+    journal.record_comment(COMMENTS[0], {"Comment": "Ünïcode kept"})
+    journal.close()
+    # A crash part-way through a write leaves the last line half written
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"type": "comment", "url": "https://www.regulations.gov/comm')
+
+    resumed = ScrapeJournal(path)
+    assert resumed.docket == {"Docket ID": "D-1"}
+    assert resumed.documents == {DOCUMENT: {"Document ID": "D-1-0001"}}
+    assert resumed.listings == {DOCUMENT: [[COMMENTS[0], "2022-04-04T04:00:00Z"]]}
+    assert resumed.comments == {COMMENTS[0]: {"Comment": "Ünïcode kept"}}
+    resumed.discard()
+    assert not os.path.exists(path)
+
+
+def test_failed_comment_keeps_journal_and_rerun_fetches_only_the_rest(tmp_path):
+    first = FakeBackend(failing={COMMENTS[2]})
+    scraper, docket = scrape(tmp_path, first)
+    assert scraper.failures == 1
+    assert first.fetched.count(COMMENTS[2]) == 2
+    assert len(docket["Documents"][0]["Comments"]) == 3
+    assert os.path.exists(tmp_path / "docket.journal")
+
+    second = FakeBackend()
+    second.extract_docket = None  # the docket and its listing are replayed from the journal
+    scraper, docket = scrape(tmp_path, second)
+    assert scraper.failures == 0
+    assert second.fetched == [COMMENTS[2]]
+    assert [comment["Comment ID"] for comment in docket["Documents"][0]["Comments"]] == [
+        "D-1-0002", "D-1-0003", "D-1-0004", "D-1-0005"]
+    assert docket["Docket ID"] == "D-1"
+    assert not os.path.exists(tmp_path / "docket.journal")
@@ -0,0 +1,67 @@
+import time
+from types import SimpleNamespace
+from ratelimit import RateLimiter, retry_after
+
+
+def throttled(status, headers):
+    return SimpleNamespace(response=SimpleNamespace(status_code=status, headers=headers))
+
+
+def test_success_climbs_by_a_tenth_up_to_max_rate():
+    limiter = RateLimiter(10)
+    limiter.success(0.1)
+    assert limiter.rate == 11
+    for _ in range(100):
+        limiter.success(0.1)
+    assert limiter.rate == 40
+
+
+def test_slow_success_eases_off_by_a_quarter():
+    limiter = RateLimiter(8, slow_seconds=10)
+    limiter.success(11)
+    assert limiter.rate == 6
+    limiter.success(10)
+    assert limiter.rate == 6.8
+
+
+def test_backoff_halves_down_to_min_rate():
+    limiter = RateLimiter(16)
+    limiter.backoff()
+    assert limiter.rate == 8
+    for _ in range(10):
+        limiter.backoff()
+    assert limiter.rate == 1
+
+
+def test_backoff_with_retry_after_pauses_acquire():
+    limiter = RateLimiter(1000, burst=5)
+    limiter.backoff(0.2)
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.19
+
+
+def test_acquire_waits_for_a_token():
+    limiter = RateLimiter(20)
+    limiter.acquire()
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.04
+
+
+def test_zero_rate_disables_limiting():
+    limiter = RateLimiter(0)
+    assert not limiter.enabled
+    started = time.monotonic()
+    for _ in range(1000):
+        limiter.acquire()
+    assert time.monotonic() - started < 0.1
+
+
+def test_retry_after_only_for_throttled_responses():
+    assert retry_after(throttled(429, {"Retry-After": "30"})) == 30
+    assert retry_after(throttled(503, {"Retry-After": "2.5"})) == 2.5
+    assert retry_after(throttled(500, {"Retry-After": "30"})) is None
+    assert retry_after(throttled(429, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) is None
+    assert retry_after(throttled(429, {})) is None
+    assert retry_after(ValueError("no response")) is None
@@ -0,0 +1,63 @@
+import json
+from openai.types.moderation import Categories
+from records import Comment, Docket, Document, decode_sentiment, encode_sentiment, from_json, partition, to_json
+
+# Decoded masks hold every category the moderation API rates
+SENTIMENT = {**dict.fromkeys(Categories.model_fields, False), "harassment": True, "violence": None}
+DOCKET = {
+    "Title": "Test docket",
+    "Docket ID": "D-1",
+    "Documents": [{
+        "Proposed Rule Title": "Test rule",
+        "Document ID": "D-1-0001",
+        "Comments": [
+            {"Submitter Name": "A", "Comment": "First", "Attachments": 0, "Comment ID": "D-1-0002",
+             "Sentiment": SENTIMENT, "Bot_Likelihood_Score": 3},
+            {"Comment ID": "D-1-0003", "Comment": "Second", "Attachments": 1, "Custom Field": [1, 2]},
+        ],
+    }],
+    "Timeline": {"Bursts": [{"Start": "2022-04-04T00:00:00", "Comment Count": 40}]},
+}
+
+
+def test_json_round_trip_keeps_values_and_key_order():
+    text = json.dumps(DOCKET)
+    docket = json.loads(text, object_hook=from_json)
+    assert isinstance(docket, Docket)
+    assert isinstance(docket["Documents"][0], Document)
+    assert all(isinstance(comment, Comment) for comment in docket["Documents"][0]["Comments"])
+    assert isinstance(docket["Timeline"]["Bursts"][0], dict)
+    assert json.dumps(docket, default=to_json) == text
+
+
+def test_set_and_delete_keep_insertion_order():
+    comment = Comment({"Comment": "Text", "Attachments": 0, "Extra": 1})
+    comment["Cluster ID"] = "abc"
+    comment["Another"] = 2
+    assert list(comment) == ["Comment", "Attachments", "Extra", "Cluster ID", "Another"]
+    del comment["Attachments"]
+    del comment["Extra"]
+    comment["Attachments"] = 1
+    assert list(comment) == ["Comment", "Cluster ID", "Another", "Attachments"]
+    assert len(comment) == 4
+    assert "Extra" not in comment
+    assert comment.to_dict() == {"Comment": "Text", "Cluster ID": "abc", "Another": 2, "Attachments": 1}
+
+
+def test_sentiment_mask_round_trip():
+    sentiment = {"harassment": True, "hate": False, "violence": None}
+    decoded = decode_sentiment(encode_sentiment(sentiment))
+    assert decoded["harassment"] is True
+    assert decoded["hate"] is False
+    assert decoded["violence"] is None
+    assert not any(flagged for category, flagged in decoded.items() if category != "harassment")
+    assert encode_sentiment(None) is None
+    assert decode_sentiment(encode_sentiment({"a new category": True}))["a new category"] is True
+
+
+def test_partition_views():
+    records = [Comment({"Comment": str(i), "Attachments": i % 2}) for i in range(5)]
+    with_attachments, without = partition(records, lambda comment: comment["Attachments"])
+    assert [comment["Comment"] for comment in with_attachments] == ["1", "3"]
+    assert [comment["Comment"] for comment in without[1:]] == ["2", "4"]
+    assert len(without) == 3
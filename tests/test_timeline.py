@@ -0,0 +1,52 @@
+import numpy as np
+from timeline import Timeline, burst_scores, parse_timestamps
+
+
+def daily_times(counts, start="2022-04-01"):
+    """`counts[i]` comments posted at noon on day i."""
+    days = np.datetime64(start, "D") + np.repeat(np.arange(len(counts)), counts)
+    return days.astype("datetime64[s]") + np.timedelta64(12, "h")
+
+
+def test_burst_scores_compare_each_bin_with_the_bins_before():
+    observed, rates, z_scores = burst_scores(np.array([4, 4, 4, 4, 20]), window=1, baseline=3)
+    assert observed.tolist() == [4, 4, 4, 4, 20]
+    assert rates.tolist() == [7.2, 4, 4, 4, 4]
+    assert z_scores[-1] == 8
+    assert z_scores[1:4].tolist() == [0, 0, 0]
+
+
+def test_spike_day_is_a_burst():
+    counts = [5] * 14 + [60] + [5] * 3
+    timeline = Timeline(daily_times(counts))
+    assert np.flatnonzero(timeline.bursts).tolist() == [14]
+    assert timeline.windows() == [{"Start": "2022-04-15T00:00:00", "End": "2022-04-16T00:00:00",
+                                   "Comment Count": 60, "Expected": 5.0, "Peak Z": 24.6}]
+    flags = timeline.burst_flags()
+    assert flags.sum() == 60
+
+
+def test_small_spike_is_not_a_burst():
+    counts = [1] * 14 + [15]
+    timeline = Timeline(daily_times(counts), min_comments=20)
+    assert not timeline.bursts.any()
+    assert Timeline(daily_times(counts), min_comments=10).bursts.any()
+
+
+def test_flag_marks_comments_and_skips_undated():
+    comments = [{"Posted On": "Apr 1, 2022"}] * 3 + [{"Posted On": "Apr 2, 2022"}] * 40 + [{"Posted On": None}]
+    comments = [dict(comment) for comment in comments]
+    timeline = Timeline.from_comments(comments)
+    timeline.flag(comments)
+    assert timeline.resolution == "D"
+    assert timeline.undated == 1
+    assert [comment["Posting Burst"] for comment in comments].count(True) == 40
+    assert comments[-1]["Posting Burst"] is False
+
+
+def test_timed_comments_are_binned_by_hour():
+    comments = [{"Posted At": f"2022-04-04T{hour:02d}:{minute:02d}:00Z"} for hour in range(6) for minute in (7, 31)]
+    timeline = Timeline.from_comments(comments)
+    assert timeline.resolution == "h"
+    assert timeline.counts.tolist() == [2] * 6
+    assert parse_timestamps(["Apr 4, 2022", None]).astype(str).tolist() == ["2022-04-04T00:00:00", "NaT"]
@@ -1,50 +1,140 @@
-import requests
-import random
-import string
-from bs4 import BeautifulSoup
+import json
 import re
+import unicodedata
+from html.parser import HTMLParser
+
+
+BLOCK_TAGS = {"address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "footer", "h1", "h2", "h3",
+              "h4", "h5", "h6", "header", "hr", "li", "ol", "p", "pre", "section", "table", "td", "th", "title", "tr",
+              "ul"}
+SKIPPED_TAGS = {"script", "style", "noscript", "template"}
+# Control characters other than whitespace (GPO text has NULs), zero-width characters, soft hyphens,
+# byte order marks and the replacement character left by undecodable bytes
+INVISIBLE_CHARACTERS = dict.fromkeys([*range(0x00, 0x09), 0x0b, *range(0x0e, 0x20), *range(0x7f, 0xa0),
+                                      *map(ord, "\u00ad\u200b\u200c\u200d\u2060\ufeff\ufffd")])
+
+
+def normalize_paragraph(text):
+    """
+    Compatibility-normalize text (non-breaking spaces, ligatures, full-width forms),
+    drop invisible characters and collapse whitespace. Accented
+    letters and symbols such as '§' are kept.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).translate(INVISIBLE_CHARACTERS).split())
+
+
+class TextExtractor(HTMLParser):
+    """
+    Incremental HTML-to-text converter. Text is collected from parser events as
+    the HTML is fed in, and complete paragraphs are queued in `paragraphs`.
+    Block-level tags end a paragraph, and inside <pre>, as in Federal Register
+    pages, so does a blank line.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs = []
+        self._text = ""
+        self._pre = 0
+        self._skipped = 0
+
+    def _end_paragraph(self, text):
+        paragraph = normalize_paragraph(text)
+        if any(character.isalnum() for character in paragraph):  # Skip rules such as '=====' and blank blocks
+            self.paragraphs.append(paragraph)
+
+    def _flush(self):
+        self._end_paragraph(self._text)
+        self._text = ""
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skipped += 1
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            self._pre += tag == "pre"
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self._skipped = max(0, self._skipped - 1)
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            if tag == "pre":
+                self._pre = max(0, self._pre - 1)
+
+    def handle_data(self, data):
+        if self._skipped:
+            return
+        self._text += data.translate(INVISIBLE_CHARACTERS)
+        if self._pre:
+            # The last part may be the start of a blank line split across two feeds
+            *complete, self._text = re.split(r"\n[^\S\n]*\n", self._text)
+            for paragraph in complete:
+                self._end_paragraph(paragraph)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def iter_html_text(file_path, block_size=1 << 16):
+    """Yield the cleaned paragraphs of an HTML file while reading it in blocks."""
+    extractor = TextExtractor()
+    with open(file_path, "r", encoding="utf-8", errors="replace") as html_file:
+        for block in iter(lambda: html_file.read(block_size), ""):
+            extractor.feed(block)
+            yield from extractor.paragraphs
+            extractor.paragraphs.clear()
+    extractor.close()
+    yield from extractor.paragraphs
 
 
 def clean_text(html_content):
-    # Parse the HTML content
-    soup = BeautifulSoup(html_content, "html.parser")
-
-    # Extract only textual data
-    text = soup.get_text()
-    cleaned_text = re.sub(r'[^\x00-\x7F]+', ' ', text)  # Remove non-ASCII characters like '�'
-    cleaned_text = re.sub(r'\s+', ' ', cleaned_text)  # Replace multiple spaces with a single space
-    cleaned_text = cleaned_text.strip()  # Remove leading/trailing spaces
-
-    # Print the cleaned text
-    return cleaned_text
-
-
-def generate_short_filename(extension=""):
-    # Generate a 10-character string
-    random_string = ''.join(random.choices(string.ascii_letters + string.digits, k=10))
-    return f"{random_string}.{extension}" if extension else random_string
-
-
-def download_pdf(url):
-    try:
-        # Send a GET request to the URL
-        response = requests.get(url, stream=True, timeout=30)
-
-        # Check for successful response
-        if response.status_code == 200 and "text/html" in response.headers.get("Content-Type", ""):
-            # Extract filename from the URL
-            file_name = generate_short_filename("htm")
-            file_name = f"downloads/{file_name}"
-
-            # Write the content to a file
-            with open(file_name, "wb") as pdf_file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    pdf_file.write(chunk)
-
-            print(f"PDF downloaded successfully: {file_name}")
-            return file_name
-        else:
-            print(f"Failed to download PDF. Status Code: {response.status_code}")
-    except Exception as e:
-        print(f"An error occurred: {e}")
-    return None
+    """Text of an HTML string, one paragraph per blank-line separated block."""
+    extractor = TextExtractor()
+    extractor.feed(html_content)
+    extractor.close()
+    return "\n\n".join(extractor.paragraphs)
+
+
+def write_ndjson(file_name, records):
+    """Write records as they are produced, one JSON object per line. Returns the number written."""
+    count = 0
+    with open(file_name, "w", encoding="utf-8") as ndjson_file:
+        for record in records:
+            ndjson_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def iter_ndjson(file_name):
+    """Yield the records of an NDJSON file one line at a time."""
+    with open(file_name, "r", encoding="utf-8") as ndjson_file:
+        for line in ndjson_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def docket_to_records(docket):
+    """
+    Flatten a docket into the streaming record layout: a docket header, then
+    each document followed by one record per comment.
+    """
+    yield {"type": "docket", "data": {key: value for key, value in docket.items() if key != "Documents"}}
+    for document in docket.get("Documents", []):
+        yield {"type": "document", "data": {key: value for key, value in document.items() if key != "Comments"}}
+        for comment in document.get("Comments") or []:
+            yield {"type": "comment", "document": document.get("Document ID"), "data": comment}
+
+
+def records_to_docket(records):
+    """Rebuild the nested docket.json shape from streaming records."""
+    docket = {"Documents": []}
+    for record in records:
+        if record["type"] == "docket":
+            docket = {**record["data"], "Documents": docket["Documents"]}
+        elif record["type"] == "document":
+            docket["Documents"].append({**record["data"], "Comments": []})
+        elif record["type"] == "comment":
+            docket["Documents"][-1]["Comments"].append(record["data"])
+    return docket